@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-import json
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+import uuid
 
-from app.services.devskiller import redis_client
+from app.core.redis_client import get_async_redis
 from app.services.devskiller_tasks import update_cookies_task
+from app.services.rate_limit import job_quota
 
 router = APIRouter()
 
@@ -10,33 +12,48 @@ STATUS_KEY = "devskiller_cookies_status"
 LAST_UPDATED_KEY = "devskiller_cookies_last_updated"
 ERROR_KEY = "devskiller_cookies_error"
 
+
+def _redis():
+    redis = get_async_redis()
+    if redis is None:
+        raise HTTPException(status_code=503, detail="Cookie refresh is unavailable")
+    return redis
+
+
 @router.post("/refresh", response_model=dict)
 @router.get("/refresh", response_model=dict)  # Allow GET for convenience
-def refresh_cookies(background_tasks: BackgroundTasks):
+async def refresh_cookies(request: Request):
     """Trigger a background task to refresh DevSkiller cookies.
 
     The task is executed asynchronously via Celery. The endpoint returns
     immediately with a *processing* status so that callers are not blocked
     while the cookies are being refreshed.
     """
-    # Initialise status in Redis so consumers can poll for progress
-    # Blocking Redis operations are safe here since this function runs in FastAPI's threadpool
-    redis_client.set(STATUS_KEY, "processing", ex=172800)
-    redis_client.delete(LAST_UPDATED_KEY)
-    # Enqueue Celery task in background (after response is returned)
-    background_tasks.add_task(update_cookies_task.delay)
+    redis = _redis()
+    # Counts against the caller's concurrent-job quota until the task finishes
+    task_id = str(uuid.uuid4())
+    await job_quota.reserve(getattr(request.state, "api_key_id", None), task_id)
+    try:
+        # Initialise status in Redis so consumers can poll for progress
+        async with redis.pipeline() as pipe:
+            pipe.set(STATUS_KEY, "processing", ex=172800)
+            pipe.delete(LAST_UPDATED_KEY)
+            await pipe.execute()
+        # Enqueue Celery task; publishing to the broker is blocking I/O
+        await run_in_threadpool(update_cookies_task.apply_async, task_id=task_id)
+    except Exception:
+        # The task never started, so nothing else would free the quota slot
+        await job_quota.release(task_id)
+        raise
     return {"status": "processing"}
 
-# Using sync function to play safe with blocking I/O
 
 @router.get("/status", response_model=dict)
-def get_refresh_status():
+async def get_refresh_status():
     """Return the latest cookie refresh status."""
-    status = redis_client.get(STATUS_KEY)
+    status, last_updated, error_msg = await _redis().mget(STATUS_KEY, LAST_UPDATED_KEY, ERROR_KEY)
     if not status:
         raise HTTPException(status_code=404, detail="No cookie refresh status found")
-    last_updated = redis_client.get(LAST_UPDATED_KEY)
-    error_msg = redis_client.get(ERROR_KEY)
     return {
         "status": status.decode() if isinstance(status, (bytes, bytearray)) else status,
         "last_updated": (
@@ -45,4 +62,4 @@ def get_refresh_status():
         "error": (
             error_msg.decode() if isinstance(error_msg, (bytes, bytearray)) else error_msg
         ),
-    } 
\ No newline at end of file
+    }
@@ -1,23 +1,46 @@
-from fastapi import APIRouter, Request, Path, Query
-from typing import Optional
+import asyncio
+from fastapi import APIRouter, HTTPException, Request, Response, Path, Query
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.datastructures import UploadFile
+from typing import Literal, Optional
 
+from app.models.document.batch import BatchConvertRequest
+from app.services.conversion_cache import should_bypass_cache
+from app.services.conversion_jobs import enqueue_job, get_job_result, get_job_status, is_hub_job
 from app.services.docling import DoclingService
+from app.services.document_batch import items_from_sources, items_from_uploads, stream_batch
+from app.services.pdf_split import convert_file_split
+from app.services.result_store import StoredResult, result_store
+from app.services.source_cache import convert_source_cached
+from app.services.task_watcher import stream_task_events, task_watcher
 from app.core.config import settings
 
 router = APIRouter()
 
 
 @router.post("/convert/file")
-async def convert_file(request: Request):
+async def convert_file(
+    request: Request,
+    split: Optional[bool] = Query(None, description="Split large PDFs into page ranges converted in parallel")
+):
     """
     Process uploaded document files.
     
-    Proxies file upload requests to the Docling API for conversion.
+    Proxies file upload requests to the Docling API for conversion. The upload
+    and the conversion result are streamed so large documents are never held
+    in memory in full. Results are cached by content hash; send
+    ``Cache-Control: no-cache`` or ``?bypass_cache=true`` to skip the cache.
+    
+    With ``split=true`` (the default when PDF_SPLIT_DEFAULT is set), a large
+    PDF is converted as page ranges in parallel and the text outputs are
+    merged in page order.
     """
-    return await DoclingService.proxy_request(
+    if split if split is not None else settings.PDF_SPLIT_DEFAULT:
+        return await convert_file_split(request, timeout=settings.DEFAULT_TIMEOUT)
+    return await DoclingService.cached_request(
         request=request,
         endpoint="/v1alpha/convert/file",
-        method="POST",
         timeout=settings.DEFAULT_TIMEOUT
     )
 
@@ -28,27 +51,112 @@ async def convert_source(request: Request):
     Process documents from URLs.
     
     Proxies URL-based document processing requests to the Docling API.
+    Results are cached by a hash of the normalized request body; send
+    ``Cache-Control: no-cache`` or ``?bypass_cache=true`` to skip the cache.
+    
+    With SOURCE_CACHE_ENABLED a single source URL is downloaded by the hub,
+    revalidated with ``ETag``/``Last-Modified`` on later requests and
+    converted through the file endpoint, so an unchanged document is served
+    from the cache by content hash without being downloaded or converted.
     """
-    return await DoclingService.proxy_request(
+    if settings.SOURCE_CACHE_ENABLED and settings.CONVERSION_CACHE_ENABLED and not should_bypass_cache(request):
+        return await convert_source_cached(request, timeout=settings.DEFAULT_TIMEOUT)
+    return await DoclingService.cached_request(
         request=request,
         endpoint="/v1alpha/convert/source",
-        method="POST",
         timeout=settings.DEFAULT_TIMEOUT
     )
 
 
+@router.post("/convert/batch")
+async def convert_batch(request: Request):
+    """
+    Convert many documents in one request.
+    
+    Accepts either a JSON ``BatchConvertRequest`` of source URLs or a
+    multipart upload with several ``files`` parts (other form fields are
+    applied to every file). Items are converted concurrently, up to the
+    requested ``concurrency`` (capped by BATCH_MAX_CONCURRENCY), and each
+    result is streamed back as one NDJSON line as soon as it finishes.
+    Per-item failures are reported in their line without failing the batch.
+    """
+    content_type = request.headers.get("Content-Type", "")
+    on_finish = None
+    
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=settings.BATCH_MAX_ITEMS, max_fields=1000)
+        on_finish = form.close
+        try:
+            uploads = [value for _, value in form.multi_items() if isinstance(value, UploadFile)]
+            fields = {}
+            for key, value in form.multi_items():
+                if isinstance(value, str) and key != "concurrency":
+                    fields.setdefault(key, []).append(value)
+            requested_concurrency = None
+            if form.get("concurrency"):
+                try:
+                    requested_concurrency = int(form["concurrency"])
+                except (TypeError, ValueError):
+                    requested_concurrency = 0
+                if requested_concurrency < 1:
+                    raise HTTPException(status_code=422, detail="concurrency must be a positive integer")
+            items = items_from_uploads(uploads, fields)
+        except BaseException:
+            await form.close()
+            raise
+    else:
+        try:
+            batch = BatchConvertRequest.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+        requested_concurrency = batch.concurrency
+        items = items_from_sources(batch)
+    
+    if not items or len(items) > settings.BATCH_MAX_ITEMS:
+        if on_finish:
+            await on_finish()
+        raise HTTPException(
+            status_code=422,
+            detail=f"Batch must contain between 1 and {settings.BATCH_MAX_ITEMS} documents"
+        )
+    
+    concurrency = max(1, min(
+        requested_concurrency or settings.BATCH_DEFAULT_CONCURRENCY,
+        settings.BATCH_MAX_CONCURRENCY
+    ))
+    return StreamingResponse(
+        stream_batch(items, concurrency, settings.DEFAULT_TIMEOUT, on_finish=on_finish),
+        media_type="application/x-ndjson"
+    )
+
+
 @router.post("/convert/source/async")
-async def convert_source_async(request: Request):
+async def convert_source_async(
+    request: Request,
+    priority: Literal["interactive", "bulk"] = Query("interactive", description="Job queue: interactive or bulk")
+):
     """
     Initiate asynchronous document processing.
     
-    Starts an asynchronous conversion job and returns a task ID.
+    Starts an asynchronous conversion job and returns a task ID. With
+    HUB_JOBS_ENABLED the job is queued in the hub (Celery) on the
+    ``interactive`` or ``bulk`` lane, so backfills never delay user-facing
+    conversions; its ``hub-`` task ID works with the status and result
+    endpoints below. Otherwise the job is handed straight to Docling.
     """
+    if settings.HUB_JOBS_ENABLED:
+        return await enqueue_job(
+            await request.body(),
+            priority,
+            getattr(request.state, "api_key_id", None),
+            use_cache=not should_bypass_cache(request)
+        )
     return await DoclingService.proxy_request(
         request=request,
         endpoint="/v1alpha/convert/source/async",
         method="POST",
-        timeout=settings.ASYNC_REQUEST_TIMEOUT
+        timeout=settings.ASYNC_REQUEST_TIMEOUT,
+        track_task=True
     )
 
 
@@ -65,12 +173,47 @@ async def poll_task_status(
         task_id: The ID of the task to check
         wait: How long to wait for a status change (in seconds)
     """
+    if is_hub_job(task_id):
+        if wait > 0:
+            try:
+                await asyncio.wait_for(task_watcher.wait(task_id), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        status = await get_job_status(task_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Task not found.")
+        return status
     return await DoclingService.proxy_request(
         request=request,
         endpoint=f"/v1alpha/status/poll/{task_id}",
         method="GET",
         timeout=max(wait + 5.0, 30.0),
-        query_params={"wait": wait} if wait > 0 else None
+        query_params={"wait": wait} if wait > 0 else None,
+        task_id=task_id
+    )
+
+
+@router.get("/status/stream/{task_id}")
+async def stream_task_status(
+    task_id: str = Path(..., description="The ID of the task to watch"),
+    include_result: bool = Query(False, description="Send the conversion result once the task succeeds")
+):
+    """
+    Wait for an asynchronous conversion task to finish via server-sent events.
+    
+    Instead of looping on ``/status/poll/{task_id}``, clients open this stream
+    and receive a single ``complete`` event (or ``error``/``timeout``) when the
+    task is done. The hub polls Docling once per task, however many clients
+    are waiting, and shares the outcome across workers through Redis.
+    
+    Args:
+        task_id: The ID of the task to watch
+        include_result: Send the conversion result in a ``result`` event
+    """
+    return StreamingResponse(
+        stream_task_events(task_id, include_result),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
@@ -82,12 +225,31 @@ async def get_task_result(
     """
     Retrieve the result of a completed task.
     
+    With RESULT_STORE_ENABLED the result is downloaded from Docling once,
+    kept on disk and served from there with ``ETag``/``If-None-Match`` and
+    ``Range`` support, compressed when the client accepts it.
+    
     Args:
         task_id: The ID of the task to retrieve results for
     """
+    if is_hub_job(task_id):
+        stored = await result_store.get(task_id) if settings.RESULT_STORE_ENABLED else None
+        if stored is None:
+            result = await get_job_result(task_id)
+            if result is None:
+                raise HTTPException(status_code=404, detail="Task result not found. Please wait for a completion status.")
+            status_code, content_type, body = result
+            if status_code != 200 or not settings.RESULT_STORE_ENABLED:
+                return Response(content=body, status_code=status_code, media_type=content_type)
+            stored = await result_store.put_bytes(task_id, content_type, body)
+        return await stored.to_response(request)
+    if settings.RESULT_STORE_ENABLED:
+        result = await result_store.fetch_docling(task_id)
+        return await result.to_response(request) if isinstance(result, StoredResult) else result
     return await DoclingService.proxy_request(
         request=request,
         endpoint=f"/v1alpha/result/{task_id}",
         method="GET",
-        timeout=settings.RESULT_FETCH_TIMEOUT
+        timeout=settings.RESULT_FETCH_TIMEOUT,
+        task_id=task_id
     )
\ No newline at end of file
@@ -1,6 +1,9 @@
 from fastapi import APIRouter
+from typing import List
 
-from app.models.health import HealthResponse
+from app.models.health import AdmissionStats, BackendStats, HealthResponse
+from app.services.admission import docling_admission
+from app.services.docling_backends import docling_backends
 
 router = APIRouter()
 
@@ -12,4 +15,26 @@ async def health_check():
     
     Returns a simple status check to verify the API is running.
     """
-    return HealthResponse()
\ No newline at end of file
+    return HealthResponse()
+
+
+@router.get("/admission", response_model=AdmissionStats)
+async def admission_stats():
+    """
+    Docling admission control snapshot.
+    
+    Reports the current adaptive concurrency limit, in-flight conversions and
+    queue depth for monitoring.
+    """
+    return docling_admission.stats()
+
+
+@router.get("/backends", response_model=List[BackendStats])
+async def backend_stats():
+    """
+    Docling backend routing snapshot.
+    
+    Lists each configured Docling instance with its health and outstanding
+    request count.
+    """
+    return docling_backends.stats()
@@ -1,16 +1,33 @@
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import JSONResponse
-import json
+from fastapi import APIRouter, Query, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from urllib.parse import urlparse
 import re
+import uuid
 
-from app.models.video.video import VideoResponse
-from app.services.devskiller import redis_client
-from app.services.devskiller_tasks import process_video_task
+from app.core.config import settings
+from app.core.destinations import UnsafeDestination, check_destination_async
+from app.models.video.video import VideoBatchRequest, VideoResponse
+from app.services.devskiller_tasks import process_video_batch_task, process_video_task
+from app.services.rate_limit import job_quota
+from app.services.video_events import stream_video_events
+from app.services.video_jobs import (
+    add_video_callback,
+    claim_video,
+    get_video_status,
+    release_video_lease,
+    set_video_processing,
+)
 
 router = APIRouter()
 
-# Extract candidate and invitation IDs from URL
+# Extract candidate and invitation IDs from a Devskiller app URL
 def extract_ids_from_url(url):
+    parsed = urlparse(url)
+    app = urlparse(settings.DEVSKILLER_APP_URL)
+    if parsed.scheme != app.scheme or parsed.hostname != app.hostname:
+        return None, None
     pattern = r"candidates/([^/]+)/detail/invitations/([^/]+)"
     match = re.search(pattern, url)
     if match:
@@ -19,12 +36,33 @@ def extract_ids_from_url(url):
         return candidate_id, invitation_id
     return None, None
 
+async def callback_url_error(callback_url: Optional[str]) -> Optional[str]:
+    """
+    Return why the hub must not POST to ``callback_url``, or None if it may.
+    """
+    if callback_url is None:
+        return None
+    try:
+        await check_destination_async(callback_url)
+    except UnsafeDestination as e:
+        return f"callback_url is not allowed: {str(e)}"
+    return None
+
 @router.get("", response_model=dict)
 async def get_video(
-    url: str = Query(..., description="The DevSkiller video URL to process")
+    request: Request,
+    url: str = Query(..., description="The DevSkiller video URL to process"),
+    refresh: bool = Query(False, description="Resolve the link again even if a result is cached"),
+    callback_url: Optional[str] = Query(None, description="URL that receives the final status as a JSON POST")
 ):
     """
     Start video processing as a Celery task.
+
+    Idempotent per invitation: a cached ``complete`` result is returned
+    immediately (unless ``refresh=true``), and while a task for the same
+    invitation is queued or running, repeated calls join it instead of
+    starting another. When the response is ``processing``, the final status
+    is POSTed to ``callback_url`` once the task finishes.
     """
     candidate_id, invitation_id = extract_ids_from_url(url)
     if not candidate_id or not invitation_id:
@@ -32,25 +70,126 @@ async def get_video(
             status_code=400,
             content={"error": "Invalid Devskiller URL format"}
         )
-    redis_key = f"video:{candidate_id}:{invitation_id}"
-    # Store initial processing status in Redis
-    redis_client.set(
-        redis_key,
-        json.dumps({"status": "processing"}),
-        ex=3600
+    callback_error = await callback_url_error(callback_url)
+    if callback_error:
+        return JSONResponse(
+            status_code=400,
+            content={"error": callback_error}
+        )
+    ids = {"candidate_id": candidate_id, "invitation_id": invitation_id}
+    if not refresh:
+        status = await get_video_status(candidate_id, invitation_id)
+        if status and status.get("status") == "complete":
+            return {**status, **ids}
+
+    task_id = str(uuid.uuid4())
+    if not await claim_video(candidate_id, invitation_id, task_id):
+        # Another request already queued a task for this invitation
+        if callback_url:
+            await add_video_callback(candidate_id, invitation_id, callback_url)
+        return {"status": "processing", **ids}
+    try:
+        # Counts against the caller's concurrent-job quota until the task finishes
+        await job_quota.reserve(getattr(request.state, "api_key_id", None), task_id)
+        # Store initial processing status in Redis
+        await set_video_processing(candidate_id, invitation_id)
+        if callback_url:
+            await add_video_callback(candidate_id, invitation_id, callback_url)
+        # Enqueue Celery task
+        # Publishing to the broker is blocking I/O; keep it off the event loop
+        await run_in_threadpool(process_video_task.apply_async, args=[url], task_id=task_id)
+    except Exception:
+        await release_video_lease(candidate_id, invitation_id, task_id)
+        await job_quota.release(task_id)
+        raise
+    return {"status": "processing", **ids}
+
+@router.post("/batch", response_model=dict)
+async def get_videos(request: Request, batch: VideoBatchRequest):
+    """
+    Resolve the download links of many invitations in one Celery task.
+
+    Each item is handled like ``GET /video``: cached ``complete`` results are
+    returned as they are (unless ``refresh``) and invitations already being
+    resolved are joined. The rest are queued together; one worker opens them
+    in tabs of a single browser context and stores each item's status under
+    ``/video/status/{candidate_id}/{invitation_id}`` as soon as it finishes,
+    and POSTed to ``callback_url`` if one is given.
+    """
+    if len(batch.urls) > settings.VIDEO_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Batch must contain between 1 and {settings.VIDEO_BATCH_MAX_ITEMS} URLs"
+        )
+    callback_error = await callback_url_error(batch.callback_url)
+    if callback_error:
+        raise HTTPException(status_code=422, detail=callback_error)
+
+    task_id = str(uuid.uuid4())
+    items = []
+    claimed = []
+    seen = set()
+    for url in batch.urls:
+        candidate_id, invitation_id = extract_ids_from_url(url)
+        if not candidate_id or not invitation_id:
+            items.append({"source": url, "status": "error", "error": "Invalid Devskiller URL format"})
+            continue
+        item = {"source": url, "candidate_id": candidate_id, "invitation_id": invitation_id}
+        items.append(item)
+        if (candidate_id, invitation_id) in seen:
+            item["status"] = "processing"
+            continue
+        seen.add((candidate_id, invitation_id))
+
+        if not batch.refresh:
+            status = await get_video_status(candidate_id, invitation_id)
+            if status and status.get("status") == "complete":
+                item.update(status)
+                continue
+        item["status"] = "processing"
+        if await claim_video(candidate_id, invitation_id, task_id):
+            claimed.append(url)
+        elif batch.callback_url:
+            # Joined another task for this invitation
+            await add_video_callback(candidate_id, invitation_id, batch.callback_url)
+
+    if claimed:
+        tabs = min(batch.tabs or settings.VIDEO_BATCH_DEFAULT_TABS, settings.VIDEO_BATCH_MAX_TABS)
+        try:
+            # The whole batch counts as one job against the caller's quota
+            await job_quota.reserve(getattr(request.state, "api_key_id", None), task_id)
+            for url in claimed:
+                candidate_id, invitation_id = extract_ids_from_url(url)
+                await set_video_processing(candidate_id, invitation_id)
+                if batch.callback_url:
+                    await add_video_callback(candidate_id, invitation_id, batch.callback_url)
+            await run_in_threadpool(process_video_batch_task.apply_async, args=[claimed, tabs], task_id=task_id)
+        except Exception:
+            for url in claimed:
+                await release_video_lease(*extract_ids_from_url(url), task_id)
+            await job_quota.release(task_id)
+            raise
+
+    return {"task_id": task_id if claimed else None, "queued": len(claimed), "items": items}
+
+@router.get("/status/stream/{candidate_id}/{invitation_id}")
+async def stream_video_status(candidate_id: str, invitation_id: str):
+    """
+    Wait for an invitation's video lookup to finish via server-sent events.
+
+    Instead of polling ``/video/status/{candidate_id}/{invitation_id}``,
+    clients open this stream and receive a single ``complete`` event (or
+    ``error``/``timeout``) as soon as the worker publishes the result.
+    """
+    return StreamingResponse(
+        stream_video_events(candidate_id, invitation_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    # Enqueue Celery task
-    process_video_task.delay(url)
-    return {
-        "status": "processing",
-        "candidate_id": candidate_id,
-        "invitation_id": invitation_id
-    }
 
 @router.get("/status/{candidate_id}/{invitation_id}", response_model=dict)
 async def get_task_status(candidate_id: str, invitation_id: str):
-    redis_key = f"video:{candidate_id}:{invitation_id}"
-    result = redis_client.get(redis_key)
-    if not result:
+    status = await get_video_status(candidate_id, invitation_id)
+    if not status:
         raise HTTPException(status_code=404, detail="Task not found")
-    return json.loads(result)
\ No newline at end of file
+    return status
\ No newline at end of file
@@ -3,7 +3,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.middleware.auth import authenticate_request
+from app.core.http_client import start_upstream_client, close_upstream_client
+from app.core.redis_client import close_async_redis, get_async_redis
+from app.services.docling_backends import docling_backends
+from app.middleware.auth import APIKeyAuthMiddleware, configured_key_hashes
+from app.middleware.rate_limit import RateLimitMiddleware
 from app.api.v1.api import api_router
 from app.core.logging import get_logger
 
@@ -11,17 +15,28 @@ logger = get_logger("app.main")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Shared, pooled HTTP client for all upstream (Docling) calls
+    await start_upstream_client()
+    # Shared asyncio Redis connection pool for all API routes
+    get_async_redis()
+    # Background health probing of ejected Docling backends
+    await docling_backends.start()
+    
     # Schedule cookie update task to run in background after startup
     # This prevents blocking the event loop during app initialization
     from app.services.devskiller_tasks import update_cookies_task
     
     logger.info("Scheduling initial DevSkiller cookie update...")
-    # Queue the task to Celery - this returns immediately
-    update_cookies_task.delay()
+    # Queue the task to Celery - this returns immediately. It only logs in
+    # when the stored session is missing or about to expire.
+    update_cookies_task.delay(force=False)
     
     yield
     # Cleanup if needed
     logger.info("Shutting down...")
+    await docling_backends.stop()
+    await close_upstream_client()
+    await close_async_redis()
     
 def create_application() -> FastAPI:
     """
@@ -31,12 +46,13 @@ def create_application() -> FastAPI:
     logger.info(f"Starting {settings.PROJECT_NAME}")
     
     # Only log a warning about missing API key at startup, but don't prevent the app from starting
-    if not settings.API_KEY:
+    key_count = len(configured_key_hashes())
+    if not key_count:
         logger.warning("No API_KEY configured. API endpoints will return 503 errors.")
     else:
-        logger.info("API Key configured successfully")
+        logger.info(f"API Key configured successfully ({key_count} key{'s' if key_count > 1 else ''})")
     
-    logger.info(f"API URL: {settings.DOCLING_API_URL}")
+    logger.info(f"Docling backends: {', '.join(backend.url for backend in docling_backends.backends)}")
     
     application = FastAPI(
         title=settings.PROJECT_NAME,
@@ -57,8 +73,12 @@ def create_application() -> FastAPI:
         allow_headers=["*"],
     )
     
-    # Add authentication middleware
-    application.middleware("http")(authenticate_request)
+    # Per-API-key rate limits; added before auth so it runs inside it, after the key is identified
+    if settings.RATE_LIMIT_ENABLED:
+        application.add_middleware(RateLimitMiddleware)
+    
+    # Add authentication middleware (pure ASGI, so streamed bodies pass through untouched)
+    application.add_middleware(APIKeyAuthMiddleware)
     
     # Include API router
     application.include_router(api_router, prefix=settings.API_V1_STR)
@@ -29,7 +29,9 @@ celery_app = Celery(
 celery_app.conf.beat_schedule = {
     'update-devskiller-cookies': {
         'task': 'app.services.devskiller_tasks.update_cookies_task',
-        'schedule': crontab(minute=0, hour='*/4'),  # Every 4 hours
+        # Logs in only when the session is missing or about to expire
+        'schedule': crontab(minute=settings.DEVSKILLER_SESSION_CHECK_MINUTES),
+        'kwargs': {'force': False},
     },
 }
 
@@ -47,6 +49,9 @@ celery_app.conf.broker_transport_options = {
     'fanout_patterns': True,
     'socket_timeout': 10.0,
     'socket_connect_timeout': 10.0,
+    # Workers listening on several queues drain them in the order given to -Q,
+    # so interactive conversion jobs always go before bulk ones
+    'queue_order_strategy': 'priority',
     'connection_pool_kwargs': {
         'decode_responses': False,
     }
@@ -69,4 +74,7 @@ celery_app.conf.task_acks_late = True
 celery_app.conf.task_reject_on_worker_lost = True
 
 # Ensure tasks are registered
-import app.services.devskiller_tasks 
\ No newline at end of file
+import app.services.devskiller_tasks
+import app.services.document_tasks
+# Releases per-API-key job quota slots when tasks finish
+import app.services.rate_limit 
\ No newline at end of file
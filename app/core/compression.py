@@ -0,0 +1,227 @@
+import asyncio
+import zlib
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # optional, enables "zstd"
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # optional, enables "br"
+    brotli = None
+
+# Headers that describe a single hop and must not be forwarded by a proxy
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+# Framing headers that stop being true once the body is re-encoded or re-sent
+FRAMING_HEADERS = {"content-length", "content-encoding"}
+
+# Media types worth compressing; PDFs, images and archives are already dense
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/xml",
+    "application/javascript",
+)
+
+# Every encoding this module can produce, in server preference order
+CONTENT_ENCODINGS = ("zstd", "br", "gzip")
+
+# Bodies above this size are compressed in a worker thread
+THREAD_COMPRESS_MIN_BYTES = 256 * 1024
+
+
+def supported_encodings() -> List[str]:
+    """
+    Return the encodings this process can produce, in server preference order.
+    """
+    available = {"zstd": zstandard is not None, "br": brotli is not None, "gzip": True}
+    return [encoding for encoding in CONTENT_ENCODINGS if available[encoding]]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the response encoding for an ``Accept-Encoding`` header.
+
+    The client's q-values decide; ties go to the server preference
+    (zstd, br, gzip). ``q=0`` excludes an encoding and ``*`` stands for
+    any encoding not listed explicitly.
+
+    Returns:
+        The encoding to use, or None to send the body uncompressed
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    best = None
+    best_q = 0.0
+    for encoding in supported_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    """
+    Return True for textual media types (markdown, JSON, HTML, ...).
+    """
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return (
+        media_type.startswith(COMPRESSIBLE_TYPES)
+        or media_type.endswith("+json")
+        or media_type.endswith("+xml")
+    )
+
+
+def varies_by_encoding(content_type: Optional[str]) -> bool:
+    """
+    Return True when responses of this type depend on ``Accept-Encoding``.
+    """
+    return settings.COMPRESSION_ENABLED and is_compressible(content_type)
+
+
+def choose_encoding(
+    request_headers: Mapping[str, str],
+    response_headers: Mapping[str, str],
+    size: Optional[int] = None
+) -> Optional[str]:
+    """
+    Decide whether and how to compress a response for this request.
+
+    Only uncompressed, compressible bodies of at least COMPRESSION_MIN_SIZE
+    bytes are compressed. ``size`` is None when the length is not known
+    up front (streamed bodies without a Content-Length).
+
+    Args:
+        request_headers: The client request headers
+        response_headers: Headers of the response about to be sent
+        size: Body size in bytes, if known
+
+    Returns:
+        The encoding to apply, or None
+    """
+    if not varies_by_encoding(response_headers.get("content-type")):
+        return None
+    content_encoding = response_headers.get("content-encoding", "identity")
+    if content_encoding.lower() != "identity":
+        return None
+    if size is not None and size < settings.COMPRESSION_MIN_SIZE:
+        return None
+    return negotiate_encoding(request_headers.get("accept-encoding"))
+
+
+class StreamCompressor:
+    """Incremental compressor for one response body."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            # wbits 16+ produces a gzip header and trailer instead of raw zlib
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == "zstd" and zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compressobj()
+        elif encoding == "br" and brotli is not None:
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk)
+        return self._compressor.compress(chunk)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    compressor = StreamCompressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_file(source: str, target: str, encoding: str, chunk_size: int = 1024 * 1024) -> None:
+    """
+    Compress ``source`` into ``target`` without loading it into memory (blocking).
+    """
+    compressor = StreamCompressor(encoding)
+    with open(source, "rb") as source_file, open(target, "wb") as target_file:
+        while chunk := source_file.read(chunk_size):
+            target_file.write(compressor.compress(chunk))
+        target_file.write(compressor.flush())
+
+
+async def compress_body(data: bytes, encoding: str) -> bytes:
+    """
+    Compress a buffered body, off the event loop when it is large.
+    """
+    if len(data) >= THREAD_COMPRESS_MIN_BYTES:
+        return await asyncio.to_thread(compress_bytes, data, encoding)
+    return compress_bytes(data, encoding)
+
+
+def relay_headers(upstream: Iterable, framing: bool = False) -> Dict[str, str]:
+    """
+    Copy upstream headers that are still valid on a re-sent response.
+
+    Hop-by-hop headers are always dropped. Framing headers are dropped too
+    unless ``framing`` is set (the body is relayed byte for byte): Starlette
+    sets Content-Length from the body it actually sends, and Content-Encoding
+    is set by whoever encodes it.
+
+    Args:
+        upstream: (name, value) pairs, e.g. ``httpx.Headers.items()``
+        framing: Keep Content-Length and Content-Encoding
+    """
+    return {
+        key: value
+        for key, value in upstream
+        if key.lower() not in HOP_BY_HOP_HEADERS
+        and (framing or key.lower() not in FRAMING_HEADERS)
+    }
+
+
+def add_vary(headers: Dict[str, str], value: str = "Accept-Encoding") -> None:
+    """
+    Add ``value`` to the Vary header in ``headers`` (a dict with any key case).
+    """
+    for key in headers:
+        if key.lower() == "vary":
+            existing = [item.strip().lower() for item in headers[key].split(",")]
+            if value.lower() not in existing and "*" not in existing:
+                headers[key] = f"{headers[key]}, {value}"
+            return
+    headers["Vary"] = value
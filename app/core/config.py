@@ -13,18 +13,151 @@ class Settings(BaseSettings):
     
     # API Authentication
     API_KEY: str = os.getenv("API_KEY", "")
+    # Additional keys (comma-separated) and hex SHA-256 digests of keys kept out of the environment
+    API_KEYS: str = os.getenv("API_KEYS", "")
+    API_KEY_HASHES: str = os.getenv("API_KEY_HASHES", "")
     DOCLING_SERVICE_NAME: str = os.getenv("DOCLING_SERVICE_NAME", "docling-serve-cpu")
     DOCLING_SERVICE_PORT: str = os.getenv("DOCLING_SERVICE_PORT", "3000")
     DOCLING_API_URL: str = os.getenv(
         "DOCLING_API_URL", 
         f"http://{DOCLING_SERVICE_NAME}.railway.internal:{DOCLING_SERVICE_PORT}"
     )
+    # Optional comma-separated list of Docling instances to load balance across.
+    # When unset, DOCLING_API_URL is the only backend.
+    DOCLING_API_URLS: str = os.getenv("DOCLING_API_URLS", "")
+    DOCLING_BACKEND_MAX_FAILURES: int = 3
+    DOCLING_BACKEND_EJECT_SECONDS: float = 30.0
+    DOCLING_BACKEND_PROBE_INTERVAL: float = 5.0
+    DOCLING_BACKEND_PROBE_TIMEOUT: float = 5.0
+    DOCLING_BACKEND_HEALTH_PATH: str = "/health"
+    DOCLING_TASK_AFFINITY_TTL: int = 86400
+    DOCLING_TASK_AFFINITY_MAX_ENTRIES: int = 10000
+    DOCLING_TASK_AFFINITY_PREFIX: str = "docling:task:"
     
     # Timeout settings (in seconds)
     DEFAULT_TIMEOUT: float = 300.0
     ASYNC_REQUEST_TIMEOUT: float = 30.0
     RESULT_FETCH_TIMEOUT: float = 60.0
     
+    # Shared upstream HTTP client (connection pool reused by all Docling calls)
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 30.0
+    UPSTREAM_CONNECT_TIMEOUT: float = 10.0
+    UPSTREAM_HTTP2: bool = os.getenv("UPSTREAM_HTTP2", "false").lower() == "true"
+    
+    # Chunk size (bytes) used when relaying streamed upstream responses
+    STREAM_CHUNK_SIZE: int = 64 * 1024
+    
+    # Conversion result cache (in-process LRU in front of a Redis tier)
+    CONVERSION_CACHE_ENABLED: bool = os.getenv("CONVERSION_CACHE_ENABLED", "true").lower() == "true"
+    CONVERSION_CACHE_MEMORY_MAX_BYTES: int = 256 * 1024 * 1024
+    CONVERSION_CACHE_MEMORY_MAX_ENTRIES: int = 1024
+    CONVERSION_CACHE_MEMORY_TTL: float = 3600.0
+    CONVERSION_CACHE_REDIS_TTL: int = 86400
+    CONVERSION_CACHE_REDIS_PREFIX: str = "docling:result:"
+    CONVERSION_CACHE_REDIS_MAX_ENTRY_BYTES: int = 16 * 1024 * 1024
+    CONVERSION_CACHE_MAX_ENTRY_BYTES: int = 64 * 1024 * 1024
+    CONVERSION_CACHE_MAX_JSON_BYTES: int = 1024 * 1024
+    # Multipart form fields larger than this are keyed by their SHA-256 instead of their value
+    CONVERSION_CACHE_MAX_FIELD_BYTES: int = 64 * 1024
+    CONVERSION_CACHE_SPOOL_MAX_MEMORY: int = 1024 * 1024
+    
+    # Coalescing of identical in-flight conversions (in-process and across workers via Redis)
+    SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    SINGLE_FLIGHT_LOCK_TTL: float = 360.0
+    SINGLE_FLIGHT_POLL_INTERVAL: float = 2.0
+    SINGLE_FLIGHT_REDIS_PREFIX: str = "docling:inflight:"
+    
+    # Batch conversion endpoint
+    BATCH_MAX_ITEMS: int = 100
+    BATCH_DEFAULT_CONCURRENCY: int = 4
+    BATCH_MAX_CONCURRENCY: int = 16
+    
+    # Adaptive (AIMD) admission control for conversions sent to Docling
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_INITIAL_LIMIT: int = 4
+    ADMISSION_MIN_LIMIT: int = 1
+    ADMISSION_MAX_LIMIT: int = 32
+    ADMISSION_MAX_QUEUE: int = 100
+    ADMISSION_QUEUE_TIMEOUT: float = 120.0
+    ADMISSION_LATENCY_TARGET: float = 120.0
+    ADMISSION_BACKOFF_RATIO: float = 0.8
+    
+    # Server-sent completion events for async tasks (one Docling watcher per task across workers)
+    TASK_WATCH_POLL_WAIT: float = 10.0
+    TASK_WATCH_MAX_SECONDS: float = 3600.0
+    TASK_WATCH_KEEPALIVE: float = 15.0
+    TASK_WATCH_MAX_ERRORS: int = 5
+    TASK_WATCH_LOCK_TTL: float = 60.0
+    TASK_WATCH_STATUS_TTL: int = 3600
+    TASK_WATCH_REDIS_PREFIX: str = "docling:watch:"
+    
+    # Page-range splitting of large PDFs sent to /convert/file (opt in per request with ?split=true)
+    PDF_SPLIT_DEFAULT: bool = os.getenv("PDF_SPLIT_DEFAULT", "false").lower() == "true"
+    PDF_SPLIT_THRESHOLD_PAGES: int = 100
+    PDF_SPLIT_CHUNK_PAGES: int = 50
+    PDF_SPLIT_MAX_CONCURRENCY: int = 8
+    
+    # Hub-managed async conversion jobs, run by Celery workers in priority lanes
+    # Off by default: the job lanes need their own Celery workers (see run_celery_worker.sh)
+    HUB_JOBS_ENABLED: bool = os.getenv("HUB_JOBS_ENABLED", "false").lower() == "true"
+    HUB_JOB_ID_PREFIX: str = "hub-"
+    HUB_JOB_REDIS_PREFIX: str = "docling:job:"
+    HUB_JOB_TTL: int = 86400
+    HUB_JOB_QUEUE_INTERACTIVE: str = "docling_interactive"
+    HUB_JOB_QUEUE_BULK: str = "docling_bulk"
+    HUB_JOB_MAX_RETRIES: int = 3
+    # End-to-end limit per job, including time queued in Docling; keep it
+    # below the broker's visibility_timeout (1 hour) or the job is redelivered
+    HUB_JOB_TIMEOUT: int = 1800
+    # Seconds each long-poll of the Docling task waits for it to finish
+    HUB_JOB_POLL_WAIT: float = 10.0
+    
+    # Disk store for async task results served by /document/result (evicted by size and age)
+    RESULT_STORE_ENABLED: bool = os.getenv("RESULT_STORE_ENABLED", "true").lower() == "true"
+    RESULT_STORE_DIR: str = os.getenv("RESULT_STORE_DIR", "/tmp/ai-hub-results")
+    RESULT_STORE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    RESULT_STORE_TTL: int = 86400
+    
+    # Hub-side cache of /convert/source documents, revalidated with ETag/Last-Modified
+    SOURCE_CACHE_ENABLED: bool = os.getenv("SOURCE_CACHE_ENABLED", "true").lower() == "true"
+    SOURCE_CACHE_DIR: str = os.getenv("SOURCE_CACHE_DIR", "/tmp/ai-hub-sources")
+    SOURCE_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    SOURCE_CACHE_MAX_DOCUMENT_BYTES: int = 256 * 1024 * 1024
+    SOURCE_CACHE_TTL: int = 7 * 86400
+    SOURCE_FETCH_TIMEOUT: float = 60.0
+    
+    # Destinations the hub itself may fetch or call (source downloads, webhooks). Private, loopback,
+    # link-local (cloud metadata) and other non-public addresses are always refused; when
+    # OUTBOUND_ALLOWED_HOSTS is set, only those hosts (and their subdomains) are allowed.
+    OUTBOUND_ALLOWED_HOSTS: str = ""
+    OUTBOUND_BLOCKED_HOSTS: str = "metadata.google.internal,metadata.azure.com,localhost"
+    OUTBOUND_MAX_REDIRECTS: int = 5
+    
+    # Accept-Encoding negotiation for relayed, cached and stored results (zstd and br need the zstandard/brotli packages)
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    
+    # Per-API-key rate limits: token buckets in Redis per route group (requests per minute, burst; 0 disables a group)
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_DOCUMENT_PER_MINUTE: int = 300
+    RATE_LIMIT_DOCUMENT_BURST: int = 100
+    RATE_LIMIT_VIDEO_PER_MINUTE: int = 60
+    RATE_LIMIT_VIDEO_BURST: int = 20
+    RATE_LIMIT_DEVSKILLER_PER_MINUTE: int = 6
+    RATE_LIMIT_DEVSKILLER_BURST: int = 3
+    RATE_LIMIT_LOCAL_BATCH: int = 10
+    RATE_LIMIT_REDIS_PREFIX: str = "ratelimit:"
+    
+    # Queued or running Celery jobs (videos, cookie refreshes, hub conversion jobs) allowed per API key
+    JOB_QUOTA_PER_KEY: int = 20
+    JOB_QUOTA_SLOT_TTL: int = 3600
+    JOB_QUOTA_REDIS_PREFIX: str = "jobquota:"
+    
     # API Documentation settings
     # Set DOCS_ENABLED=true to expose /docs, /redoc, /openapi.json (disabled by default for security)
     DOCS_ENABLED: bool = os.getenv("DOCS_ENABLED", "false").lower() == "true"
@@ -40,6 +173,64 @@ class Settings(BaseSettings):
     DEVSKILLER_USERNAME: Optional[str] = None
     DEVSKILLER_PASSWORD: Optional[str] = None
     
+    # Lease that lets repeated /video requests join the invitation's running task (covers retries)
+    VIDEO_LEASE_TTL: int = 1800
+    
+    # Webhooks for finished video lookups (bodies signed with X-Webhook-Signature when a secret is set)
+    VIDEO_WEBHOOK_SECRET: Optional[str] = None
+    VIDEO_WEBHOOK_TIMEOUT: float = 10.0
+    VIDEO_WEBHOOK_MAX_RETRIES: int = 5
+    VIDEO_WEBHOOK_RETRY_DELAY: int = 10
+    
+    # Batch video lookups: one Celery task, one browser context, a bounded number of tabs
+    VIDEO_BATCH_MAX_ITEMS: int = 100
+    VIDEO_BATCH_DEFAULT_TABS: int = 4
+    VIDEO_BATCH_MAX_TABS: int = 8
+    VIDEO_BATCH_MAX_RETRIES: int = 2
+    VIDEO_BATCH_SOFT_TIME_LIMIT: int = 900
+    
+    # Browserless video link lookups with the stored session cookies (falls back to the browser)
+    DEVSKILLER_HTTP_RESOLVER_ENABLED: bool = os.getenv("DEVSKILLER_HTTP_RESOLVER_ENABLED", "true").lower() == "true"
+    DEVSKILLER_HTTP_TIMEOUT: float = 15.0
+    # Devskiller app whose invitation URLs /video accepts and whose API the lookups call
+    DEVSKILLER_APP_URL: str = "https://app.devskiller.com"
+    # Extra comma-separated API paths (or URLs on the app host) to try, with {candidate_id} and
+    # {invitation_id} placeholders
+    DEVSKILLER_VIDEO_API_PATHS: str = os.getenv("DEVSKILLER_VIDEO_API_PATHS", "")
+    DEVSKILLER_HTTP_USER_AGENT: str = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    
+    # Devskiller login session: the periodic check (cron minute field) logs in again this many seconds
+    # before the session cookies expire; sessions without expiring cookies last DEVSKILLER_SESSION_MAX_AGE.
+    # DEVSKILLER_SESSION_COOKIE_NAMES limits which cookies define the expiry (default: devskiller.com cookies
+    # that outlive the refresh margin).
+    DEVSKILLER_SESSION_CHECK_MINUTES: str = "*/15"
+    DEVSKILLER_SESSION_REFRESH_MARGIN: int = 1800
+    DEVSKILLER_SESSION_MAX_AGE: int = 14400
+    DEVSKILLER_SESSION_COOKIE_NAMES: str = ""
+    # One login at a time across workers; a failed login is not retried by other tasks for the backoff period
+    DEVSKILLER_LOGIN_LOCK_TTL: int = 300
+    DEVSKILLER_LOGIN_FAILURE_BACKOFF: int = 60
+    
+    # Navigation profile for Devskiller browser contexts: resource types and hosts blocked by route interception.
+    # DEVSKILLER_FIRST_PARTY_ONLY=true also blocks every host outside the first-party and allowed lists.
+    DEVSKILLER_NAVIGATION_PROFILE_ENABLED: bool = os.getenv("DEVSKILLER_NAVIGATION_PROFILE_ENABLED", "true").lower() == "true"
+    DEVSKILLER_BLOCKED_RESOURCE_TYPES: str = "image,media,font"
+    DEVSKILLER_BLOCKED_HOSTS: str = (
+        "google-analytics.com,googletagmanager.com,doubleclick.net,hotjar.com,segment.io,segment.com,"
+        "intercom.io,intercomcdn.com,fullstory.com,mixpanel.com,hs-analytics.net,hubspot.com,"
+        "facebook.net,clarity.ms,nr-data.net,newrelic.com,sentry.io"
+    )
+    DEVSKILLER_FIRST_PARTY_HOSTS: str = "devskiller.com"
+    DEVSKILLER_ALLOWED_HOSTS: str = ""
+    DEVSKILLER_FIRST_PARTY_ONLY: bool = os.getenv("DEVSKILLER_FIRST_PARTY_ONLY", "false").lower() == "true"
+    
+    # Long-lived Chromium per Celery worker process (each task gets a fresh context; recycled after N contexts)
+    BROWSER_POOL_ENABLED: bool = os.getenv("BROWSER_POOL_ENABLED", "true").lower() == "true"
+    BROWSER_POOL_MAX_USES: int = 50
+    BROWSER_POOL_LAUNCH_TIMEOUT: float = 60.0
+    # Browser jobs run at once per worker process (only above 1 with --pool=threads)
+    BROWSER_POOL_MAX_CONCURRENCY: int = 4
+    
     # Browserbase settings
     BROWSERBASE_API_KEY: Optional[str] = None
     BROWSERBASE_PROJECT_ID: Optional[str] = None
@@ -0,0 +1,113 @@
+import asyncio
+import ipaddress
+import socket
+from typing import Any, Dict, Iterable, List, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("app.core.destinations")
+
+
+class UnsafeDestination(Exception):
+    """The URL points somewhere the hub must not send requests to."""
+
+
+def _hosts(value: str) -> Tuple[str, ...]:
+    return tuple(item.strip().lower().rstrip(".") for item in value.split(",") if item.strip())
+
+
+def _host_matches(host: str, domains: Iterable[str]) -> bool:
+    return any(host == domain or host.endswith(f".{domain}") for domain in domains)
+
+
+def _parse(url: str) -> Tuple[str, int]:
+    """
+    Return the (host, port) of ``url`` after checking its scheme and host lists.
+    """
+    try:
+        parsed = httpx.URL(url)
+    except Exception:
+        raise UnsafeDestination("invalid URL")
+    if parsed.scheme not in ("http", "https"):
+        raise UnsafeDestination("only http and https URLs are allowed")
+    host = parsed.host.lower().rstrip(".")
+    if not host:
+        raise UnsafeDestination("URL has no host")
+    if _host_matches(host, _hosts(settings.OUTBOUND_BLOCKED_HOSTS)):
+        raise UnsafeDestination(f"host {host} is blocked")
+    allowed = _hosts(settings.OUTBOUND_ALLOWED_HOSTS)
+    if allowed and not _host_matches(host, allowed):
+        raise UnsafeDestination(f"host {host} is not allowed")
+    return host, parsed.port or (443 if parsed.scheme == "https" else 80)
+
+
+def _check_addresses(host: str, addresses: List[str]) -> None:
+    if not addresses:
+        raise UnsafeDestination(f"host {host} does not resolve")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        # Loopback, private, link-local (cloud metadata), CGNAT, multicast, reserved...
+        if not ip.is_global or ip.is_multicast:
+            raise UnsafeDestination(f"host {host} resolves to non-public address {ip}")
+
+
+def _literal(host: str) -> List[str]:
+    try:
+        return [str(ipaddress.ip_address(host.strip("[]")))]
+    except ValueError:
+        return []
+
+
+def check_destination(url: str) -> List[str]:
+    """
+    Raise UnsafeDestination unless ``url`` is an http(s) URL of a public host.
+
+    Every address the host resolves to must be public, and the host must
+    pass OUTBOUND_BLOCKED_HOSTS and, when set, OUTBOUND_ALLOWED_HOSTS.
+    Returns the checked addresses (see ``pinned_request``). Resolves the
+    host with a blocking DNS lookup; use ``check_destination_async`` on the
+    event loop.
+    """
+    host, port = _parse(url)
+    addresses = _literal(host)
+    if not addresses:
+        try:
+            addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+        except OSError:
+            raise UnsafeDestination(f"host {host} does not resolve")
+    _check_addresses(host, addresses)
+    return addresses
+
+
+async def check_destination_async(url: str) -> None:
+    """
+    ``check_destination`` for coroutines: the DNS lookup does not block the event loop.
+    """
+    host, port = _parse(url)
+    addresses = _literal(host)
+    if not addresses:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            raise UnsafeDestination(f"host {host} does not resolve")
+        addresses = [info[4][0] for info in infos]
+    _check_addresses(host, addresses)
+
+
+def pinned_request(url: str, address: str) -> Tuple[httpx.URL, Dict[str, str], Dict[str, Any]]:
+    """
+    Return the URL, headers and request extensions that send a request for ``url`` to ``address``.
+
+    The connection goes to the address ``check_destination`` vetted rather
+    than one from a second DNS lookup, which a rebinding host could point at
+    an internal service. The original host is kept in the Host header and,
+    for https, in the TLS server name the certificate is checked against.
+    """
+    parsed = httpx.URL(url)
+    extensions = {"sni_hostname": parsed.host} if parsed.scheme == "https" else {}
+    return parsed.copy_with(host=address), {"Host": parsed.netloc.decode("ascii")}, extensions
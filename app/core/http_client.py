@@ -0,0 +1,78 @@
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("app.core.http_client")
+
+# Hub-wide upstream client. Created in the application lifespan so every
+# request reuses the same keep-alive connection pool instead of paying for a
+# new TCP (and TLS) handshake on each call.
+_upstream_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_upstream_client() -> httpx.AsyncClient:
+    """
+    Build an AsyncClient configured from the UPSTREAM_* settings.
+    """
+    limits = httpx.Limits(
+        max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+    http2 = settings.UPSTREAM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("UPSTREAM_HTTP2 is enabled but the 'h2' package is not installed; falling back to HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(
+        limits=limits,
+        http2=http2,
+        timeout=httpx.Timeout(settings.DEFAULT_TIMEOUT, connect=settings.UPSTREAM_CONNECT_TIMEOUT),
+        # Docling sits on the private network: ask for plain bodies so relayed
+        # and cached results are byte-identical whether streamed or buffered.
+        headers={"Accept-Encoding": "identity"},
+    )
+
+
+async def start_upstream_client() -> httpx.AsyncClient:
+    """
+    Create the shared upstream client. Called once from the application lifespan.
+    """
+    global _upstream_client
+    if _upstream_client is None:
+        _upstream_client = _build_upstream_client()
+        logger.info(
+            f"Upstream HTTP client started (max_connections={settings.UPSTREAM_MAX_CONNECTIONS}, "
+            f"max_keepalive={settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS}, http2={settings.UPSTREAM_HTTP2})"
+        )
+    return _upstream_client
+
+
+async def close_upstream_client() -> None:
+    """
+    Close the shared upstream client and release all pooled connections.
+    """
+    global _upstream_client
+    if _upstream_client is not None:
+        await _upstream_client.aclose()
+        _upstream_client = None
+        logger.info("Upstream HTTP client closed")
+
+
+def get_upstream_client() -> httpx.AsyncClient:
+    """
+    Return the shared upstream client.
+
+    Falls back to creating the client lazily when the application lifespan has
+    not run (e.g. when a service is used from a script or a test client).
+    """
+    global _upstream_client
+    if _upstream_client is None:
+        _upstream_client = _build_upstream_client()
+    return _upstream_client
@@ -0,0 +1,67 @@
+import asyncio
+import weakref
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("app.core.redis_client")
+
+# Shared asyncio Redis client (one connection pool) used by every API route and
+# request-path service; created and closed by the app lifespan. Synchronous
+# Celery task code keeps using the client in app.services.devskiller.
+_async_redis: Optional[aioredis.Redis] = None
+
+# Clients for coroutines that run on other event loops (the worker's browser
+# pool, or a loop per task without it); an asyncio client only works on the
+# loop that created it.
+_loop_redis: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+
+
+def get_async_redis() -> Optional[aioredis.Redis]:
+    """
+    Return the shared asyncio Redis client, or None when Redis is not configured.
+
+    Values are returned as raw bytes (``decode_responses=False``) so binary
+    payloads such as cached conversion results round-trip unchanged.
+    """
+    global _async_redis
+    if _async_redis is None and settings.REDIS_CONN_STRING:
+        _async_redis = aioredis.Redis.from_url(settings.REDIS_CONN_STRING, decode_responses=False)
+    return _async_redis
+
+
+async def close_async_redis() -> None:
+    """
+    Close the shared asyncio Redis client and its connection pool.
+    """
+    global _async_redis
+    if _async_redis is not None:
+        await _async_redis.aclose()
+        _async_redis = None
+        logger.info("Async Redis client closed")
+
+
+def get_loop_redis() -> aioredis.Redis:
+    """
+    Return an asyncio Redis client bound to the running event loop.
+
+    For Celery-side coroutines, which do not run on the API's loop; the
+    loop's owner closes it with ``close_loop_redis``.
+    """
+    loop = asyncio.get_running_loop()
+    client = _loop_redis.get(loop)
+    if client is None:
+        client = _loop_redis[loop] = aioredis.Redis.from_url(settings.REDIS_CONN_STRING, decode_responses=False)
+    return client
+
+
+async def close_loop_redis() -> None:
+    """
+    Close the running event loop's client from ``get_loop_redis``, if it has one.
+    """
+    client = _loop_redis.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
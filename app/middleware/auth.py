@@ -1,5 +1,11 @@
-from fastapi import Request
+import hashlib
+import hmac
+import re
+from typing import Iterable, List, Optional
+
 from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
 from app.core.config import settings
 from app.core.logging import get_logger
 
@@ -12,90 +18,148 @@ AUTH_REQUIRED_PREFIXES = [
 ]
 
 # Paths that explicitly don't require authentication
-AUTH_EXCLUDED_PATHS = [
-    "/health",
-    f"{settings.API_V1_STR}/health",
-]
+AUTH_EXCLUDED_PATHS: List[str] = []
 
 # Exact paths that don't require authentication (not prefixes)
 AUTH_EXCLUDED_EXACT_PATHS = [
     "/",  # Root path only
+    # Liveness only; /health/backends and /health/admission need a token
+    "/health",
+    f"{settings.API_V1_STR}/health",
 ]
 
-async def authenticate_request(request: Request, call_next):
+
+def hash_api_key(key: str) -> bytes:
     """
-    Middleware that authenticates API requests using the configured token.
-    
-    Only endpoints that match AUTH_REQUIRED_PREFIXES require authentication.
-    Paths in AUTH_EXCLUDED_PATHS always bypass authentication.
+    Return the SHA-256 digest under which an API key is checked.
     """
-    path = request.url.path
-    logger.debug(f"Auth middleware processing: {path}")
-    
-    # Check if the exact path is excluded
-    if path in AUTH_EXCLUDED_EXACT_PATHS:
-        logger.debug(f"Path {path} is excluded from auth (exact match)")
-        response = await call_next(request)
-        return response
-    
-    # Check if the path is explicitly excluded from authentication
-    for excluded_path in AUTH_EXCLUDED_PATHS:
-        if excluded_path and path.startswith(excluded_path):
-            logger.debug(f"Path {path} is excluded from auth (matches {excluded_path})")
-            response = await call_next(request)
-            return response
-    
-    # Check if the path requires authentication
-    requires_auth = False
-    for prefix in AUTH_REQUIRED_PREFIXES:
-        if path.startswith(prefix):
-            requires_auth = True
-            logger.debug(f"Path {path} requires auth (matches {prefix})")
-            break
-    
-    # If the path doesn't require authentication, continue
-    if not requires_auth:
-        logger.debug(f"Path {path} does not require auth")
-        response = await call_next(request)
-        return response
-    
-    # Path requires authentication, so verify API key configuration
-    if not settings.API_KEY:
-        logger.critical("Proxy configuration error: API_KEY not set.")
-        logger.critical("Make sure environment variables are properly loaded from .env file.")
-        return JSONResponse(
-            status_code=503, 
-            content={
-                "detail": "Service unavailable: Configuration error - API key not set", 
-                "message": "The API key is not configured. Please check the server configuration."
-            }
-        )
-
-    # Check for Authorization header
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        return JSONResponse(
-            status_code=401, 
-            content={"detail": "Authorization header required"}
-        )
-    
-    # Validate Authorization header format
-    parts = auth_header.split(None, 1)  # Split on first whitespace
-    if len(parts) != 2 or parts[0].lower() != "bearer":
-        return JSONResponse(
-            status_code=401,
-            content={"detail": "Invalid Authorization header format. Expected 'Bearer <token>'"}
-        )
-
-    # Validate token
-    token = parts[1]
-    if token != settings.API_KEY:
-        logger.warning("Authentication attempt with invalid token")
-        return JSONResponse(
-            status_code=401, 
-            content={"detail": "Invalid authorization token"}
-        )
-    
-    # Token is valid, continue with request
-    response = await call_next(request)
-    return response
\ No newline at end of file
+    return hashlib.sha256(key.encode()).digest()
+
+
+def configured_key_hashes() -> List[bytes]:
+    """
+    Digests of every accepted API key.
+
+    Keys come from API_KEY, the comma-separated API_KEYS and, for keys that
+    should not be stored in plain text, the hex SHA-256 digests in
+    API_KEY_HASHES.
+    """
+    keys = [settings.API_KEY, *settings.API_KEYS.split(",")]
+    hashes = [hash_api_key(key.strip()) for key in keys if key.strip()]
+    for digest in settings.API_KEY_HASHES.split(","):
+        digest = digest.strip().lower()
+        if not digest:
+            continue
+        try:
+            hashes.append(bytes.fromhex(digest))
+        except ValueError:
+            logger.error("Ignoring an invalid entry in API_KEY_HASHES (expected a hex SHA-256 digest)")
+    # Duplicates would only make every check slower
+    return list(dict.fromkeys(hashes))
+
+
+def _prefix_pattern(prefixes: Iterable[str], exact: Iterable[str] = ()) -> Optional["re.Pattern[str]"]:
+    alternatives = [re.escape(prefix) for prefix in prefixes if prefix]
+    alternatives += [re.escape(path) + r"\Z" for path in exact if path]
+    if not alternatives:
+        return None
+    return re.compile("|".join(alternatives))
+
+
+class APIKeyAuthMiddleware:
+    """
+    ASGI middleware that authenticates API requests with a bearer token.
+
+    Only paths under AUTH_REQUIRED_PREFIXES require a token; paths in
+    AUTH_EXCLUDED_PATHS (prefixes) and AUTH_EXCLUDED_EXACT_PATHS always
+    bypass it. The path rules are compiled once, and the token's SHA-256
+    digest is compared in constant time against every configured key, so
+    several keys can be issued and rotated independently. The request and
+    response bodies are never touched, so streaming works end to end.
+
+    On success the first 12 hex characters of the key's digest are stored as
+    ``request.state.api_key_id``, identifying the caller without exposing
+    the key.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.required = _prefix_pattern(AUTH_REQUIRED_PREFIXES)
+        self.excluded = _prefix_pattern(AUTH_EXCLUDED_PATHS, AUTH_EXCLUDED_EXACT_PATHS)
+        self.key_hashes = configured_key_hashes()
+
+    def requires_auth(self, path: str) -> bool:
+        if self.excluded is not None and self.excluded.match(path):
+            return False
+        return self.required is not None and self.required.match(path) is not None
+
+    def match_key(self, token: str) -> Optional[bytes]:
+        """
+        Return the digest of the configured key equal to ``token``, or None.
+        """
+        digest = hash_api_key(token)
+        matched = None
+        # Check every key so the timing doesn't depend on which one matched
+        for key_hash in self.key_hashes:
+            if hmac.compare_digest(digest, key_hash):
+                matched = key_hash
+        return matched
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.requires_auth(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        error = self.authenticate(scope)
+        if error is not None:
+            await error(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    def authenticate(self, scope: Scope) -> Optional[JSONResponse]:
+        """
+        Check the request's bearer token; return the error response, or None if valid.
+        """
+        # Path requires authentication, so verify API key configuration
+        if not self.key_hashes:
+            logger.critical("Proxy configuration error: API_KEY not set.")
+            logger.critical("Make sure environment variables are properly loaded from .env file.")
+            return JSONResponse(
+                status_code=503,
+                content={
+                    "detail": "Service unavailable: Configuration error - API key not set",
+                    "message": "The API key is not configured. Please check the server configuration."
+                }
+            )
+
+        # Check for Authorization header
+        auth_header = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                break
+        if not auth_header:
+            return JSONResponse(
+                status_code=401,
+                content={"detail": "Authorization header required"}
+            )
+
+        # Validate Authorization header format
+        parts = auth_header.split(None, 1)  # Split on first whitespace
+        if len(parts) != 2 or parts[0].lower() != "bearer":
+            return JSONResponse(
+                status_code=401,
+                content={"detail": "Invalid Authorization header format. Expected 'Bearer <token>'"}
+            )
+
+        # Validate token
+        key_hash = self.match_key(parts[1])
+        if key_hash is None:
+            logger.warning("Authentication attempt with invalid token")
+            return JSONResponse(
+                status_code=401,
+                content={"detail": "Invalid authorization token"}
+            )
+
+        scope.setdefault("state", {})["api_key_id"] = key_hash.hex()[:12]
+        return None
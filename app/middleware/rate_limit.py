@@ -0,0 +1,68 @@
+from typing import List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.rate_limit import RateLimiter, rate_limiter
+
+logger = get_logger("app.middleware.rate_limit")
+
+# Path prefix -> rate limit group
+RATE_LIMIT_GROUPS = [
+    (f"{settings.API_V1_STR}/document", "document"),
+    (f"{settings.API_V1_STR}/video", "video"),
+    (f"{settings.API_V1_STR}/devskiller", "devskiller"),
+]
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware that applies the per-API-key token buckets.
+
+    Must run inside APIKeyAuthMiddleware, which identifies the caller as
+    ``scope["state"]["api_key_id"]``. Requests without a key id or outside
+    RATE_LIMIT_GROUPS pass through unchecked. Limited requests get
+    ``X-RateLimit-*`` headers on the response; rejected ones a 429 with
+    ``Retry-After``.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter = rate_limiter, groups: List[Tuple[str, str]] = RATE_LIMIT_GROUPS):
+        self.app = app
+        self.limiter = limiter
+        self.groups = groups
+
+    def group_for(self, path: str) -> Optional[str]:
+        for prefix, group in self.groups:
+            if path.startswith(prefix):
+                return group
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        key_id = scope.get("state", {}).get("api_key_id") if scope["type"] == "http" else None
+        group = self.group_for(scope["path"]) if key_id else None
+        result = await self.limiter.check(key_id, group) if group else None
+        if result is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = result.headers()
+        if not result.allowed:
+            logger.warning(f"Rate limit exceeded for key {key_id} on {group}")
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": f"Rate limit exceeded for {group} requests"},
+                headers=headers,
+            )
+            await response(scope, receive, send)
+            return
+
+        raw_headers = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + raw_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,33 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+
+class BatchSource(BaseModel):
+    """A single document URL in a batch conversion."""
+    url: str = Field(..., description="URL of the document to convert")
+    id: Optional[str] = Field(
+        default=None,
+        description="Caller-supplied identifier echoed back in the result line"
+    )
+    headers: Optional[Dict[str, str]] = Field(
+        default=None,
+        description="Optional HTTP headers Docling should send when fetching the URL"
+    )
+    options: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Per-item conversion options, merged over the batch-level options"
+    )
+
+
+class BatchConvertRequest(BaseModel):
+    """Request model for batch conversion of document URLs."""
+    sources: List[BatchSource] = Field(..., min_length=1, description="Documents to convert")
+    options: Dict[str, Any] = Field(
+        default={},
+        description="Conversion options applied to every item"
+    )
+    concurrency: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Maximum number of concurrent conversions (capped by the server limit)"
+    )
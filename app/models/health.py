@@ -1,7 +1,29 @@
 from pydantic import BaseModel
+from typing import Optional
 
 
 class HealthResponse(BaseModel):
     """Health check response model."""
     status: str = "ok"
-    service: str = "G2i AI Hub"
\ No newline at end of file
+    service: str = "G2i AI Hub"
+
+
+class AdmissionStats(BaseModel):
+    """Snapshot of the Docling admission controller."""
+    limit: float
+    in_flight: int
+    queue_depth: int
+    max_queue: int
+    admitted: int
+    rejected: int
+    avg_latency: Optional[float] = None
+
+
+class BackendStats(BaseModel):
+    """Routing state of a single Docling backend."""
+    url: str
+    healthy: bool
+    outstanding: int
+    consecutive_failures: int
+    total_requests: int
+    total_failures: int
@@ -1,6 +1,25 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 
 class VideoResponse(BaseModel):
     """Video response model."""
-    video_url: str
\ No newline at end of file
+    video_url: str
+
+
+class VideoBatchRequest(BaseModel):
+    """Request model for resolving the download links of many invitations."""
+    urls: List[str] = Field(..., min_length=1, description="DevSkiller invitation URLs")
+    refresh: bool = Field(
+        default=False,
+        description="Resolve links again even if results are cached"
+    )
+    tabs: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Maximum number of browser tabs used at once (capped by the server limit)"
+    )
+    callback_url: Optional[str] = Field(
+        default=None,
+        description="URL that receives each queued item's final status as a JSON POST"
+    )
@@ -0,0 +1,199 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("app.services.admission")
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted because the queue is full or timed out."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """
+    A granted slot toward the upstream.
+
+    ``mark_response`` records the upstream latency (time to response headers);
+    ``release`` returns the slot and feeds the outcome into the limit. Both
+    are idempotent so the ticket can be released from several cleanup paths.
+    """
+
+    def __init__(self, controller: "AdmissionController"):
+        self.controller = controller
+        self.started = time.monotonic()
+        self.latency: Optional[float] = None
+        self._released = False
+
+    def mark_response(self) -> None:
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started
+
+    def release(self, ok: bool = True) -> None:
+        if self._released:
+            return
+        self._released = True
+        self.mark_response()
+        self.controller._release(self.latency, ok)
+
+
+class AdmissionController:
+    """
+    AIMD concurrency limiter with a bounded wait queue.
+
+    The limit grows by roughly one slot per fully used window of successful
+    requests (additive increase) and is multiplied by ``backoff_ratio`` when
+    a request fails or exceeds ``latency_target`` (multiplicative decrease,
+    at most once per observed latency window so one burst of slow responses
+    counts once). Requests beyond the limit wait in a FIFO queue; when the
+    queue is full or the wait times out they are rejected with ``Overloaded``.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        max_queue: int,
+        queue_timeout: float,
+        latency_target: float,
+        backoff_ratio: float,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """
+        Estimate how long a rejected client should wait before retrying.
+        """
+        latency = self.avg_latency or 1.0
+        backlog = (self.queue_depth + self.in_flight) / max(self.limit, 1.0)
+        return max(1, math.ceil(latency * backlog))
+
+    async def acquire(self) -> AdmissionTicket:
+        """
+        Wait for a slot toward the upstream.
+
+        Raises:
+            Overloaded: If the queue is full or the slot doesn't free up within
+                ``queue_timeout`` seconds
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return AdmissionTicket(self)
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("Upstream queue is full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # The releasing request hands its slot over by resolving the future
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the timeout fired: keep the slot
+                self.admitted += 1
+                return AdmissionTicket(self)
+            waiter.cancel()
+            self._remove_waiter(waiter)
+            self.rejected += 1
+            raise Overloaded("Timed out waiting for upstream capacity", self.retry_after())
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # Slot was handed to us but the caller went away; pass it on
+                self._release(None, True)
+            else:
+                waiter.cancel()
+                self._remove_waiter(waiter)
+            raise
+        self.admitted += 1
+        return AdmissionTicket(self)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_latency": round(self.avg_latency, 3) if self.avg_latency is not None else None,
+        }
+
+    def _remove_waiter(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _release(self, latency: Optional[float], ok: bool) -> None:
+        self.in_flight -= 1
+        if latency is not None:
+            self._update_limit(latency, ok)
+        self._wake_waiters()
+
+    def _update_limit(self, latency: float, ok: bool) -> None:
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        else:
+            self.avg_latency = 0.8 * self.avg_latency + 0.2 * latency
+
+        now = time.monotonic()
+        if not ok or latency > self.latency_target:
+            if now - self._last_decrease >= min(self.avg_latency, self.latency_target):
+                self._last_decrease = now
+                previous = self.limit
+                self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+                logger.info(
+                    f"Upstream {'error' if not ok else 'slow response'} ({latency:.1f}s): "
+                    f"concurrency limit {previous:.1f} -> {self.limit:.1f}"
+                )
+        elif self.in_flight + 1 >= int(self.limit):
+            # Only grow when the current limit is actually being used
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+
+docling_admission = AdmissionController(
+    initial_limit=settings.ADMISSION_INITIAL_LIMIT,
+    min_limit=settings.ADMISSION_MIN_LIMIT,
+    max_limit=settings.ADMISSION_MAX_LIMIT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    latency_target=settings.ADMISSION_LATENCY_TARGET,
+    backoff_ratio=settings.ADMISSION_BACKOFF_RATIO,
+)
@@ -0,0 +1,258 @@
+import asyncio
+import concurrent.futures
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Optional, TypeVar
+
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+from playwright.async_api import Browser, BrowserContext, Playwright, async_playwright
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis_client import close_loop_redis
+
+logger = get_logger("app.services.browser_pool")
+
+T = TypeVar("T")
+
+
+@dataclass
+class _PooledBrowser:
+    browser: Browser
+    uses: int = 0
+    active: int = 0
+    retired: bool = False
+
+
+class BrowserPool:
+    """
+    One long-lived Chromium per Celery worker process.
+
+    Launching Playwright and Chromium costs seconds and hundreds of MB, so
+    the pool keeps them running on a private event loop in a background
+    thread and hands every task a fresh, isolated browser context instead.
+    A browser is retired after ``max_uses`` contexts or when it disconnects
+    (crash), and closed once its last context is done; the next context
+    gets a newly launched one.
+
+    Tasks are synchronous, so they submit their coroutine with ``run`` and
+    block on the result. A Celery soft time limit raised while waiting
+    cancels the coroutine, which closes its context.
+
+    Several tasks can share the loop at once when the worker runs them in
+    threads (``--pool=threads``): up to ``max_concurrency`` coroutines run
+    concurrently and the rest wait their turn. That pool has no time
+    limits of its own, so ``run`` enforces the task's soft time limit.
+    """
+
+    def __init__(self, max_uses: int, launch_timeout: float, headless: bool = True, max_concurrency: int = 1):
+        self.max_uses = max(1, max_uses)
+        self.launch_timeout = launch_timeout
+        self.headless = headless
+        self.max_concurrency = max(1, max_concurrency)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._playwright: Optional[Playwright] = None
+        self._current: Optional[_PooledBrowser] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and self._loop.is_running()
+
+    def in_pool_loop(self) -> bool:
+        """
+        True when called from a coroutine running on the pool's event loop.
+        """
+        try:
+            return self.running and asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def start(self) -> None:
+        """
+        Start the pool's event loop and launch the first browser.
+
+        A failed launch is logged, not raised; the next context retries it.
+        """
+        with self._start_lock:
+            if not self.running:
+                self._start()
+
+    def _start(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+        self._loop.call_soon(started.set)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="browser-pool", daemon=True)
+        self._thread.start()
+        started.wait()
+        try:
+            asyncio.run_coroutine_threadsafe(self._warm_up(), self._loop).result(timeout=self.launch_timeout)
+        except Exception as e:
+            logger.error(f"Could not launch the pooled browser, will retry on first use: {str(e)}")
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        Run ``coro`` on the pool's event loop and wait for its result.
+
+        Without a running pool (disabled, or outside a worker) the coroutine
+        runs in a fresh event loop, launching its own browser as before.
+        After ``timeout`` seconds (including the wait for a free slot) the
+        coroutine is cancelled and ``SoftTimeLimitExceeded`` raised.
+        """
+        if not settings.BROWSER_POOL_ENABLED:
+            return asyncio.run(self._standalone(coro))
+        if not self.running:
+            self.start()
+        future = asyncio.run_coroutine_threadsafe(self._limited(coro), self._loop)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise SoftTimeLimitExceeded(f"Browser job exceeded {timeout}s")
+        except BaseException:
+            # Soft time limits and other interruptions land here while
+            # waiting; stop the coroutine so its browser context is closed
+            future.cancel()
+            raise
+
+    @asynccontextmanager
+    async def context(self, storage_cookies: Optional[list[dict[str, Any]]] = None) -> AsyncIterator[BrowserContext]:
+        """
+        Yield a new isolated browser context, optionally preloaded with cookies.
+
+        Must be used from a coroutine running on the pool's event loop.
+        """
+        pooled = await self._acquire()
+        try:
+            try:
+                context = await self._new_context(pooled.browser, storage_cookies)
+            except Exception:
+                if pooled.browser.is_connected():
+                    raise
+                # The browser died since it was handed out; retry once on a new one
+                logger.warning("Pooled browser disconnected, relaunching")
+                await self._release(pooled)
+                pooled = await self._acquire()
+                context = await self._new_context(pooled.browser, storage_cookies)
+            try:
+                yield context
+            finally:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close browser context: {str(e)}")
+        finally:
+            await self._release(pooled)
+
+    def shutdown(self) -> None:
+        """
+        Close the browser and Playwright, then stop the event loop.
+        """
+        if not self.running:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_all(), self._loop).result(timeout=30)
+        except Exception as e:
+            logger.warning(f"Browser pool did not shut down cleanly: {str(e)}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+        # Bound to the stopped loop
+        self._lock = None
+        self._slots = None
+        logger.info("Browser pool stopped")
+
+    @staticmethod
+    async def _standalone(coro: Awaitable[T]) -> T:
+        try:
+            return await coro
+        finally:
+            await close_loop_redis()
+
+    async def _limited(self, coro: Awaitable[T]) -> T:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        async with self._slots:
+            return await coro
+
+    async def _warm_up(self) -> None:
+        await self._release(await self._acquire(count_use=False))
+
+    async def _new_context(self, browser: Browser, storage_cookies: Optional[list[dict[str, Any]]]) -> BrowserContext:
+        if storage_cookies:
+            return await browser.new_context(storage_state={"cookies": storage_cookies})
+        return await browser.new_context()
+
+    async def _acquire(self, count_use: bool = True) -> _PooledBrowser:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            current = self._current
+            if current is None or current.uses >= self.max_uses or not current.browser.is_connected():
+                if current is not None:
+                    current.retired = True
+                    if current.active == 0:
+                        await self._close_browser(current)
+                current = self._current = await self._launch()
+            if count_use:
+                current.uses += 1
+            current.active += 1
+            return current
+
+    async def _release(self, pooled: _PooledBrowser) -> None:
+        pooled.active -= 1
+        if pooled.active == 0 and (pooled.retired or not pooled.browser.is_connected()):
+            if self._current is pooled:
+                self._current = None
+            await self._close_browser(pooled)
+
+    async def _launch(self) -> _PooledBrowser:
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch(headless=self.headless)
+        logger.info("Launched pooled Chromium browser")
+        return _PooledBrowser(browser)
+
+    async def _close_browser(self, pooled: _PooledBrowser) -> None:
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f"Failed to close pooled browser: {str(e)}")
+        logger.info(f"Closed pooled Chromium browser after {pooled.uses} contexts")
+
+    async def _close_all(self) -> None:
+        await close_loop_redis()
+        if self._current is not None:
+            await self._close_browser(self._current)
+            self._current = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+browser_pool = BrowserPool(
+    max_uses=settings.BROWSER_POOL_MAX_USES,
+    launch_timeout=settings.BROWSER_POOL_LAUNCH_TIMEOUT,
+    max_concurrency=settings.BROWSER_POOL_MAX_CONCURRENCY,
+)
+
+
+@worker_process_init.connect
+def start_browser_pool(**kwargs):
+    """Launch the worker process's browser before its first task arrives."""
+    if settings.BROWSER_POOL_ENABLED:
+        browser_pool.start()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def stop_browser_pool(**kwargs):
+    # worker_shutdown covers the threads pool, which has no child processes
+    browser_pool.shutdown()
@@ -0,0 +1,469 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from starlette.datastructures import UploadFile
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # older python-multipart releases
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from app.core.compression import THREAD_COMPRESS_MIN_BYTES, add_vary, compress_body, varies_by_encoding
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis_client import get_async_redis
+
+logger = get_logger("app.services.conversion_cache")
+
+# Upstream headers worth replaying on a cache hit; everything else (Date,
+# Server, Content-Length, ...) is regenerated for the new response.
+CACHED_HEADER_NAMES = ("content-type", "content-encoding", "content-disposition")
+
+CACHE_STATUS_HEADER = "X-Cache"
+CACHE_TIER_HEADER = "X-Cache-Tier"
+
+
+@dataclass
+class CachedResult:
+    """A completed Docling response stored in the conversion cache."""
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+    expires_at: float = field(default=0.0, compare=False)
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+    def to_response(self, tier: str, status: str = "HIT") -> Response:
+        """
+        Build a response for a cache hit served from the given tier.
+        """
+        headers = dict(self.headers)
+        headers[CACHE_STATUS_HEADER] = status
+        headers[CACHE_TIER_HEADER] = tier
+        if varies_by_encoding(self.headers.get("content-type")):
+            add_vary(headers)
+        return Response(content=self.body, status_code=self.status_code, headers=headers)
+
+
+class MemoryLRU:
+    """
+    Bounded in-process LRU with per-entry TTL.
+
+    Eviction is driven by both entry count and total body size, so a handful
+    of very large results cannot push the process over its memory budget.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, result: CachedResult) -> None:
+        if result.size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        result.expires_at = time.monotonic() + self.ttl
+        self._entries[key] = result
+        self.total_bytes += result.size
+        while self._entries and (
+            self.total_bytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+
+class ConversionCache:
+    """
+    Two-tier cache for Docling conversion results.
+
+    Lookups hit the in-process LRU first and fall back to Redis; Redis hits are
+    promoted into the LRU. Redis errors are logged and treated as misses so an
+    unavailable Redis never fails a conversion.
+    """
+
+    def __init__(self):
+        self.memory = MemoryLRU(
+            max_bytes=settings.CONVERSION_CACHE_MEMORY_MAX_BYTES,
+            max_entries=settings.CONVERSION_CACHE_MEMORY_MAX_ENTRIES,
+            ttl=settings.CONVERSION_CACHE_MEMORY_TTL,
+        )
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"{settings.CONVERSION_CACHE_REDIS_PREFIX}{key}"
+
+    async def get(self, key: str) -> Tuple[Optional[CachedResult], Optional[str]]:
+        """
+        Look up a result by cache key.
+
+        Returns:
+            Tuple of (result, tier) where tier is "memory" or "redis", or
+            (None, None) on a miss.
+        """
+        result = self.memory.get(key)
+        if result is not None:
+            return result, "memory"
+
+        redis = get_async_redis()
+        if redis is None:
+            return None, None
+        try:
+            stored = await redis.hgetall(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"Conversion cache Redis lookup failed: {str(e)}")
+            return None, None
+        if not stored:
+            return None, None
+
+        try:
+            meta = json.loads(stored[b"meta"])
+            result = CachedResult(
+                status_code=meta["status_code"],
+                headers=meta["headers"],
+                body=stored[b"body"],
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            # A partially written or foreign entry is a miss, not an error
+            logger.warning(f"Ignoring malformed conversion cache entry: {str(e)}")
+            return None, None
+        self.memory.set(key, result)
+        return result, "redis"
+
+    async def set(self, key: str, result: CachedResult) -> None:
+        """
+        Store a result in both tiers, subject to each tier's size limits.
+        """
+        self.memory.set(key, result)
+
+        redis = get_async_redis()
+        if redis is None or result.size > settings.CONVERSION_CACHE_REDIS_MAX_ENTRY_BYTES:
+            return
+        meta = json.dumps({"status_code": result.status_code, "headers": result.headers})
+        redis_key = self._redis_key(key)
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hset(redis_key, mapping={"meta": meta, "body": result.body})
+                pipe.expire(redis_key, settings.CONVERSION_CACHE_REDIS_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Conversion cache Redis store failed: {str(e)}")
+
+    @staticmethod
+    def encoded_key(key: str, encoding: str) -> str:
+        """Cache key of the ``encoding``-compressed variant of a result."""
+        return f"{key}:{encoding}"
+
+    async def get_encoded(self, key: str, result: CachedResult, encoding: str) -> CachedResult:
+        """
+        Return the ``encoding``-compressed variant of a cached result.
+
+        Variants are cached like any other result, so a result is compressed
+        at most once per encoding and the compressed bytes are shared through
+        Redis with the other workers.
+        """
+        variant_key = self.encoded_key(key, encoding)
+        variant, _ = await self.get(variant_key)
+        if variant is not None:
+            return variant
+        headers = dict(result.headers)
+        headers["content-encoding"] = encoding
+        variant = CachedResult(result.status_code, headers, await compress_body(result.body, encoding))
+        if await is_cacheable(result):
+            await self.set(variant_key, variant)
+        return variant
+
+
+def should_bypass_cache(request: Request) -> bool:
+    """
+    Return True when the caller asked to skip the conversion cache.
+
+    Callers can opt out per request with ``Cache-Control: no-cache`` (or
+    ``no-store``) or the ``bypass_cache=true`` query parameter.
+    """
+    if request.query_params.get("bypass_cache", "").lower() in ("1", "true", "yes"):
+        return True
+    cache_control = request.headers.get("Cache-Control", "").lower()
+    return "no-cache" in cache_control or "no-store" in cache_control
+
+
+def _is_failure(body: bytes) -> bool:
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return False
+    return isinstance(payload, dict) and payload.get("status") == "failure"
+
+
+async def is_cacheable(result: CachedResult) -> bool:
+    """
+    Return True when a Docling result may be stored in the cache.
+
+    Docling reports a failed conversion as HTTP 200 with ``"status":
+    "failure"`` in the JSON body, so those are rejected along with non-200
+    responses. Large bodies are parsed off the event loop.
+    """
+    if result.status_code != 200:
+        return False
+    if "json" not in result.headers.get("content-type", ""):
+        return True
+    if result.size >= THREAD_COMPRESS_MIN_BYTES:
+        return not await asyncio.to_thread(_is_failure, result.body)
+    return not _is_failure(result.body)
+
+
+def cacheable_headers(headers) -> Dict[str, str]:
+    """
+    Pick the upstream headers that should be replayed on a cache hit.
+    """
+    return {name: headers[name] for name in CACHED_HEADER_NAMES if name in headers}
+
+
+def cache_key(endpoint: str, normalized: str) -> str:
+    """
+    Cache key of a conversion request: a hash of the endpoint and normalized body.
+    """
+    digest = hashlib.sha256()
+    digest.update(endpoint.encode())
+    digest.update(b"\0")
+    digest.update(normalized.encode())
+    return digest.hexdigest()
+
+
+def multipart_fingerprint(fields: List[Tuple[str, str]], files: List[Tuple[str, str, str]]) -> str:
+    """
+    Normalized form of a multipart upload.
+
+    Args:
+        fields: ``(name, value)`` of each form field, in any order
+        files: ``(field name, filename, SHA-256 of the content)`` of each
+            file, in upload order
+    """
+    return json.dumps({"fields": sorted(fields), "files": files}, separators=(",", ":"))
+
+
+class _RawFingerprint:
+    """Hash of the raw request body, used for content types we don't normalize."""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+
+    def update(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+
+    def normalized(self) -> str:
+        return self._hash.hexdigest()
+
+
+class _JsonFingerprint(_RawFingerprint):
+    """Canonical JSON (sorted keys, compact separators) so key order and whitespace don't matter."""
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+
+    def update(self, chunk: bytes) -> None:
+        super().update(chunk)
+        if len(self._buffer) <= settings.CONVERSION_CACHE_MAX_JSON_BYTES:
+            self._buffer.extend(chunk)
+
+    def normalized(self) -> str:
+        if len(self._buffer) > settings.CONVERSION_CACHE_MAX_JSON_BYTES:
+            return super().normalized()
+        try:
+            return json.dumps(json.loads(self._buffer), sort_keys=True, separators=(",", ":"))
+        except ValueError:
+            return super().normalized()
+
+
+def json_cache_key(endpoint: str, body: bytes) -> str:
+    """
+    Cache key of a JSON request body, as ``cached_request`` computes it.
+    """
+    fingerprint = _JsonFingerprint()
+    fingerprint.update(body)
+    return cache_key(endpoint, fingerprint.normalized())
+
+
+class _MultipartFingerprint(_RawFingerprint):
+    """
+    Boundary-independent digest of a multipart upload.
+
+    Form fields are compared by name and value regardless of order; files are
+    compared by field name, filename and a SHA-256 of their content, in upload
+    order. Fields above CONVERSION_CACHE_MAX_FIELD_BYTES are compared by a
+    SHA-256 of their value too, so no part is held in memory whole. Per-part Content-Type is ignored because clients disagree on it for
+    the same file.
+    """
+
+    def __init__(self, boundary: bytes):
+        super().__init__()
+        self.fields: List[Tuple[str, str]] = []
+        self.files: List[Tuple[str, str, str]] = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._part_name = ""
+        self._part_filename: Optional[str] = None
+        self._part_hash = None
+        self._part_data = bytearray()
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+        self._failed = False
+
+    def update(self, chunk: bytes) -> None:
+        super().update(chunk)
+        if self._failed:
+            return
+        try:
+            self._parser.write(chunk)
+        except Exception as e:
+            logger.debug(f"Multipart fingerprinting failed, falling back to raw hash: {str(e)}")
+            self._failed = True
+
+    def normalized(self) -> str:
+        if self._failed:
+            return super().normalized()
+        return multipart_fingerprint(self.fields, self.files)
+
+    def _on_part_begin(self) -> None:
+        self._disposition = b""
+        self._part_filename = None
+        self._part_hash = hashlib.sha256()
+        self._part_data = bytearray()
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self._part_name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in options:
+            self._part_filename = options[b"filename"].decode("utf-8", "replace")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self._part_hash.update(data[start:end])
+        if self._part_filename is None and len(self._part_data) <= settings.CONVERSION_CACHE_MAX_FIELD_BYTES:
+            self._part_data.extend(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._part_filename is None:
+            if len(self._part_data) > settings.CONVERSION_CACHE_MAX_FIELD_BYTES:
+                value = f"sha256:{self._part_hash.hexdigest()}"
+            else:
+                value = self._part_data.decode("utf-8", "replace")
+            self.fields.append((self._part_name, value))
+        else:
+            self.files.append((self._part_name, self._part_filename, self._part_hash.hexdigest()))
+
+
+def _fingerprint_for(content_type: str) -> _RawFingerprint:
+    media_type, options = parse_options_header(content_type)
+    if media_type == b"application/json":
+        return _JsonFingerprint()
+    if media_type == b"multipart/form-data" and b"boundary" in options:
+        return _MultipartFingerprint(options[b"boundary"])
+    return _RawFingerprint()
+
+
+class SpooledRequestBody:
+    """
+    Request body spooled to a temporary file while its cache key is computed.
+
+    Bodies up to CONVERSION_CACHE_SPOOL_MAX_MEMORY stay in memory; larger ones
+    roll over to disk, so memory stays bounded for large uploads. The spooled
+    bytes are replayed to Docling on a cache miss.
+    """
+
+    def __init__(self, endpoint: str, content_type: str):
+        self.endpoint = endpoint
+        self.content_type = content_type
+        self.size = 0
+        self.key = ""
+        self._file = UploadFile(file=SpooledTemporaryFile(max_size=settings.CONVERSION_CACHE_SPOOL_MAX_MEMORY))
+
+    @classmethod
+    async def from_request(cls, request: Request, endpoint: str) -> "SpooledRequestBody":
+        return await cls.from_stream(request.stream(), endpoint, request.headers.get("Content-Type", ""))
+
+    @classmethod
+    async def from_stream(
+        cls,
+        stream: AsyncIterator[bytes],
+        endpoint: str,
+        content_type: str,
+    ) -> "SpooledRequestBody":
+        body = cls(endpoint, content_type)
+        fingerprint = _fingerprint_for(content_type)
+        try:
+            async for chunk in stream:
+                if not chunk:
+                    continue
+                fingerprint.update(chunk)
+                await body._file.write(chunk)
+                body.size += len(chunk)
+        except BaseException:
+            await body.close()
+            raise
+        await body._file.seek(0)
+        body.key = cache_key(endpoint, fingerprint.normalized())
+        return body
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        await self._file.seek(0)
+        while True:
+            chunk = await self._file.read(settings.STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    async def close(self) -> None:
+        await self._file.close()
+
+
+conversion_cache = ConversionCache()
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import uuid
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis_client import get_async_redis
+from app.services.conversion_cache import CachedResult, conversion_cache, json_cache_key
+from app.services.document_tasks import (
+    SOURCE_ENDPOINT,
+    convert_source_task,
+    job_channel,
+    result_key,
+    status_key,
+    utc_now,
+)
+from app.services.rate_limit import job_quota
+
+logger = get_logger("app.services.conversion_jobs")
+
+# Job priority -> Celery queue. Workers consume the interactive queue before
+# the bulk one, so a backfill never delays user-facing conversions.
+PRIORITY_QUEUES = {
+    "interactive": settings.HUB_JOB_QUEUE_INTERACTIVE,
+    "bulk": settings.HUB_JOB_QUEUE_BULK,
+}
+
+
+def is_hub_job(task_id: str) -> bool:
+    """
+    Return True when ``task_id`` names a hub-managed job rather than a Docling task.
+    """
+    return task_id.startswith(settings.HUB_JOB_ID_PREFIX)
+
+
+async def _finish_cached(redis, job_id: str, priority: str, result: CachedResult) -> dict:
+    """
+    Record a job answered from the conversion cache as already finished.
+    """
+    now = utc_now()
+    status = {
+        "task_id": job_id,
+        "task_status": "success" if result.status_code == 200 else "failure",
+        "task_position": None,
+        "task_meta": {
+            "priority": priority,
+            "submitted_at": now,
+            "finished_at": now,
+            "status_code": result.status_code,
+            "cache": "HIT",
+        },
+    }
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(result_key(job_id), mapping={
+            "status_code": result.status_code,
+            "content_type": result.headers.get("content-type", "application/json"),
+            "body": result.body,
+        })
+        pipe.expire(result_key(job_id), settings.HUB_JOB_TTL)
+        pipe.set(status_key(job_id), json.dumps(status), ex=settings.HUB_JOB_TTL)
+        await pipe.execute()
+    return status
+
+
+async def enqueue_job(
+    payload: bytes,
+    priority: str,
+    api_key_id: Optional[str] = None,
+    use_cache: bool = True
+) -> dict:
+    """
+    Queue a ``/convert/source`` conversion as a hub job.
+
+    A conversion already in the conversion cache finishes at once without
+    being queued; otherwise the worker stores its result in the cache.
+
+    Args:
+        payload: The JSON request body to send to Docling
+        priority: "interactive" or "bulk"
+        api_key_id: Caller whose concurrent-job quota the job counts against
+        use_cache: Whether the job may be served from and stored in the
+            conversion cache
+
+    Returns:
+        The job status, shaped like Docling's async task status
+
+    Raises:
+        HTTPException: 422 for a non-JSON body, 429 when the caller's job
+            quota is used up, 503 when Redis is unavailable
+    """
+    try:
+        json.loads(payload)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Request body must be valid JSON")
+
+    redis = get_async_redis()
+    if redis is None:
+        raise HTTPException(status_code=503, detail="Job queue is unavailable")
+
+    job_id = f"{settings.HUB_JOB_ID_PREFIX}{uuid.uuid4()}"
+    key = None
+    if use_cache and settings.CONVERSION_CACHE_ENABLED:
+        # Shared with synchronous /convert/source requests for the same body
+        key = json_cache_key(SOURCE_ENDPOINT, payload)
+        cached, _ = await conversion_cache.get(key)
+        if cached is not None:
+            logger.info(f"Conversion job {job_id} served from the conversion cache")
+            return await _finish_cached(redis, job_id, priority, cached)
+
+    queue = PRIORITY_QUEUES[priority]
+    await job_quota.reserve(api_key_id, job_id)
+    try:
+        position = await redis.llen(queue)
+        status = {
+            "task_id": job_id,
+            "task_status": "pending",
+            "task_position": position + 1,
+            "task_meta": {"priority": priority, "submitted_at": utc_now()},
+        }
+        await redis.set(status_key(job_id), json.dumps(status), ex=settings.HUB_JOB_TTL)
+        # Publishing to the broker is blocking I/O; keep it off the event loop
+        await asyncio.to_thread(
+            convert_source_task.apply_async,
+            args=[job_id, payload.decode(), key],
+            queue=queue,
+            task_id=job_id,
+        )
+    except Exception as e:
+        logger.error(f"Failed to enqueue conversion job: {str(e)}")
+        await job_quota.release(job_id)
+        raise HTTPException(status_code=503, detail="Job queue is unavailable")
+
+    logger.info(f"Queued conversion job {job_id} ({priority}, position {position + 1})")
+    return status
+
+
+async def get_job_status(job_id: str) -> Optional[dict]:
+    """
+    Return the stored status of a hub job, or None if it is unknown or expired.
+    """
+    redis = get_async_redis()
+    if redis is None:
+        return None
+    stored = await redis.get(status_key(job_id))
+    return json.loads(stored) if stored is not None else None
+
+
+async def get_job_result(job_id: str) -> Optional[Tuple[int, str, bytes]]:
+    """
+    Return the stored Docling response of a finished hub job.
+
+    Returns:
+        Tuple of (status code, content type, body), or None if the job has
+        not finished or its result expired
+    """
+    redis = get_async_redis()
+    if redis is None:
+        return None
+    stored = await redis.hgetall(result_key(job_id))
+    if not stored:
+        return None
+    return int(stored[b"status_code"]), stored[b"content_type"].decode(), stored[b"body"]
@@ -2,22 +2,47 @@ import json
 import os
 import asyncio
 import time
-from typing import Optional, Dict, Any
-from playwright.async_api import Playwright, async_playwright, TimeoutError
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, AsyncIterator, Callable
+from playwright.async_api import BrowserContext, Page, Playwright, async_playwright, TimeoutError
 from dotenv import load_dotenv
 import redis
 
+from app.core.config import settings
+from app.services.browser_pool import BrowserPool
+from app.services.devskiller_http import DevskillerHttpResolver, SessionExpired, find_link_in_responses, same_host
+from app.services.devskiller_navigation import NavigationProfile, StepTimer
+from app.services.devskiller_session import DevskillerSession
+
 load_dotenv()
 
+# For synchronous task code; coroutines use the running loop's asyncio client
 redis_client = redis.Redis.from_url(os.getenv("REDIS_CONN_STRING"))
 
+# Login session shared by all workers (cookies, expiry, login lock)
+session = DevskillerSession(redis_client)
+
+# Browserless lookups with the stored session cookies (one pooled HTTP client per event loop)
+http_resolver = DevskillerHttpResolver(
+    base_url=settings.DEVSKILLER_APP_URL,
+    timeout=settings.DEVSKILLER_HTTP_TIMEOUT,
+)
+
 class Devskiller:
-    def __init__(self):
-        self.base_url = "https://app.devskiller.com"
+    def __init__(self, browser_pool: Optional[BrowserPool] = None):
+        self.base_url = settings.DEVSKILLER_APP_URL
         self.auth_url = "https://auth.devskiller.com"
         self.username = os.getenv("DEVSKILLER_USERNAME") 
         self.password = os.getenv("DEVSKILLER_PASSWORD")
-        # No external browser service required – Playwright will handle the browser locally
+        # No external browser service required – Playwright will handle the browser locally.
+        # Inside a Celery worker the process-wide pool provides the browser.
+        self.browser_pool = browser_pool
+        # Blocks images, fonts, media and trackers in every context we open
+        self.navigation_profile = (
+            NavigationProfile.from_settings() if settings.DEVSKILLER_NAVIGATION_PROFILE_ENABLED else None
+        )
+        # Time spent in each step of the flows run by this instance
+        self.timer = StepTimer()
         
         self._playwright = None
         self._browser = None
@@ -52,61 +77,96 @@ class Devskiller:
         self._page = await self._context.new_page()
 
         return self._page
-        
-    async def update_cookies(self):
+
+    @asynccontextmanager
+    async def browser_context(
+        self,
+        storage_cookies: Optional[list[dict[str, Any]]] = None,
+    ) -> AsyncIterator[BrowserContext]:
+        """Yield an isolated browser context, closing it afterwards.
+
+        When running on the worker's browser pool the context belongs to the
+        pooled browser; otherwise a browser is launched for this call and
+        closed with it.
+        """
+        if self.browser_pool is not None and self.browser_pool.in_pool_loop():
+            async with self.browser_pool.context(storage_cookies) as context:
+                self._context = context
+                if self.navigation_profile is not None:
+                    await self.navigation_profile.apply(context)
+                yield context
+            return
+
         async with async_playwright() as playwright:
-            await self.init_browser(playwright, headless=True)
-
-            if not self.username or not self.password:
-                raise ValueError("DevSkiller credentials not provided.")
-            
-            username = self.username
-            password = self.password
-            
+            await self.init_browser(playwright, headless=True, storage_cookies=storage_cookies)
+            context, browser = self._context, self._browser
             try:
+                if self.navigation_profile is not None:
+                    await self.navigation_profile.apply(context)
+                yield context
+            finally:
+                # Gracefully close resources
+                await context.close()
+                await browser.close()
+
+    @asynccontextmanager
+    async def browser_page(
+        self,
+        storage_cookies: Optional[list[dict[str, Any]]] = None,
+    ) -> AsyncIterator[Page]:
+        """Yield a page in a new isolated context (see ``browser_context``)."""
+        async with self.browser_context(storage_cookies) as context:
+            self._page = context.pages[0] if context.pages else await context.new_page()
+            yield self._page
+
+    async def update_cookies(self):
+        if not self.username or not self.password:
+            raise ValueError("DevSkiller credentials not provided.")
+
+        username = self.username
+        password = self.password
+
+        async with self.browser_page() as page:
+            with self.timer.step("login"):
                 # 1. Load login page
-                await self._page.goto(f"{self.auth_url}/login", wait_until="domcontentloaded")
+                await page.goto(f"{self.auth_url}/login", wait_until="domcontentloaded")
 
                 # 2. Fill in the email address – try several common selectors to make the
                 #    automation more resilient to minor UI changes.
                 print("Filling in email address…")
                 email_selector = "input#email, input[name='email'], input[type='email']"
-                await self._page.locator(email_selector).first.fill(username)
-                if await self._page.locator("input[type='password']").count() == 0:
+                await page.locator(email_selector).first.fill(username)
+                if await page.locator("input[type='password']").count() == 0:
                     # Try clicking the "Next" (or "Continue") button first
-                    next_loc = self._page.locator("button:has-text('Next'), button:has-text('Continue'), button[type='submit']")
+                    next_loc = page.locator("button:has-text('Next'), button:has-text('Continue'), button[type='submit']")
                     if await next_loc.count() > 0:
                         await next_loc.first.click()
                     else:
                         # As a fallback, press Enter in the e-mail field – many auth
                         # forms submit on Enter.
-                        await self._page.locator(email_selector).first.press("Enter")
+                        await page.locator(email_selector).first.press("Enter")
 
                     # Wait for password input to appear
-                    await self._page.wait_for_selector("input[type='password']", timeout=15000)
+                    await page.wait_for_selector("input[type='password']", timeout=15000)
 
-                # 4. Fill in password and submit
+                # 4. Fill in password and submit (fill waits for the field itself)
                 print("Filling password and logging in…")
-                await self._page.get_by_role("button", name="Next").click()
-                await self._page.wait_for_load_state("networkidle")
-                await self._page.get_by_role("textbox", name="Password").fill(password)
-                await self._page.get_by_role("button", name="Log in").click()
-                
-                # Wait longer for the authentication to complete
-                await self._page.wait_for_load_state("networkidle", timeout=30000)
-                
-                # Give the authentication process some extra time to complete
-                await asyncio.sleep(3)
-                
-                # Try to navigate to the base URL with retry mechanism
+                await page.get_by_role("button", name="Next").click()
+                await page.get_by_role("textbox", name="Password").fill(password)
+                await page.get_by_role("button", name="Log in").click()
+
+                # Authentication is done once the auth service redirects away from the form
+                await page.wait_for_url(lambda url: "/login" not in url, timeout=30000)
+
+            # Try to navigate to the base URL with retry mechanism
+            with self.timer.step("navigate"):
                 max_retries = 5
                 for attempt in range(max_retries):
                     try:
                         print(f"Navigating to {self.base_url} (attempt {attempt+1}/{max_retries})...")
-                        # Use a longer timeout and different wait strategy
-                        await self._page.goto(self.base_url, timeout=60000, wait_until="domcontentloaded")
-                        # Wait for network to be idle after page load
-                        await self._page.wait_for_load_state("networkidle", timeout=20000)
+                        await page.goto(self.base_url, timeout=60000, wait_until="domcontentloaded")
+                        # Staying on the app host (not bounced to auth) means the session works
+                        await page.wait_for_url(lambda url: url.startswith(self.base_url), timeout=20000)
                         print(f"Successfully navigated to {self.base_url}")
                         break
                     except Exception as e:
@@ -118,82 +178,194 @@ class Devskiller:
                             await asyncio.sleep(wait_time)
                         else:
                             print("Max retries reached, continuing with current state")
-                
-                # Regular cookies
-                cookies = await self._context.cookies()
-                print(f"Retrieved {len(cookies)} cookies")
-                # Persist cookies for later use (48 h TTL)
-                redis_client.set("devskiller_cookies", json.dumps(cookies), ex=172800)
-                return cookies
-            finally:
-                # Gracefully close resources
-                await self._context.close()
-                await self._browser.close()
+
+            # Regular cookies
+            cookies = await page.context.cookies()
+            print(f"Retrieved {len(cookies)} cookies")
+            # Persist cookies for later use (48 h TTL), with the session's expiry
+            await session.store(cookies)
+            return cookies
+
+    async def refresh_session(self, margin: float = 0.0, rejected: Optional[list[dict]] = None) -> list[dict[str, Any]]:
+        """Return usable session cookies, logging in first if they are missing,
+        expire within ``margin`` seconds or are the ``rejected`` ones.
+
+        Only one login runs across all workers; concurrent callers wait for it.
+        """
+        return await session.ensure_fresh(self.update_cookies, margin=margin, rejected=rejected)
 
 
     async def get_video_url(self, video_url: str):
-        """Get video URL from Devskiller"""
-        async with async_playwright() as playwright:
+        """Get video URL from Devskiller
+
+        Tries the browserless HTTP lookup first and only drives the browser
+        when it cannot find the link.
+        """
+        cookies = await self.stored_cookies()
+        if settings.DEVSKILLER_HTTP_RESOLVER_ENABLED:
             try:
-                # Get tokens from Redis
-                redis_cookies = redis_client.get("devskiller_cookies")
-
-                print(redis_cookies)
-                
-                if not redis_cookies:
-                    print("No cookies found in Redis, refreshing session...")
-                    await self.update_cookies()
-                    redis_cookies = redis_client.get("devskiller_cookies")
-                    if not redis_cookies:
-                        raise ValueError("Failed to refresh cookies")
-                
-                redis_cookies = json.loads(redis_cookies)
-                
-                # Initialise browser *with the stored cookies pre-loaded* so the
-                # very first navigation already carries the correct Cookie header.
-                await self.init_browser(playwright, storage_cookies=redis_cookies)
-
-                # Navigate to target video page with retry mechanism
-                max_retries = 3
-                for attempt in range(max_retries):
+                with self.timer.step("http_lookup"):
+                    download_link = await http_resolver.resolve(video_url, cookies)
+                if download_link:
+                    print(f"Download link (HTTP): {download_link}")
+                    return download_link
+                print("HTTP lookup found no download link, using the browser...")
+            except SessionExpired as e:
+                print(f"Stored session rejected ({str(e)}), refreshing cookies...")
+                cookies = await self.refresh_session(rejected=cookies)
+            except Exception as e:
+                print(f"HTTP lookup failed, using the browser: {str(e)}")
+        return await self.get_video_url_browser(video_url, cookies)
+
+    async def stored_cookies(self) -> list[dict[str, Any]]:
+        """Return the session cookies kept in Redis, logging in first if there are none
+        or they have expired."""
+        return await self.refresh_session()
+
+    async def get_video_url_browser(self, video_url: str, cookies: Optional[list[dict]] = None):
+        """Get video URL from Devskiller by driving the browser
+
+        Only a session rejected by Devskiller (a redirect to the login page)
+        triggers a new login, after which the lookup is tried once more.
+        """
+        redis_cookies = cookies or await self.stored_cookies()
+        try:
+            # Open a page *with the stored cookies pre-loaded* so the very
+            # first navigation already carries the correct Cookie header.
+            async with self.browser_page(storage_cookies=redis_cookies) as page:
+                return await self.resolve_on_page(page, video_url, self.timer)
+        except SessionExpired as e:
+            print(f"Session expired ({str(e)}), refreshing cookies...")
+            redis_cookies = await self.refresh_session(rejected=redis_cookies)
+        except Exception as e:
+            print(f"Error in get_video_url: {str(e)}")
+            raise
+
+        async with self.browser_page(storage_cookies=redis_cookies) as page:
+            return await self.resolve_on_page(page, video_url, self.timer)
+
+    async def resolve_on_page(self, page: Page, video_url: str, timer: Optional[StepTimer] = None):
+        """Open an invitation in ``page`` and read its "Download video" link.
+
+        Each step waits for the element it needs next rather than for the
+        network to go idle; ``timer`` records how long each one took.
+        """
+        timer = timer or StepTimer()
+        # Keep the app's JSON responses so the HTTP lookup can learn
+        # which API call carries the download link
+        api_responses = []
+
+        def keep_api_response(response) -> None:
+            if "json" in response.headers.get("content-type", "") and same_host(response.url, self.base_url):
+                api_responses.append(response)
+
+        page.on("response", keep_api_response)
+        section_link = page.get_by_role("link", name="Section 2", exact=False)
+
+        # Navigate to target video page with retry mechanism
+        with timer.step("navigate"):
+            max_retries = 3
+            for attempt in range(max_retries):
+                try:
+                    print(f"Navigating to {video_url} (attempt {attempt+1}/{max_retries})...")
+                    await page.goto(video_url, timeout=30000, wait_until="domcontentloaded")
+                    if page.url.startswith(self.auth_url):
+                        raise SessionExpired("Devskiller redirected to the login page")
+                    await section_link.wait_for(timeout=15000)
+                    break
+                except SessionExpired:
+                    raise
+                except Exception as e:
+                    print(f"Navigation error: {str(e)}")
+                    if attempt < max_retries - 1:
+                        await asyncio.sleep(2)
+                    else:
+                        raise ValueError(f"Failed to navigate to video URL after {max_retries} attempts")
+
+        # Navigate to Section 2
+        with timer.step("section_click"):
+            print("Clicking on Section 2...")
+            await section_link.click()
+
+        # Wait for download link and get it
+        with timer.step("link_found"):
+            print("Waiting for download link...")
+            download_link_locator = page.get_by_role("link", name="Download video")
+            await download_link_locator.wait_for(timeout=15000)
+            download_link = await download_link_locator.get_attribute("href")
+        print(f"Download link: {download_link}")
+        if settings.DEVSKILLER_HTTP_RESOLVER_ENABLED and download_link:
+            await self._learn_api_path(api_responses, download_link, video_url)
+        return download_link
+
+    async def get_video_urls(
+        self,
+        video_urls: list[str],
+        concurrency: int,
+        on_result: Callable[[str, Optional[str], Optional[str], Dict[str, float]], None],
+    ) -> None:
+        """Resolve several invitations in one browser context.
+
+        Each URL first tries the HTTP lookup; the rest are opened in tabs of
+        a single context (one cookie load, one login state), at most
+        ``concurrency`` at a time. ``on_result(video_url, link, error, timings)``
+        is called in a worker thread as each one finishes, so it may block (it
+        stores the result with sync Redis). If the stored session was rejected the
+        cookies are refreshed at the end, so a retry of the failures uses
+        the new session.
+        """
+        redis_cookies = await self.stored_cookies()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        session_expired = False
+
+        async with self.browser_context(storage_cookies=redis_cookies) as context:
+            async def resolve(video_url: str):
+                nonlocal session_expired
+                timer = StepTimer()
+                async with semaphore:
                     try:
-                        print(f"Navigating to {video_url} (attempt {attempt+1}/{max_retries})...")
-                        await self._page.goto(video_url, timeout=30000, wait_until="domcontentloaded")
-                        await self._page.wait_for_load_state("networkidle", timeout=15000)
-                        break
+                        download_link = None
+                        if settings.DEVSKILLER_HTTP_RESOLVER_ENABLED:
+                            try:
+                                with timer.step("http_lookup"):
+                                    download_link = await http_resolver.resolve(video_url, redis_cookies)
+                            except SessionExpired:
+                                session_expired = True
+                            except Exception as e:
+                                print(f"HTTP lookup failed for {video_url}, using a tab: {str(e)}")
+                        if not download_link:
+                            page = await context.new_page()
+                            try:
+                                download_link = await self.resolve_on_page(page, video_url, timer)
+                            finally:
+                                await page.close()
+                        if not download_link:
+                            raise ValueError("Download link not found")
                     except Exception as e:
-                        print(f"Navigation error: {str(e)}")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(2)
-                        else:
-                            raise ValueError(f"Failed to navigate to video URL after {max_retries} attempts")
-
-                # Navigate to Section 2
-                print("Clicking on Section 2...")
-                await self._page.get_by_role("link", name="Section 2", exact=False).click()
-                
-                # Wait for download link and get it
-                print("Waiting for download link...")
-                await self._page.wait_for_selector("a:has-text('Download video')", timeout=15000)
-                
-                # Get download link
-                download_link = await self._page.get_by_role("link", name="Download video").get_attribute("href")
-                print(f"Download link: {download_link}")
-                return download_link
-            except Exception as e:
-                print(f"Error in get_video_url: {str(e)}")
-                # If we get an error that might be related to expired cookies, try refreshing them
-                if "session" in str(e).lower() or "unauthorized" in str(e).lower() or "permission" in str(e).lower():
-                    print("Session might be expired, attempting to refresh cookies...")
-                    await self.update_cookies()
-                    print("Cookies refreshed, please try your request again")
-                raise
-            finally:
-                # Clean up
-                if self._page:
-                    await self._context.close()
-                if self._browser:
-                    await self._browser.close()
+                        if isinstance(e, SessionExpired):
+                            session_expired = True
+                        print(f"Error resolving {video_url}: {str(e)}")
+                        await asyncio.to_thread(on_result, video_url, None, str(e), timer.steps)
+                        return
+                    await asyncio.to_thread(on_result, video_url, download_link, None, timer.steps)
+
+            await asyncio.gather(*(resolve(video_url) for video_url in video_urls))
+
+        if session_expired:
+            print("Stored session rejected during the batch, refreshing cookies...")
+            await self.refresh_session(rejected=redis_cookies)
+
+    async def _learn_api_path(self, responses, download_link: str, video_url: str) -> None:
+        """Record which captured API response contained the download link."""
+        bodies = []
+        for response in responses[:50]:
+            try:
+                bodies.append((response.url, await response.text()))
+            except Exception:
+                continue
+        source_url = find_link_in_responses(bodies, download_link)
+        if source_url:
+            await http_resolver.learn(source_url, video_url)
 
 async def main():
     devskiller = Devskiller()
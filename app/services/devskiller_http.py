@@ -0,0 +1,264 @@
+import asyncio
+import html
+import json
+import re
+import time
+from typing import Any, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import httpx
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis_client import get_loop_redis
+
+logger = get_logger("app.services.devskiller_http")
+
+COOKIES_KEY = "devskiller_cookies"
+# API URLs (with {candidate_id}/{invitation_id} placeholders) whose JSON held a
+# download link during a browser lookup
+LEARNED_PATHS_KEY = "devskiller_video_api_paths"
+LEARNED_PATHS_TTL = 30 * 86400
+
+INVITATION_PATTERN = re.compile(r"candidates/([^/]+)/detail/invitations/([^/?#]+)")
+VIDEO_EXTENSIONS = (".mp4", ".webm", ".mov", ".m4v", ".mkv")
+VIDEO_KEYS = ("downloadurl", "videourl", "recordingurl", "downloadlink", "videolink")
+URL_PATTERN = re.compile(r"https?://[^\s\"'<>\\]+")
+DOWNLOAD_ANCHOR_PATTERN = re.compile(
+    r"<a\b[^>]*\bhref=[\"']([^\"']+)[\"'][^>]*>(?:(?!</a>).)*?download\s+video",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+class SessionExpired(Exception):
+    """The stored Devskiller cookies were rejected."""
+
+
+def invitation_ids(url: str) -> Optional[Tuple[str, str]]:
+    """
+    Return (candidate_id, invitation_id) from a Devskiller invitation URL.
+    """
+    match = INVITATION_PATTERN.search(url)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def cookie_header(cookies: Iterable[dict], url: str) -> str:
+    """
+    Build the Cookie header Playwright's stored cookies would send to ``url``.
+    """
+    parsed = urlparse(url)
+    host = parsed.hostname or ""
+    path = parsed.path or "/"
+    now = time.time()
+    pairs = []
+    for cookie in cookies:
+        domain = cookie.get("domain", "").lstrip(".")
+        if domain and host != domain and not host.endswith(f".{domain}"):
+            continue
+        if not path.startswith(cookie.get("path") or "/"):
+            continue
+        expires = cookie.get("expires", -1)
+        if expires not in (None, -1) and expires < now:
+            continue
+        if cookie.get("secure") and parsed.scheme != "https":
+            continue
+        pairs.append(f"{cookie['name']}={cookie['value']}")
+    return "; ".join(pairs)
+
+
+def same_host(url: str, base_url: str) -> bool:
+    """
+    True when ``url`` is on the host of ``base_url``.
+    """
+    host = urlparse(url).hostname
+    return host is not None and host == urlparse(base_url).hostname
+
+
+def looks_like_video(url: str, invitation_id: str) -> bool:
+    """
+    True for a video file or download URL of this invitation.
+
+    Pages also link help-centre articles and marketing videos, so a URL
+    that does not mention the invitation is never taken for its recording.
+    """
+    path = urlparse(url).path.lower()
+    if invitation_id not in url:
+        return False
+    return path.endswith(VIDEO_EXTENSIONS) or ("download" in path and "video" in path)
+
+
+def find_link_in_json(data: Any, invitation_id: str) -> Optional[str]:
+    """
+    Return the first video download URL of this invitation in a decoded JSON document.
+
+    Values under keys like ``downloadUrl`` win over other URLs, which are
+    only used when they look like a video file. Either must mention the
+    invitation.
+    """
+    fallback = None
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(value, str) and value.startswith("http"):
+                    if invitation_id not in value:
+                        continue
+                    if key.lower() in VIDEO_KEYS:
+                        return value
+                    if fallback is None and looks_like_video(value, invitation_id):
+                        fallback = value
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        elif isinstance(node, list):
+            stack.extend(node)
+    return fallback
+
+
+def find_link_in_html(page: str, base_url: str, invitation_id: str) -> Optional[str]:
+    """
+    Return the "Download video" link of a server-rendered page, or a video URL of this invitation in it.
+    """
+    match = DOWNLOAD_ANCHOR_PATTERN.search(page)
+    if match:
+        return urljoin(base_url, html.unescape(match.group(1)))
+    for candidate in URL_PATTERN.findall(html.unescape(page)):
+        if looks_like_video(candidate, invitation_id):
+            return candidate
+    return None
+
+
+def path_template(url: str, candidate_id: str, invitation_id: str) -> Optional[str]:
+    """
+    Turn an API URL seen by the browser into a path template for other invitations.
+
+    Only the path and query are kept; they are joined to the app URL when
+    used. Returns None when the URL does not mention the invitation, since
+    it could not be reused for another one.
+    """
+    parsed = urlparse(url)
+    target = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+    if invitation_id not in parsed.path + parsed.query:
+        return None
+    return target.replace(invitation_id, "{invitation_id}").replace(candidate_id, "{candidate_id}")
+
+
+class DevskillerHttpResolver:
+    """
+    Resolves Devskiller video download links over plain HTTP.
+
+    Uses the browser session cookies stored in Redis and one pooled
+    ``httpx`` client and asyncio Redis client per event loop, so a lookup
+    costs a few requests, no browser, and never blocks the loop. It tries the API paths learned from earlier browser lookups
+    (plus ``DEVSKILLER_VIDEO_API_PATHS``) and then the invitation page
+    itself, and only ever sends the cookies to the host of ``base_url``.
+    Returns None when none of them reveal the link, and raises
+    ``SessionExpired`` when Devskiller rejects the cookies; callers fall
+    back to the browser in both cases.
+    """
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def client(self) -> httpx.AsyncClient:
+        # Clients are bound to the loop they were first used on; workers
+        # without the browser pool get a new loop per task
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=False,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                headers={"User-Agent": settings.DEVSKILLER_HTTP_USER_AGENT},
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def stored_cookies(self) -> Optional[List[dict]]:
+        stored = await get_loop_redis().get(COOKIES_KEY)
+        return json.loads(stored) if stored else None
+
+    async def api_paths(self) -> List[str]:
+        learned = [path.decode() for path in await get_loop_redis().smembers(LEARNED_PATHS_KEY)]
+        configured = [path.strip() for path in settings.DEVSKILLER_VIDEO_API_PATHS.split(",") if path.strip()]
+        return list(dict.fromkeys(configured + sorted(learned)))
+
+    async def learn(self, url: str, video_url: str) -> None:
+        """
+        Remember the API URL whose response held the download link of ``video_url``.
+        """
+        ids = invitation_ids(video_url)
+        if ids is None or not same_host(url, self.base_url):
+            return
+        template = path_template(url, *ids)
+        if template is None:
+            return
+        async with get_loop_redis().pipeline() as pipe:
+            pipe.sadd(LEARNED_PATHS_KEY, template)
+            pipe.expire(LEARNED_PATHS_KEY, LEARNED_PATHS_TTL)
+            await pipe.execute()
+        logger.info(f"Learned Devskiller video API URL {template}")
+
+    async def resolve(self, video_url: str, cookies: Optional[List[dict]] = None) -> Optional[str]:
+        ids = invitation_ids(video_url)
+        cookies = cookies if cookies is not None else await self.stored_cookies()
+        if ids is None or not cookies or not same_host(video_url, self.base_url):
+            return None
+        candidate_id, invitation_id = ids
+
+        for template in await self.api_paths():
+            url = urljoin(self.base_url, template.format(candidate_id=candidate_id, invitation_id=invitation_id))
+            if not same_host(url, self.base_url):
+                logger.warning(f"Ignoring Devskiller API path {template} outside {self.base_url}")
+                continue
+            response = await self._get(url, cookies, accept="application/json")
+            if response is None:
+                continue
+            try:
+                link = find_link_in_json(response.json(), invitation_id)
+            except ValueError:
+                continue
+            if link:
+                return link
+
+        response = await self._get(video_url, cookies, accept="text/html,application/xhtml+xml")
+        if response is None:
+            return None
+        return find_link_in_html(response.text, str(response.url), invitation_id)
+
+    async def _get(self, url: str, cookies: List[dict], accept: str) -> Optional[httpx.Response]:
+        try:
+            response = await self.client().get(url, headers={"Cookie": cookie_header(cookies, url), "Accept": accept})
+        except httpx.HTTPError as e:
+            logger.warning(f"Devskiller request to {url} failed: {str(e)}")
+            return None
+        if response.status_code in (401, 403):
+            raise SessionExpired(f"Devskiller returned {response.status_code}")
+        if response.is_redirect:
+            location = response.headers.get("location", "")
+            # Unauthenticated requests are sent to the login page
+            if "auth." in urlparse(urljoin(url, location)).netloc or "login" in location:
+                raise SessionExpired("Devskiller redirected to the login page")
+            return None
+        if response.status_code != 200:
+            return None
+        return response
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def find_link_in_responses(bodies: Iterable[Tuple[str, str]], link: str) -> Optional[str]:
+    """
+    Return the URL of the first captured response whose body contains ``link``.
+    """
+    escaped = link.replace("/", "\\/")
+    for url, body in bodies:
+        if link in body or escaped in body:
+            return url
+    return None
@@ -0,0 +1,92 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterator, Tuple
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext, Route
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("app.services.devskiller_navigation")
+
+
+def _split(value: str) -> Tuple[str, ...]:
+    return tuple(item.strip().lower() for item in value.split(",") if item.strip())
+
+
+def _host_matches(host: str, domains: Tuple[str, ...]) -> bool:
+    return any(host == domain or host.endswith(f".{domain}") for domain in domains)
+
+
+@dataclass(frozen=True)
+class NavigationProfile:
+    """
+    Which requests a Devskiller browser context may make.
+
+    Resource types in ``blocked_types`` (images, fonts, media by default)
+    are never loaded; neither is anything from ``blocked_hosts`` (analytics
+    and trackers). With ``first_party_only`` every host outside
+    ``first_party_hosts`` and ``allowed_hosts`` is blocked too.
+    """
+
+    blocked_types: FrozenSet[str]
+    first_party_hosts: Tuple[str, ...]
+    allowed_hosts: Tuple[str, ...] = ()
+    blocked_hosts: Tuple[str, ...] = ()
+    first_party_only: bool = False
+
+    @classmethod
+    def from_settings(cls) -> "NavigationProfile":
+        return cls(
+            blocked_types=frozenset(_split(settings.DEVSKILLER_BLOCKED_RESOURCE_TYPES)),
+            first_party_hosts=_split(settings.DEVSKILLER_FIRST_PARTY_HOSTS),
+            allowed_hosts=_split(settings.DEVSKILLER_ALLOWED_HOSTS),
+            blocked_hosts=_split(settings.DEVSKILLER_BLOCKED_HOSTS),
+            first_party_only=settings.DEVSKILLER_FIRST_PARTY_ONLY,
+        )
+
+    def allows(self, url: str, resource_type: str) -> bool:
+        if resource_type in self.blocked_types:
+            return False
+        host = (urlparse(url).hostname or "").lower()
+        if not host:
+            # data:, blob: and similar URLs never leave the browser
+            return True
+        if _host_matches(host, self.blocked_hosts):
+            return False
+        if self.first_party_only:
+            return _host_matches(host, self.first_party_hosts + self.allowed_hosts)
+        return True
+
+    async def apply(self, context: BrowserContext) -> None:
+        """
+        Install the profile on ``context``, covering every page opened in it.
+        """
+        async def handle(route: Route) -> None:
+            request = route.request
+            if self.allows(request.url, request.resource_type):
+                await route.continue_()
+            else:
+                await route.abort("blockedbyclient")
+
+        await context.route("**/*", handle)
+
+
+@dataclass
+class StepTimer:
+    """
+    Wall-clock time of each named step of a browser flow, in milliseconds.
+    """
+
+    steps: Dict[str, float] = field(default_factory=dict)
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = round((time.perf_counter() - started) * 1000, 1)
+            self.steps[name] = round(self.steps.get(name, 0.0) + elapsed, 1)
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis_client import get_loop_redis
+from app.services.devskiller_navigation import _host_matches, _split
+
+logger = get_logger("app.services.devskiller_session")
+
+COOKIES_KEY = "devskiller_cookies"
+COOKIES_TTL = 172800
+# When the stored session is expected to stop working (epoch seconds)
+EXPIRES_KEY = "devskiller_cookies_expires_at"
+LOGIN_LOCK_KEY = "devskiller_login_lock"
+# Set for a short while after a failed login so waiting tasks do not all retry it
+LOGIN_FAILED_KEY = "devskiller_login_failed"
+
+# Deletes the lock only if it is still held by the given token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LoginUnavailable(Exception):
+    """No usable session and a login cannot be run right now."""
+
+
+def session_expiry(cookies: List[dict], now: Optional[float] = None) -> Optional[float]:
+    """
+    Return when the first Devskiller session cookie expires, or None if none do.
+
+    Only first-party cookies count, and only those named in
+    ``DEVSKILLER_SESSION_COOKIE_NAMES`` when that is set. Otherwise cookies
+    that expire within ``DEVSKILLER_SESSION_REFRESH_MARGIN`` are ignored:
+    short-lived tracking or CSRF cookies would make every check log in again.
+    """
+    now = time.time() if now is None else now
+    domains = _split(settings.DEVSKILLER_FIRST_PARTY_HOSTS)
+    names = _split(settings.DEVSKILLER_SESSION_COOKIE_NAMES)
+    expiries = [
+        cookie["expires"]
+        for cookie in cookies
+        if (cookie.get("expires") or -1) > 0
+        and _host_matches(cookie.get("domain", "").lstrip(".").lower(), domains)
+        and (
+            cookie.get("name", "").lower() in names
+            if names
+            else cookie["expires"] - now > settings.DEVSKILLER_SESSION_REFRESH_MARGIN
+        )
+    ]
+    return min(expiries) if expiries else None
+
+
+class DevskillerSession:
+    """
+    The Devskiller login session shared by every worker through Redis.
+
+    Stores the cookies with the time they expire (the earliest session
+    cookie, or ``DEVSKILLER_SESSION_MAX_AGE`` after the login when none of
+    them expire). ``ensure_fresh`` logs in only when the session is
+    missing, about to expire or was rejected, and only one process does
+    so at a time: the others wait for its cookies instead of starting
+    logins of their own.
+
+    Synchronous task code uses ``redis_client``; the coroutines use the
+    running loop's asyncio client, so several browser jobs sharing the
+    pool's loop never block each other on Redis.
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    def cookies(self) -> Optional[List[dict[str, Any]]]:
+        stored = self.redis.get(COOKIES_KEY)
+        return json.loads(stored) if stored else None
+
+    def expires_at(self, cookies: Optional[List[dict]] = None) -> Optional[float]:
+        cookies = cookies if cookies is not None else self.cookies()
+        return self._expiry(self.redis.get(EXPIRES_KEY), cookies)
+
+    def needs_refresh(self, margin: float = 0.0) -> bool:
+        """
+        True when there is no session or it expires within ``margin`` seconds.
+        """
+        stored_cookies, stored_expiry = self.redis.mget(COOKIES_KEY, EXPIRES_KEY)
+        cookies = json.loads(stored_cookies) if stored_cookies else None
+        return self._stale(cookies, self._expiry(stored_expiry, cookies), margin, rejected=None)
+
+    async def load(self) -> Tuple[Optional[List[dict[str, Any]]], Optional[float]]:
+        """
+        Return the stored cookies and when they expire, in one round trip.
+        """
+        stored_cookies, stored_expiry = await get_loop_redis().mget(COOKIES_KEY, EXPIRES_KEY)
+        cookies = json.loads(stored_cookies) if stored_cookies else None
+        return cookies, self._expiry(stored_expiry, cookies)
+
+    async def store(self, cookies: List[dict[str, Any]]) -> None:
+        expires_at = session_expiry(cookies) or time.time() + settings.DEVSKILLER_SESSION_MAX_AGE
+        async with get_loop_redis().pipeline() as pipe:
+            pipe.set(COOKIES_KEY, json.dumps(cookies), ex=COOKIES_TTL)
+            pipe.set(EXPIRES_KEY, str(expires_at), ex=COOKIES_TTL)
+            await pipe.execute()
+
+    async def ensure_fresh(
+        self,
+        login: Callable[[], Awaitable[List[dict[str, Any]]]],
+        margin: float = 0.0,
+        rejected: Optional[List[dict]] = None,
+    ) -> List[dict[str, Any]]:
+        """
+        Return usable session cookies, running ``login`` only if needed.
+
+        ``rejected`` is the session Devskiller just turned away: it is
+        replaced unless another process already did so. ``login`` must
+        store the new cookies (see ``store``) and return them. While
+        another process holds the login lock this waits for its result;
+        after a failed login, ``LoginUnavailable`` is raised for
+        ``DEVSKILLER_LOGIN_FAILURE_BACKOFF`` seconds instead of retrying.
+        """
+        redis = get_loop_redis()
+        deadline = time.monotonic() + settings.DEVSKILLER_LOGIN_LOCK_TTL
+        while True:
+            cookies, expires_at = await self.load()
+            if not self._stale(cookies, expires_at, margin, rejected):
+                return cookies
+            failure = await redis.get(LOGIN_FAILED_KEY)
+            if failure:
+                raise LoginUnavailable(f"Devskiller login failed recently: {failure.decode()}")
+
+            token = uuid.uuid4().hex
+            if await redis.set(LOGIN_LOCK_KEY, token, nx=True, ex=settings.DEVSKILLER_LOGIN_LOCK_TTL):
+                try:
+                    # Another process may have logged in since the read above
+                    cookies, expires_at = await self.load()
+                    if not self._stale(cookies, expires_at, margin, rejected):
+                        return cookies
+                    logger.info("Logging in to Devskiller")
+                    try:
+                        cookies = await login()
+                    except Exception as e:
+                        await redis.set(LOGIN_FAILED_KEY, str(e)[:500], ex=settings.DEVSKILLER_LOGIN_FAILURE_BACKOFF)
+                        raise
+                    await redis.delete(LOGIN_FAILED_KEY)
+                    return cookies
+                finally:
+                    await redis.eval(RELEASE_LOCK_SCRIPT, 1, LOGIN_LOCK_KEY, token)
+
+            if time.monotonic() > deadline:
+                raise LoginUnavailable("Timed out waiting for another Devskiller login")
+            await asyncio.sleep(1)
+
+    @staticmethod
+    def _expiry(stored: Optional[bytes], cookies: Optional[List[dict]]) -> Optional[float]:
+        if stored:
+            return float(stored)
+        # Cookies stored before expiry tracking existed
+        return session_expiry(cookies) if cookies else None
+
+    @staticmethod
+    def _stale(
+        cookies: Optional[List[dict]],
+        expires_at: Optional[float],
+        margin: float,
+        rejected: Optional[List[dict]],
+    ) -> bool:
+        if not cookies:
+            return True
+        if rejected is not None and cookies == rejected:
+            return True
+        return expires_at is not None and expires_at - time.time() <= margin
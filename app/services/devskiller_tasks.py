@@ -1,8 +1,16 @@
+import hashlib
+import hmac
 import json
 import re
+from typing import Optional
+
+import httpx
 from app.core.celery_app import celery_app
-from app.services.devskiller import Devskiller, redis_client
-import asyncio
+from app.core.config import settings
+from app.core.destinations import UnsafeDestination, check_destination, pinned_request
+from app.services.browser_pool import browser_pool
+from app.services.devskiller import Devskiller, redis_client, session
+from app.services.worker_loop import soft_time_limit
 from datetime import datetime, timezone
 from celery.exceptions import SoftTimeLimitExceeded
 import logging
@@ -18,48 +26,194 @@ def extract_ids_from_url(url):
         return candidate_id, invitation_id
     return None, None
 
+def video_key(candidate_id: str, invitation_id: str) -> str:
+    return f"video:{candidate_id}:{invitation_id}"
+
+
+def video_lease_key(candidate_id: str, invitation_id: str) -> str:
+    return f"video_lease:{candidate_id}:{invitation_id}"
+
+
+def video_channel(candidate_id: str, invitation_id: str) -> str:
+    """Pub/sub channel that receives the invitation's final status."""
+    return f"video_done:{candidate_id}:{invitation_id}"
+
+
+def video_callbacks_key(candidate_id: str, invitation_id: str) -> str:
+    return f"video_callbacks:{candidate_id}:{invitation_id}"
+
+
+def is_final(status: Optional[dict]) -> bool:
+    return status is not None and status.get("status") in ("complete", "error")
+
+
+# Deletes the lease only if it still belongs to the given task
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def release_video_lease(candidate_id: str, invitation_id: str, task_id: str) -> None:
+    redis_client.eval(RELEASE_LEASE_SCRIPT, 1, video_lease_key(candidate_id, invitation_id), task_id)
+
+
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
 def process_video_task(self, url: str):
+    """Resolve an invitation's download link and store it under ``video:<candidate>:<invitation>``.
+
+    The final status (``complete`` or ``error``) is kept for an hour and the
+    invitation's lease is released, so the next request either gets the
+    cached link or starts a new task. Retries keep the lease.
+    """
     candidate_id, invitation_id = extract_ids_from_url(url)
     if not candidate_id or not invitation_id:
         return {"status": "error", "error": "Invalid Devskiller URL format"}
-    redis_key = f"video:{candidate_id}:{invitation_id}"
     try:
-        service = Devskiller()
-        # Run the async method in a new event loop
-        result = asyncio.run(service.get_video_url(url))
-        redis_client.set(
-            redis_key,
-            json.dumps({"status": "complete", "url": result}),
-            ex=3600
-        )
-        return {"status": "complete", "url": result}
+        service = Devskiller(browser_pool=browser_pool)
+        # Run on the worker's browser pool (a context in its long-lived Chromium)
+        result = browser_pool.run(service.get_video_url(url), timeout=soft_time_limit(self))
+        status = {"status": "complete", "url": result, "timings": service.timer.steps}
     except SoftTimeLimitExceeded:
         # Task took too long
-        error_msg = "Task timed out after 4 minutes"
-        redis_client.set(
-            redis_key,
-            json.dumps({"status": "error", "error": error_msg}),
-            ex=3600
-        )
-        return {"status": "error", "error": error_msg}
+        status = {"status": "error", "error": "Task timed out after 4 minutes"}
     except Exception as e:
-        # Retry on failure
+        # Retry on failure. Checked up front because retry() re-raises ``exc``
+        # (not MaxRetriesExceededError) once the retries are used up.
         logger.error(f"Error processing video for {url}: {str(e)}")
-        try:
-            self.retry(exc=e)
-        except self.MaxRetriesExceededError:
-            redis_client.set(
-                redis_key,
-                json.dumps({"status": "error", "error": f"Max retries exceeded: {str(e)}"}),
-                ex=3600
-            )
-            return {"status": "error", "error": f"Max retries exceeded: {str(e)}"}
+        if self.request.retries >= self.max_retries:
+            status = {"status": "error", "error": f"Max retries exceeded: {str(e)}"}
+        else:
+            raise self.retry(exc=e)
+
+    _store_video_status(url, status, self.request.id)
+    return status
+
+def _store_video_status(url: str, status: dict, task_id: str) -> None:
+    """Store an invitation's final status, announce it and release its lease.
+
+    The status is published on the invitation's channel and sent to every
+    registered callback URL. Taking the callbacks in the same transaction
+    as the status write lets ``video_jobs.add_video_callback`` tell whether
+    a late registration was picked up here.
+    """
+    candidate_id, invitation_id = extract_ids_from_url(url)
+    payload = {"candidate_id": candidate_id, "invitation_id": invitation_id, **status}
+    callbacks_key = video_callbacks_key(candidate_id, invitation_id)
+    pipe = redis_client.pipeline()
+    pipe.set(video_key(candidate_id, invitation_id), json.dumps(status), ex=3600)
+    pipe.smembers(callbacks_key)
+    pipe.delete(callbacks_key)
+    pipe.publish(video_channel(candidate_id, invitation_id), json.dumps(payload))
+    _, callbacks, _, _ = pipe.execute()
+    release_video_lease(candidate_id, invitation_id, task_id)
+    for callback_url in callbacks:
+        deliver_video_webhook_task.delay(callback_url.decode(), payload)
+
+
+@celery_app.task(bind=True, max_retries=settings.VIDEO_WEBHOOK_MAX_RETRIES)
+def deliver_video_webhook_task(self, callback_url: str, payload: dict):
+    """POST an invitation's final status to a caller's callback URL.
+
+    Connection errors, 429 and 5xx responses are retried with exponential
+    backoff; other responses end the delivery. URLs that no longer pass the
+    outbound destination checks are dropped; the request goes to the
+    checked address (no second DNS lookup) and redirects are not followed.
+    With ``VIDEO_WEBHOOK_SECRET`` set, the body is signed in
+    ``X-Webhook-Signature`` (``sha256=<hex HMAC>``).
+    """
+    # Checked again on delivery: the host may resolve elsewhere by now
+    try:
+        addresses = check_destination(callback_url)
+    except UnsafeDestination as e:
+        logger.warning(f"Not delivering webhook to {callback_url}: {str(e)}")
+        return {"status": "refused", "error": str(e)}
+    body = json.dumps(payload)
+    headers = {"Content-Type": "application/json"}
+    if settings.VIDEO_WEBHOOK_SECRET:
+        signature = hmac.new(settings.VIDEO_WEBHOOK_SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
+        headers["X-Webhook-Signature"] = f"sha256={signature}"
+    try:
+        # Connect to the address just checked, not to a fresh DNS answer
+        target, host_headers, extensions = pinned_request(callback_url, addresses[0])
+        with httpx.Client(timeout=settings.VIDEO_WEBHOOK_TIMEOUT, follow_redirects=False) as client:
+            response = client.post(target, content=body, headers={**headers, **host_headers}, extensions=extensions)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RuntimeError(f"Callback returned {response.status_code}")
+    except Exception as e:
+        logger.warning(f"Webhook delivery to {callback_url} failed: {str(e)}")
+        if self.request.retries >= self.max_retries:
+            return {"status": "error", "error": str(e)}
+        raise self.retry(exc=e, countdown=settings.VIDEO_WEBHOOK_RETRY_DELAY * 2 ** self.request.retries)
+    return {"status": "delivered" if response.is_success else "rejected", "status_code": response.status_code}
+
+
+@celery_app.task(
+    bind=True,
+    max_retries=settings.VIDEO_BATCH_MAX_RETRIES,
+    default_retry_delay=60,
+    soft_time_limit=settings.VIDEO_BATCH_SOFT_TIME_LIMIT,
+    time_limit=settings.VIDEO_BATCH_SOFT_TIME_LIMIT + 60,
+)
+def process_video_batch_task(self, urls: list, tabs: int):
+    """Resolve many invitations in one browser context with up to ``tabs`` tabs.
+
+    The caller holds each invitation's lease under this task's ID. Every
+    result is written to its ``video:<candidate>:<invitation>`` key (and the
+    lease released) as soon as it finishes. Failed items are retried
+    together, keeping their leases, until the retries are used up.
+    """
+    task_id = self.request.id
+    can_retry = self.request.retries < self.max_retries
+    pending = set(urls)
+    failed = []
+
+    def on_result(url, download_link, error, timings):
+        pending.discard(url)
+        if error is not None and can_retry:
+            # Stays "processing" until the retry
+            failed.append(url)
+            return
+        if error is None:
+            status = {"status": "complete", "url": download_link, "timings": timings}
+        else:
+            status = {"status": "error", "error": f"Max retries exceeded: {error}"}
+        _store_video_status(url, status, task_id)
+
+    try:
+        service = Devskiller(browser_pool=browser_pool)
+        # One context of the worker's pooled Chromium, shared by all tabs
+        browser_pool.run(service.get_video_urls(urls, tabs, on_result), timeout=soft_time_limit(self))
+    except SoftTimeLimitExceeded:
+        for url in list(pending) + failed:
+            _store_video_status(url, {"status": "error", "error": "Batch timed out"}, task_id)
+        return {"status": "error", "error": "Batch timed out", "resolved": len(urls) - len(pending) - len(failed)}
+    except Exception as e:
+        # The batch as a whole failed (cookies, browser); retry what is left
+        logger.error(f"Error processing video batch: {str(e)}")
+        unresolved = list(pending) + failed
+        if can_retry:
+            raise self.retry(exc=e, args=[unresolved, tabs])
+        for url in unresolved:
+            _store_video_status(url, {"status": "error", "error": f"Max retries exceeded: {str(e)}"}, task_id)
+        return {"status": "error", "error": str(e), "resolved": len(urls) - len(unresolved)}
+
+    if failed:
+        raise self.retry(args=[failed, tabs])
+    return {"status": "complete", "resolved": len(urls)}
+
 
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=300)
-def update_cookies_task(self):
+def update_cookies_task(self, force: bool = True):
     """Background task to refresh DevSkiller cookies.
 
+    With ``force`` (the API's refresh) the current session is replaced
+    unless another worker replaced it meanwhile. Without it (the periodic
+    check) a login only happens when the session is missing or expires
+    within ``DEVSKILLER_SESSION_REFRESH_MARGIN`` seconds.
+
     A status object is stored in Redis under the key ``devskiller_cookies_status`` so
     other services can determine the current state of the cookie refresh process.
     The object has the structure:
@@ -73,23 +227,31 @@ def update_cookies_task(self):
     LAST_UPDATED_KEY = "devskiller_cookies_last_updated"
     ERROR_KEY = "devskiller_cookies_error"
 
+    margin = settings.DEVSKILLER_SESSION_REFRESH_MARGIN
+    if not force and not session.needs_refresh(margin):
+        return {"status": "fresh", "expires_at": session.expires_at()}
+
     # Mark processing state and clear previous timestamp
     redis_client.set(STATUS_KEY, "processing", ex=172800)
     redis_client.delete(LAST_UPDATED_KEY)
     redis_client.delete(ERROR_KEY)
 
     try:
-        service = Devskiller()
-        # Run the async method in a new event loop
-        asyncio.run(service.update_cookies())
+        service = Devskiller(browser_pool=browser_pool)
+        # Run on the worker's browser pool (a context in its long-lived Chromium)
+        rejected = session.cookies() if force else None
+        browser_pool.run(
+            service.refresh_session(margin=margin, rejected=rejected),
+            timeout=soft_time_limit(self),
+        )
 
         # On success, record completion time in UTC ISO-8601 format
         now_iso = datetime.now(timezone.utc).isoformat()
         redis_client.set(STATUS_KEY, "complete", ex=172800)
         redis_client.set(LAST_UPDATED_KEY, now_iso, ex=172800)
         redis_client.delete(ERROR_KEY)
-        logger.info(f"Successfully updated DevSkiller cookies at {now_iso}")
-        return {"status": "complete", "last_updated": now_iso}
+        logger.info(f"Successfully updated DevSkiller cookies at {now_iso} ({service.timer.steps})")
+        return {"status": "complete", "last_updated": now_iso, "timings": service.timer.steps}
 
     except SoftTimeLimitExceeded:
         # Task took too long
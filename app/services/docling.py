@@ -1,22 +1,129 @@
+import anyio
 import httpx
+from contextlib import asynccontextmanager
 from fastapi import HTTPException, Request, Response
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import AsyncIterator, Awaitable, Callable, Mapping, Optional, Tuple
 
+from app.core.compression import (
+    StreamCompressor,
+    add_vary,
+    choose_encoding,
+    compress_body,
+    relay_headers,
+    varies_by_encoding,
+)
 from app.core.config import settings
+from app.core.http_client import get_upstream_client
 from app.core.logging import get_logger
+from app.services.admission import AdmissionTicket, Overloaded, docling_admission
+from app.services.docling_backends import BackendLease, backend_available, docling_backends
+from app.services.conversion_cache import (
+    CACHE_STATUS_HEADER,
+    CachedResult,
+    SpooledRequestBody,
+    cacheable_headers,
+    conversion_cache,
+    is_cacheable,
+    should_bypass_cache,
+)
+from app.services.singleflight import single_flight
 
 logger = get_logger("app.services.docling")
 
+
+class RelayResponse(StreamingResponse):
+    """
+    StreamingResponse whose background task runs even if the client goes away.
+
+    Starlette skips ``background`` when sending fails (``ClientDisconnect``
+    on ASGI 2.4+) or the request is cancelled, but a relayed response still
+    holds an upstream connection, a backend lease and an admission ticket
+    that must be released.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        background, self.background = self.background, None
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                close = getattr(self.body_iterator, "aclose", None)
+                if close is not None:
+                    await close()
+                if background is not None:
+                    await background()
+
+
 class DoclingService:
     """Service class for interacting with the Docling API."""
     
+    @staticmethod
+    def build_target_url(
+        endpoint: str,
+        query_params: Optional[dict] = None,
+        base_url: Optional[str] = None
+    ) -> str:
+        """
+        Build the full Docling URL for an endpoint and optional query parameters.
+        
+        ``base_url`` selects a specific backend; it defaults to DOCLING_API_URL.
+        """
+        target_url = f"{base_url or settings.DOCLING_API_URL}{endpoint}"
+        if query_params:
+            query_string = "&".join(f"{k}={v}" for k, v in query_params.items() if v is not None)
+            if query_string:
+                target_url = f"{target_url}?{query_string}"
+        return target_url
+    
+    @staticmethod
+    async def admit() -> Optional[AdmissionTicket]:
+        """
+        Wait for a slot from the Docling admission controller.
+        
+        Conversions (POST requests) pass through here so a load spike queues
+        in the hub instead of piling up as timeouts in Docling. Status polls
+        and result fetches are cheap for Docling and are not limited.
+        
+        Returns:
+            The granted ticket, or None when admission control is disabled
+            
+        Raises:
+            HTTPException: 429 with a Retry-After header when the queue is full
+        """
+        if not settings.ADMISSION_ENABLED:
+            return None
+        try:
+            return await docling_admission.acquire()
+        except Overloaded as e:
+            logger.warning(f"Rejecting Docling request: {str(e)} (retry after {e.retry_after}s)")
+            raise HTTPException(
+                status_code=429,
+                detail="Document service is busy, please retry later",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+    
+    @staticmethod
+    def upstream_error(error: Exception) -> HTTPException:
+        """
+        Map a failed Docling call to the error returned to the client.
+
+        Timeouts become 504; connection and other errors become 502.
+        """
+        if isinstance(error, httpx.TimeoutException):
+            return HTTPException(status_code=504, detail="Backend service timed out")
+        return HTTPException(status_code=502, detail="Error communicating with backend service")
+
     @staticmethod
     async def proxy_request(
         request: Request, 
         endpoint: str, 
         method: str = "POST",
         timeout: Optional[float] = None,
-        query_params: Optional[dict] = None
+        query_params: Optional[dict] = None,
+        task_id: Optional[str] = None,
+        track_task: bool = False
     ) -> Response:
         """
         Proxy a request to the Docling API.
@@ -27,19 +134,16 @@ class DoclingService:
             method: HTTP method (GET, POST, etc.)
             timeout: Request timeout in seconds
             query_params: Optional query parameters
+            task_id: Route to the backend that owns this async task
+            track_task: Remember which backend created the task in the response
             
         Returns:
-            FastAPI Response containing the Docling API's response
+            FastAPI Response containing the Docling API's response,
+            compressed when the client accepts it
         """
         if timeout is None:
             timeout = settings.DEFAULT_TIMEOUT
             
-        target_url = f"{settings.DOCLING_API_URL}{endpoint}"
-        if query_params:
-            query_string = "&".join(f"{k}={v}" for k, v in query_params.items() if v is not None)
-            if query_string:
-                target_url = f"{target_url}?{query_string}"
-        
         headers = {}
         content = None
         
@@ -49,35 +153,650 @@ class DoclingService:
             content = await request.body()
             headers["Content-Type"] = content_type
             
-        logger.info(f"Proxying {method} request to {target_url}")
+        ticket = await DoclingService.admit() if method == "POST" else None
+        lease = None
+        target_url = endpoint
+        ok = False
+        available = False
+        error = None
+        client = get_upstream_client()
+        try:
+            # Async tasks only exist on the backend that created them
+            if task_id is not None:
+                lease = await docling_backends.lease_for_task(task_id)
+            else:
+                lease = docling_backends.lease()
+            target_url = DoclingService.build_target_url(endpoint, query_params, lease.url)
+            
+            logger.info(f"Proxying {method} request to {target_url}")
+            
+            if method == "GET":
+                response = await client.get(
+                    target_url,
+                    headers=headers,
+                    timeout=timeout
+                )
+            elif method == "POST":
+                response = await client.post(
+                    target_url,
+                    content=content,
+                    headers=headers,
+                    timeout=timeout
+                )
+            else:
+                raise ValueError(f"Unsupported HTTP method: {method}")
+            
+            ok = response.status_code < 500
+            available = backend_available(response.status_code)
+            if track_task and response.status_code == 200:
+                await DoclingService._remember_task(response, lease)
+            
+        except Exception as e:
+            error = e
+            logger.error(f"Error communicating with Docling API at {target_url}:", exc_info=True)
+            raise DoclingService.upstream_error(e)
+        finally:
+            if lease is not None:
+                lease.release(available, error)
+            if ticket is not None:
+                ticket.release(ok)
+
+        # httpx has already decoded the body, so its framing headers no longer apply
+        content = response.content
+        headers = relay_headers(response.headers.items())
+        encoding = choose_encoding(request.headers, headers, len(content))
+        if encoding is not None:
+            content = await compress_body(content, encoding)
+            headers["Content-Encoding"] = encoding
+        if varies_by_encoding(headers.get("content-type")):
+            add_vary(headers)
+        return Response(
+            content=content,
+            status_code=response.status_code,
+            headers=headers
+        )
+    
+    @staticmethod
+    async def _remember_task(response: httpx.Response, lease: BackendLease) -> None:
+        """
+        Record the backend that created the async task in ``response``.
+        """
+        try:
+            task_id = response.json().get("task_id")
+        except ValueError:
+            return
+        if task_id:
+            await docling_backends.remember_task(task_id, lease.backend)
+
+    @staticmethod
+    async def fetch_task(
+        endpoint: str,
+        task_id: str,
+        timeout: float,
+        query_params: Optional[dict] = None
+    ) -> httpx.Response:
+        """
+        GET a task endpoint from the backend that owns ``task_id``.
+
+        Used by hub-internal callers (the task watcher) that consume the
+        Docling response themselves instead of relaying it to a client.
+
+        Returns:
+            The buffered Docling response
+        """
+        lease = await docling_backends.lease_for_task(task_id)
+        target_url = DoclingService.build_target_url(endpoint, query_params, lease.url)
+        ok = False
+        error = None
+        try:
+            response = await get_upstream_client().get(target_url, timeout=timeout)
+            ok = backend_available(response.status_code)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            lease.release(ok, error)
+
+    @staticmethod
+    async def submit_task(
+        endpoint: str,
+        content: bytes,
+        content_type: str,
+        timeout: Optional[float] = None
+    ) -> httpx.Response:
+        """
+        POST an async conversion to the least-loaded backend.
+
+        The backend that accepted the task is remembered, so later
+        ``fetch_task`` calls for it are routed there. Used by hub-internal
+        callers (hub jobs) that follow the task themselves; admission is
+        left to the caller, which holds its ticket until the task is done.
+
+        Returns:
+            The buffered Docling response
+        """
+        if timeout is None:
+            timeout = settings.ASYNC_REQUEST_TIMEOUT
+        client = get_upstream_client()
+
+        def build_request(base_url: str) -> httpx.Request:
+            return client.build_request(
+                "POST",
+                DoclingService.build_target_url(endpoint, base_url=base_url),
+                content=content,
+                headers={"Content-Type": content_type},
+                timeout=timeout
+            )
+
+        response, lease = await DoclingService._send_routed(build_request)
+        lease.release(backend_available(response.status_code))
+        if response.status_code == 200:
+            await DoclingService._remember_task(response, lease)
+        return response
+
+    @staticmethod
+    @asynccontextmanager
+    async def open_task_stream(
+        endpoint: str,
+        task_id: str,
+        timeout: float
+    ) -> AsyncIterator[httpx.Response]:
+        """
+        Open a streamed GET of a task endpoint on the backend that owns ``task_id``.
+
+        The response body is not read; the caller consumes it inside the
+        ``async with`` block and the connection is released on exit.
+        """
+        lease = await docling_backends.lease_for_task(task_id)
+        client = get_upstream_client()
+        request = client.build_request(
+            "GET",
+            DoclingService.build_target_url(endpoint, base_url=lease.url),
+            timeout=timeout
+        )
+        try:
+            response = await client.send(request, stream=True)
+        except Exception as e:
+            lease.release(False, e)
+            raise
+        try:
+            yield response
+        finally:
+            await response.aclose()
+            lease.release(backend_available(response.status_code))
+
+    @staticmethod
+    async def stream_request(
+        request: Request,
+        endpoint: str,
+        method: str = "POST",
+        timeout: Optional[float] = None,
+        query_params: Optional[dict] = None
+    ) -> StreamingResponse:
+        """
+        Proxy a request to the Docling API without buffering either body.
+
+        The incoming body is piped from ``request.stream()`` straight into the
+        upstream request and the Docling response is relayed chunk by chunk, so
+        memory stays bounded by the chunk size regardless of document size.
+
+        Args:
+            request: The original FastAPI request
+            endpoint: The Docling API endpoint path
+            method: HTTP method (GET, POST, etc.)
+            timeout: Request timeout in seconds
+            query_params: Optional query parameters
+
+        Returns:
+            StreamingResponse relaying the Docling API's response
+        """
+        if timeout is None:
+            timeout = settings.DEFAULT_TIMEOUT
+
+        headers = {}
+        content = None
+
+        if method == "POST":
+            headers["Content-Type"] = request.headers.get("Content-Type", "")
+            # Forwarding the length lets Docling read a sized body instead of
+            # a chunked one; without it httpx falls back to chunked encoding.
+            content_length = request.headers.get("Content-Length")
+            if content_length:
+                headers["Content-Length"] = content_length
+            content = request.stream()
+        elif method != "GET":
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        ticket = await DoclingService.admit() if method == "POST" else None
+        return await DoclingService._send_streaming(
+            method,
+            endpoint,
+            content,
+            headers,
+            timeout,
+            query_params=query_params,
+            ticket=ticket,
+            request_headers=request.headers
+        )
+
+    @staticmethod
+    async def cached_request(
+        request: Request,
+        endpoint: str,
+        timeout: Optional[float] = None
+    ) -> Response:
+        """
+        Proxy a conversion request through the conversion result cache.
+
+        The request body is spooled (memory-bounded) while a content hash of
+        the normalized body is computed. Hits are served from the in-process
+        LRU or Redis; misses are streamed from Docling and stored on success.
+        Identical conversions already in flight (in this or another worker)
+        are coalesced into a single upstream call. Responses carry an
+        ``X-Cache`` header of HIT, MISS, COALESCED or BYPASS.
+
+        Results are compressed for clients that accept it; compressed
+        variants are cached alongside the plain result and reused.
+
+        Args:
+            request: The original FastAPI request
+            endpoint: The Docling API endpoint path
+            timeout: Request timeout in seconds
+
+        Returns:
+            Response served from the cache or relayed from the Docling API
+        """
+        if not settings.CONVERSION_CACHE_ENABLED or should_bypass_cache(request):
+            response = await DoclingService.stream_request(request, endpoint, "POST", timeout)
+            response.headers[CACHE_STATUS_HEADER] = "BYPASS"
+            return response
+
+        body = await SpooledRequestBody.from_request(request, endpoint)
+        return await DoclingService.send_cached(request, endpoint, body, timeout)
+
+    @staticmethod
+    async def cache_hit(request: Request, endpoint: str, key: str) -> Optional[Response]:
+        """
+        Return the cached response for ``key``, or None on a cache miss.
+        """
+        cached, tier = await conversion_cache.get(key)
+        if cached is None:
+            return None
+        logger.info(f"Conversion cache hit ({tier}) for {endpoint}")
+        cached = await DoclingService._encoded(request, key, cached)
+        return cached.to_response(tier)
+
+    @staticmethod
+    async def send_cached(
+        request: Request,
+        endpoint: str,
+        body: SpooledRequestBody,
+        timeout: Optional[float] = None
+    ) -> Response:
+        """
+        Serve a spooled conversion request through the cache and single-flight layers.
+
+        The second half of ``cached_request``, for callers that build the
+        Docling request body themselves. Takes ownership of ``body``.
+        """
+        if timeout is None:
+            timeout = settings.DEFAULT_TIMEOUT
+
+        hit = await DoclingService.cache_hit(request, endpoint, body.key)
+        if hit is not None:
+            await body.close()
+            return hit
+
+        # Identical conversions already in flight share one upstream call
+        flight = None
+        if settings.SINGLE_FLIGHT_ENABLED:
+            flight = await single_flight.begin(body.key)
+            if not flight.is_leader:
+                shared = await flight.wait()
+                if shared is not None:
+                    await body.close()
+                    logger.info(f"Coalesced conversion request for {endpoint}")
+                    shared = await DoclingService._encoded(request, body.key, shared)
+                    return shared.to_response("inflight", status="COALESCED")
+                flight = None
+
+        headers = {
+            "Content-Type": body.content_type,
+            "Content-Length": str(body.size),
+        }
+        logger.info(f"Conversion cache miss for {endpoint}")
+
+        outcome = {"result": None}
+
+        async def store_result(status_code: int, response_headers, content: bytes, encoded):
+            result = CachedResult(status_code, cacheable_headers(response_headers), content)
+            outcome["result"] = result
+            if await is_cacheable(result):
+                await conversion_cache.set(body.key, result)
+                if encoded is not None:
+                    # Keep the bytes already compressed for this client
+                    encoding, encoded_body = encoded
+                    variant = CachedResult(status_code, {**result.headers, "content-encoding": encoding}, encoded_body)
+                    await conversion_cache.set(conversion_cache.encoded_key(body.key, encoding), variant)
+
+        async def release():
+            await body.close()
+            if flight is not None:
+                await flight.finish(outcome["result"])
+
+        try:
+            ticket = await DoclingService.admit()
+            return await DoclingService._send_streaming(
+                "POST",
+                endpoint,
+                body.iter_chunks(),
+                headers,
+                timeout,
+                on_complete=store_result,
+                extra_headers={CACHE_STATUS_HEADER: "MISS"},
+                cleanup=release,
+                ticket=ticket,
+                request_headers=request.headers
+            )
+        except BaseException:
+            await release()
+            raise
+
+    @staticmethod
+    async def send_uncached(
+        request: Request,
+        endpoint: str,
+        body: SpooledRequestBody,
+        timeout: Optional[float] = None
+    ) -> Response:
+        """
+        Relay a spooled conversion request to Docling, skipping the cache.
+
+        The counterpart of ``send_cached`` for requests that bypass the
+        cache. Takes ownership of ``body``.
+        """
+        if timeout is None:
+            timeout = settings.DEFAULT_TIMEOUT
+        try:
+            ticket = await DoclingService.admit()
+            return await DoclingService._send_streaming(
+                "POST",
+                endpoint,
+                body.iter_chunks(),
+                {
+                    "Content-Type": body.content_type,
+                    "Content-Length": str(body.size),
+                },
+                timeout,
+                extra_headers={CACHE_STATUS_HEADER: "BYPASS"},
+                cleanup=body.close,
+                ticket=ticket,
+                request_headers=request.headers
+            )
+        except BaseException:
+            await body.close()
+            raise
+
+    @staticmethod
+    async def _encoded(request: Request, key: str, result: CachedResult) -> CachedResult:
+        """
+        Return ``result``, or its cached compressed variant if the client accepts one.
+        """
+        encoding = choose_encoding(request.headers, result.headers, result.size)
+        if encoding is None:
+            return result
+        return await conversion_cache.get_encoded(key, result, encoding)
+
+    @staticmethod
+    async def convert(
+        endpoint: str,
+        body: SpooledRequestBody,
+        timeout: Optional[float] = None,
+        bypass_cache: bool = False
+    ) -> Tuple[CachedResult, str]:
+        """
+        Run a buffered conversion through the cache and single-flight layers.
+
+        Used where the full result is needed in process (e.g. batch
+        conversions) rather than relayed to a client as a stream. The caller
+        owns ``body`` and must close it.
+
+        Args:
+            endpoint: The Docling API endpoint path
+            body: Spooled request body with its cache key
+            timeout: Request timeout in seconds
+            bypass_cache: Always convert, and leave the cache untouched
+
+        Returns:
+            Tuple of (result, cache status) where cache status is HIT,
+            COALESCED, MISS or BYPASS
+        """
+        if timeout is None:
+            timeout = settings.DEFAULT_TIMEOUT
+
+        if not bypass_cache:
+            cached, _ = await conversion_cache.get(body.key)
+            if cached is not None:
+                return cached, "HIT"
+
+        flight = None
+        if settings.SINGLE_FLIGHT_ENABLED and not bypass_cache:
+            flight = await single_flight.begin(body.key)
+            if not flight.is_leader:
+                shared = await flight.wait()
+                if shared is not None:
+                    return shared, "COALESCED"
+                flight = None
+
+        client = get_upstream_client()
+
+        def build_request(base_url: str) -> httpx.Request:
+            return client.build_request(
+                "POST",
+                DoclingService.build_target_url(endpoint, base_url=base_url),
+                content=body.iter_chunks(),
+                headers={
+                    "Content-Type": body.content_type,
+                    "Content-Length": str(body.size),
+                },
+                timeout=timeout
+            )
+
+        result = None
+        error = None
+        ticket = None
+        lease = None
+        try:
+            ticket = await DoclingService.admit()
+            response, lease = await DoclingService._send_routed(build_request)
+            result = CachedResult(response.status_code, cacheable_headers(response.headers), response.content)
+            # httpx has already decoded the body, so don't replay its encoding
+            result.headers.pop("content-encoding", None)
+            if bypass_cache:
+                return result, "BYPASS"
+            if result.size <= settings.CONVERSION_CACHE_MAX_ENTRY_BYTES and await is_cacheable(result):
+                await conversion_cache.set(body.key, result)
+            return result, "MISS"
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if lease is not None:
+                lease.release(result is not None and backend_available(result.status_code), error)
+            if ticket is not None:
+                ticket.release(result is not None and result.status_code < 500)
+            if flight is not None:
+                await flight.finish(result)
+
+    @staticmethod
+    async def _send_routed(
+        build_request: Callable[[str], httpx.Request],
+        stream: bool = False
+    ) -> Tuple[httpx.Response, BackendLease]:
+        """
+        Send a request to the least-loaded Docling backend.
         
-        async with httpx.AsyncClient() as client:
+        A connection error means no request bytes reached the backend, so the
+        same request is re-sent to the next backend until every backend has
+        been tried. Failed leases are released here; the caller releases the
+        returned lease once it is done with the response.
+        
+        Args:
+            build_request: Builds the request for a given backend base URL
+            stream: Whether to return before the response body is read
+            
+        Returns:
+            Tuple of (response, backend lease)
+        """
+        client = get_upstream_client()
+        attempts = len(docling_backends.backends)
+        for attempt in range(attempts):
+            lease = docling_backends.lease()
             try:
-                if method == "GET":
-                    response = await client.get(
-                        target_url,
-                        headers=headers,
-                        timeout=timeout
-                    )
-                elif method == "POST":
-                    response = await client.post(
-                        target_url,
-                        content=content,
-                        headers=headers,
-                        timeout=timeout
-                    )
+                return await client.send(build_request(lease.url), stream=stream), lease
+            except httpx.ConnectError as e:
+                lease.release(False, e)
+                if attempt + 1 >= attempts:
+                    raise
+                logger.warning(f"Could not connect to Docling backend {lease.url}, trying another backend")
+            except BaseException as e:
+                lease.release(False, e)
+                raise
+
+    @staticmethod
+    async def _send_streaming(
+        method: str,
+        endpoint: str,
+        content,
+        headers: dict,
+        timeout: float,
+        query_params: Optional[dict] = None,
+        on_complete: Optional[Callable[[int, httpx.Headers, bytes, Optional[Tuple[str, bytes]]], Awaitable[None]]] = None,
+        extra_headers: Optional[dict] = None,
+        cleanup: Optional[Callable[[], Awaitable[None]]] = None,
+        ticket: Optional[AdmissionTicket] = None,
+        request_headers: Optional[Mapping[str, str]] = None
+    ) -> StreamingResponse:
+        """
+        Send a request upstream and relay the response as a StreamingResponse.
+
+        When ``on_complete`` is given, the relayed body is also captured (up to
+        CONVERSION_CACHE_MAX_ENTRY_BYTES) and passed to it once the upstream
+        response has been fully read, together with the compressed body as
+        ``(encoding, bytes)`` if it was compressed on the way. An admission
+        ``ticket`` is held until the upstream body has been relayed, as is the
+        backend lease.
+
+        Given the client's ``request_headers``, a compressible body is
+        compressed chunk by chunk with the negotiated encoding.
+        """
+        client = get_upstream_client()
+
+        def build_request(base_url: str) -> httpx.Request:
+            target_url = DoclingService.build_target_url(endpoint, query_params, base_url)
+            logger.info(f"Streaming {method} request to {target_url}")
+            return client.build_request(
+                method,
+                target_url,
+                content=content,
+                headers=headers,
+                timeout=timeout
+            )
+
+        try:
+            response, lease = await DoclingService._send_routed(build_request, stream=True)
+        except BaseException as e:
+            if ticket is not None:
+                ticket.release(False)
+            if not isinstance(e, Exception):
+                raise
+            logger.error(f"Error communicating with Docling API for {endpoint}:", exc_info=True)
+            raise DoclingService.upstream_error(e)
+        target_url = str(response.request.url)
+        if ticket is not None:
+            ticket.mark_response()
+
+        encoding = None
+        if request_headers is not None:
+            content_length = response.headers.get("content-length")
+            encoding = choose_encoding(
+                request_headers,
+                response.headers,
+                int(content_length) if content_length and content_length.isdigit() else None
+            )
+        compressor = StreamCompressor(encoding) if encoding is not None else None
+
+        # Bodies captured for on_complete; dropped once they exceed the cache limit
+        captured = {
+            "body": bytearray() if on_complete else None,
+            "encoded": bytearray() if on_complete and compressor else None,
+            "complete": False,
+            "interrupted": False,
+        }
+
+        def capture(name: str, chunk: bytes) -> None:
+            body = captured[name]
+            if body is not None:
+                if len(body) + len(chunk) <= settings.CONVERSION_CACHE_MAX_ENTRY_BYTES:
+                    body.extend(chunk)
                 else:
-                    raise ValueError(f"Unsupported HTTP method: {method}")
-                
-                return Response(
-                    content=response.content,
-                    status_code=response.status_code,
-                    headers=dict(response.headers)
-                )
-                
-            except Exception as e:
-                logger.error(f"Error communicating with Docling API at {target_url}:", exc_info=True)
-                raise HTTPException(
-                    status_code=500,
-                    detail="Error communicating with backend service"
-                )
\ No newline at end of file
+                    captured[name] = None
+
+        async def relay_body():
+            try:
+                # Raw bytes keep any upstream Content-Encoding valid end to end
+                async for chunk in response.aiter_raw(settings.STREAM_CHUNK_SIZE):
+                    capture("body", chunk)
+                    if compressor is not None:
+                        chunk = compressor.compress(chunk)
+                        capture("encoded", chunk)
+                        if not chunk:
+                            continue
+                    yield chunk
+                if compressor is not None:
+                    chunk = compressor.flush()
+                    capture("encoded", chunk)
+                    yield chunk
+                captured["complete"] = True
+            except Exception:
+                captured["interrupted"] = True
+                logger.error(f"Docling response stream from {target_url} was interrupted", exc_info=True)
+
+        async def finish():
+            # Runs after the response has been sent (or the client has gone
+            # away), so storing the result never delays the client. A client
+            # disconnect is not the backend's fault.
+            await response.aclose()
+            ok = not captured["interrupted"] and response.status_code < 500
+            lease.release(not captured["interrupted"] and backend_available(response.status_code))
+            if ticket is not None:
+                ticket.release(ok)
+            try:
+                if captured["complete"] and captured["body"] is not None:
+                    encoded = captured["encoded"]
+                    await on_complete(
+                        response.status_code,
+                        response.headers,
+                        bytes(captured["body"]),
+                        (encoding, bytes(encoded)) if encoded is not None else None
+                    )
+            finally:
+                if cleanup is not None:
+                    await cleanup()
+
+        # A body relayed unchanged keeps its upstream Content-Length and
+        # Content-Encoding; a compressed one is sent chunked
+        response_headers = relay_headers(response.headers.items(), framing=compressor is None)
+        if compressor is not None:
+            response_headers["Content-Encoding"] = encoding
+        if request_headers is not None and varies_by_encoding(response.headers.get("content-type")):
+            add_vary(response_headers)
+        if extra_headers:
+            response_headers.update(extra_headers)
+        return RelayResponse(
+            relay_body(),
+            status_code=response.status_code,
+            headers=response_headers,
+            background=BackgroundTask(finish)
+        )
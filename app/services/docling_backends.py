@@ -0,0 +1,265 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.http_client import get_upstream_client
+from app.core.logging import get_logger
+from app.core.redis_client import get_async_redis
+
+logger = get_logger("app.services.docling_backends")
+
+# Statuses that mean the backend itself could not serve the request; other
+# 5xx responses are failures of that one document, not of the backend
+UNAVAILABLE_STATUS_CODES = (502, 503, 504)
+
+
+def backend_available(status_code: int) -> bool:
+    """
+    Return False when a response status says the backend is unavailable.
+    """
+    return status_code not in UNAVAILABLE_STATUS_CODES
+
+
+class Backend:
+    """A single Docling instance and its routing state."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until: Optional[float] = None
+        self.ejections = 0
+        self.total_requests = 0
+        self.total_failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.ejected_until is None
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "consecutive_failures": self.consecutive_failures,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+        }
+
+
+class BackendLease:
+    """
+    One request's claim on a backend, counted as outstanding until released.
+    """
+
+    def __init__(self, pool: "BackendPool", backend: Backend):
+        self.pool = pool
+        self.backend = backend
+        self._released = False
+        backend.outstanding += 1
+        backend.total_requests += 1
+
+    @property
+    def url(self) -> str:
+        return self.backend.url
+
+    def release(self, ok: bool = True, error: Optional[BaseException] = None) -> None:
+        """
+        Return the backend's slot, recording whether it served the request.
+
+        A failure with an ``error`` only counts against the backend when it
+        is a connection error or timeout; anything else (a cancelled request,
+        a bug in the hub) says nothing about the backend's health.
+        """
+        if self._released:
+            return
+        self._released = True
+        self.backend.outstanding -= 1
+        if ok:
+            self.pool._record_success(self.backend)
+        elif error is None or isinstance(error, httpx.TransportError):
+            self.pool._record_failure(self.backend, error)
+
+
+class BackendPool:
+    """
+    Routes Docling requests across several instances.
+
+    New work goes to the healthy backend with the fewest outstanding
+    requests. Backends are ejected after repeated failures (immediately on
+    connection errors) and re-probed in the background until their health
+    endpoint answers again. Async tasks are sticky: the backend that created
+    a task is remembered (in process and in Redis) so polls and result
+    fetches reach the instance that holds it.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.backends = [Backend(url) for url in urls]
+        self._task_routes: "OrderedDict[str, str]" = OrderedDict()
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def get(self, url: str) -> Optional[Backend]:
+        for backend in self.backends:
+            if backend.url == url:
+                return backend
+        return None
+
+    def pick(self) -> Backend:
+        """
+        Choose the healthy backend with the fewest outstanding requests.
+
+        If every backend is ejected, fail open to the one whose ejection ends
+        soonest rather than rejecting all traffic.
+        """
+        candidates = [backend for backend in self.backends if backend.healthy]
+        if not candidates:
+            return min(self.backends, key=lambda backend: backend.ejected_until)
+        fewest = min(backend.outstanding for backend in candidates)
+        return random.choice([backend for backend in candidates if backend.outstanding == fewest])
+
+    def lease(self, backend: Optional[Backend] = None) -> BackendLease:
+        return BackendLease(self, backend or self.pick())
+
+    async def lease_for_task(self, task_id: str) -> BackendLease:
+        """
+        Lease the backend that owns ``task_id``, falling back to normal routing.
+        """
+        if len(self.backends) > 1:
+            url = await self._lookup_task(task_id)
+            backend = self.get(url) if url else None
+            if backend is not None:
+                return self.lease(backend)
+            logger.warning(f"No backend affinity recorded for task {task_id}; routing normally")
+        return self.lease()
+
+    async def remember_task(self, task_id: str, backend: Backend) -> None:
+        """
+        Record that ``task_id`` lives on ``backend``.
+        """
+        if len(self.backends) <= 1:
+            return
+        self._cache_route(task_id, backend.url)
+
+        redis = get_async_redis()
+        if redis is None:
+            return
+        try:
+            await redis.set(
+                f"{settings.DOCLING_TASK_AFFINITY_PREFIX}{task_id}",
+                backend.url,
+                ex=settings.DOCLING_TASK_AFFINITY_TTL,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to store task affinity for {task_id}: {str(e)}")
+
+    def _cache_route(self, task_id: str, url: str) -> None:
+        # Bounded LRU of the most recently used task routes
+        self._task_routes[task_id] = url
+        self._task_routes.move_to_end(task_id)
+        while len(self._task_routes) > settings.DOCLING_TASK_AFFINITY_MAX_ENTRIES:
+            self._task_routes.popitem(last=False)
+
+    async def _lookup_task(self, task_id: str) -> Optional[str]:
+        url = self._task_routes.get(task_id)
+        if url is not None:
+            self._task_routes.move_to_end(task_id)
+            return url
+        redis = get_async_redis()
+        if redis is None:
+            return None
+        try:
+            stored = await redis.get(f"{settings.DOCLING_TASK_AFFINITY_PREFIX}{task_id}")
+        except Exception as e:
+            logger.warning(f"Failed to read task affinity for {task_id}: {str(e)}")
+            return None
+        if stored is None:
+            return None
+        url = stored.decode() if isinstance(stored, (bytes, bytearray)) else stored
+        self._cache_route(task_id, url)
+        return url
+
+    def _record_success(self, backend: Backend) -> None:
+        backend.consecutive_failures = 0
+
+    def _record_failure(self, backend: Backend, error: Optional[BaseException]) -> None:
+        backend.consecutive_failures += 1
+        backend.total_failures += 1
+        if not backend.healthy:
+            return
+        connection_error = isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+        if connection_error or backend.consecutive_failures >= settings.DOCLING_BACKEND_MAX_FAILURES:
+            self._eject(backend)
+
+    def _eject(self, backend: Backend) -> None:
+        if len(self.backends) <= 1:
+            # Nothing to fail over to; keep routing to the only instance
+            return
+        backend.ejections += 1
+        backend.ejected_until = time.monotonic() + settings.DOCLING_BACKEND_EJECT_SECONDS
+        logger.warning(
+            f"Ejected Docling backend {backend.url} after {backend.consecutive_failures} consecutive failures"
+        )
+
+    async def _probe(self, backend: Backend) -> None:
+        try:
+            response = await get_upstream_client().get(
+                f"{backend.url}{settings.DOCLING_BACKEND_HEALTH_PATH}",
+                timeout=settings.DOCLING_BACKEND_PROBE_TIMEOUT,
+            )
+            healthy = response.status_code == 200
+        except Exception:
+            healthy = False
+
+        if healthy:
+            backend.ejected_until = None
+            backend.consecutive_failures = 0
+            logger.info(f"Docling backend {backend.url} passed its health probe and is back in rotation")
+        else:
+            backend.ejected_until = time.monotonic() + settings.DOCLING_BACKEND_EJECT_SECONDS
+
+    async def _probe_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.DOCLING_BACKEND_PROBE_INTERVAL)
+            now = time.monotonic()
+            due = [
+                backend for backend in self.backends
+                if backend.ejected_until is not None and backend.ejected_until <= now
+            ]
+            if due:
+                await asyncio.gather(*(self._probe(backend) for backend in due), return_exceptions=True)
+
+    async def start(self) -> None:
+        """
+        Start the background health prober. Called from the application lifespan.
+        """
+        if self._probe_task is None and len(self.backends) > 1:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+            logger.info(f"Routing Docling requests across {len(self.backends)} backends")
+
+    async def stop(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+    def stats(self) -> List[dict]:
+        return [backend.stats() for backend in self.backends]
+
+
+def configured_backend_urls() -> List[str]:
+    """
+    Docling backends from DOCLING_API_URLS (comma-separated), or DOCLING_API_URL.
+    """
+    urls = [url.strip() for url in settings.DOCLING_API_URLS.split(",") if url.strip()]
+    return urls or [settings.DOCLING_API_URL]
+
+
+docling_backends = BackendPool(configured_backend_urls())
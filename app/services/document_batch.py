@@ -0,0 +1,200 @@
+import asyncio
+import base64
+import json
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+from starlette.datastructures import UploadFile
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.document.batch import BatchConvertRequest, BatchSource
+from app.services.conversion_cache import SpooledRequestBody
+from app.services.docling import DoclingService
+
+logger = get_logger("app.services.document_batch")
+
+
+@dataclass
+class BatchItem:
+    """One conversion in a batch and how to build its Docling request body."""
+    index: int
+    source: str
+    endpoint: str
+    build_body: Callable[[], Awaitable[SpooledRequestBody]]
+    id: Optional[str] = None
+
+
+def items_from_sources(batch: BatchConvertRequest) -> List[BatchItem]:
+    """
+    Build batch items for a JSON batch of source URLs.
+    """
+    def source_body(source: BatchSource):
+        async def build() -> SpooledRequestBody:
+            http_source = {"url": source.url}
+            if source.headers:
+                http_source["headers"] = source.headers
+            payload = {
+                "http_sources": [http_source],
+                "options": {**batch.options, **(source.options or {})},
+            }
+
+            async def chunks():
+                yield json.dumps(payload).encode()
+
+            return await SpooledRequestBody.from_stream(chunks(), "/v1alpha/convert/source", "application/json")
+        return build
+
+    return [
+        BatchItem(
+            index=index,
+            source=source.url,
+            endpoint="/v1alpha/convert/source",
+            build_body=source_body(source),
+            id=source.id,
+        )
+        for index, source in enumerate(batch.sources)
+    ]
+
+
+async def multipart_body(
+    fields: Dict[str, List[str]],
+    files: List[Tuple[Optional[str], BinaryIO, Optional[str]]],
+) -> SpooledRequestBody:
+    """
+    Encode form fields and files as a Docling ``/convert/file`` request body.
+
+    Args:
+        fields: Form fields (conversion options), each with one or more values
+        files: ``(filename, file object, content type)`` for each ``files`` part
+    """
+    # Let httpx encode the multipart body for Docling
+    encoded = httpx.Request(
+        "POST",
+        DoclingService.build_target_url("/v1alpha/convert/file"),
+        data=fields,
+        files=[("files", file) for file in files],
+    )
+
+    async def chunks():
+        for chunk in encoded.stream:
+            yield chunk
+
+    return await SpooledRequestBody.from_stream(
+        chunks(), "/v1alpha/convert/file", encoded.headers["Content-Type"]
+    )
+
+
+def items_from_uploads(uploads: List[UploadFile], fields: Dict[str, List[str]]) -> List[BatchItem]:
+    """
+    Build batch items for uploaded files, one Docling request per file.
+
+    Every item is sent with the same form fields (conversion options).
+    """
+    def file_body(upload: UploadFile):
+        async def build() -> SpooledRequestBody:
+            return await multipart_body(fields, [(upload.filename, upload.file, upload.content_type)])
+        return build
+
+    return [
+        BatchItem(
+            index=index,
+            source=upload.filename or f"file-{index}",
+            endpoint="/v1alpha/convert/file",
+            build_body=file_body(upload),
+        )
+        for index, upload in enumerate(uploads)
+    ]
+
+
+async def _convert_item(item: BatchItem, timeout: float) -> dict:
+    """
+    Convert a single batch item, turning any failure into an error line.
+    """
+    line = {"index": item.index, "id": item.id, "source": item.source}
+    started = time.monotonic()
+    try:
+        body = await item.build_body()
+        try:
+            result, cache_status = await DoclingService.convert(item.endpoint, body, timeout)
+        finally:
+            await body.close()
+    except HTTPException as e:
+        line["status_code"] = e.status_code
+        line["error"] = e.detail
+        line["elapsed"] = round(time.monotonic() - started, 3)
+        return line
+    except Exception as e:
+        logger.warning(f"Batch item {item.index} ({item.source}) failed: {str(e)}")
+        line["status_code"] = 502
+        line["error"] = f"Error communicating with backend service: {type(e).__name__}"
+        line["elapsed"] = round(time.monotonic() - started, 3)
+        return line
+
+    line["status_code"] = result.status_code
+    line["cache"] = cache_status
+    line["elapsed"] = round(time.monotonic() - started, 3)
+
+    is_json = result.headers.get("content-type", "").startswith("application/json")
+    if result.status_code == 200:
+        if is_json:
+            line["result"] = json.loads(result.body)
+        else:
+            # e.g. return_as_file=true yields a zip archive
+            line["content_type"] = result.headers.get("content-type")
+            line["result_base64"] = base64.b64encode(result.body).decode()
+    else:
+        try:
+            line["error"] = json.loads(result.body) if is_json else result.body.decode("utf-8", "replace")
+        except ValueError:
+            line["error"] = result.body.decode("utf-8", "replace")
+    return line
+
+
+async def stream_batch(
+    items: List[BatchItem],
+    concurrency: int,
+    timeout: Optional[float] = None,
+    on_finish: Optional[Callable[[], Awaitable[None]]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Convert batch items with bounded concurrency and yield NDJSON lines.
+
+    Lines are emitted in completion order as soon as each item finishes. If
+    the client disconnects, outstanding conversions are cancelled.
+
+    Args:
+        items: Items to convert
+        concurrency: Maximum number of conversions in flight at once
+        timeout: Per-item Docling request timeout in seconds
+        on_finish: Optional cleanup coroutine run once the batch is done
+
+    Yields:
+        One JSON-encoded line per item, terminated by a newline
+    """
+    if timeout is None:
+        timeout = settings.DEFAULT_TIMEOUT
+
+    semaphore = asyncio.Semaphore(concurrency)
+    finished: "asyncio.Queue[dict]" = asyncio.Queue()
+
+    async def run(item: BatchItem):
+        async with semaphore:
+            line = await _convert_item(item, timeout)
+        await finished.put(line)
+
+    logger.info(f"Starting batch conversion of {len(items)} items (concurrency={concurrency})")
+    tasks = [asyncio.create_task(run(item)) for item in items]
+    try:
+        for _ in range(len(tasks)):
+            line = await finished.get()
+            yield (json.dumps(line) + "\n").encode()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if on_finish is not None:
+            await on_finish()
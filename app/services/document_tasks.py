@@ -0,0 +1,176 @@
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from celery.exceptions import SoftTimeLimitExceeded
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.services.conversion_cache import CachedResult, cacheable_headers, conversion_cache, is_cacheable
+from app.services.devskiller import redis_client
+from app.services.docling import DoclingService
+from app.services.worker_loop import soft_time_limit, worker_loop
+
+logger = logging.getLogger(__name__)
+
+SOURCE_ENDPOINT = "/v1alpha/convert/source"
+SOURCE_ASYNC_ENDPOINT = f"{SOURCE_ENDPOINT}/async"
+# Docling's async task states that end polling
+FINAL_TASK_STATES = ("success", "failure")
+
+
+def status_key(job_id: str) -> str:
+    return f"{settings.HUB_JOB_REDIS_PREFIX}{job_id}"
+
+
+def result_key(job_id: str) -> str:
+    return f"{settings.HUB_JOB_REDIS_PREFIX}{job_id}:result"
+
+
+def job_channel(job_id: str) -> str:
+    return f"{settings.HUB_JOB_REDIS_PREFIX}done:{job_id}"
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _update_status(job_id: str, task_status: str, **meta) -> dict:
+    """Merge ``meta`` into the job's stored status and set its state."""
+    stored = redis_client.get(status_key(job_id))
+    status = json.loads(stored) if stored else {"task_id": job_id, "task_meta": {}}
+    status["task_status"] = task_status
+    status["task_position"] = None
+    status["task_meta"].update(meta)
+    redis_client.set(status_key(job_id), json.dumps(status), ex=settings.HUB_JOB_TTL)
+    return status
+
+
+def _finish(job_id: str, status_code: int, content_type: str, body: bytes, **meta) -> dict:
+    """Store the job's result, mark it finished and notify waiting clients."""
+    redis_client.hset(result_key(job_id), mapping={
+        "status_code": status_code,
+        "content_type": content_type,
+        "body": body,
+    })
+    redis_client.expire(result_key(job_id), settings.HUB_JOB_TTL)
+    status = _update_status(
+        job_id,
+        "success" if status_code == 200 else "failure",
+        status_code=status_code,
+        finished_at=utc_now(),
+        **meta,
+    )
+    redis_client.publish(job_channel(job_id), json.dumps(status))
+    return status
+
+
+def _fail(job_id: str, status_code: int, error: str) -> dict:
+    return _finish(job_id, status_code, "application/json", json.dumps({"detail": error}).encode())
+
+
+async def _wait_for_task(task_id: str) -> None:
+    """Long-poll a Docling task on the backend that owns it until it finishes."""
+    while True:
+        response = await DoclingService.fetch_task(
+            f"/v1alpha/status/poll/{task_id}",
+            task_id,
+            timeout=settings.HUB_JOB_POLL_WAIT + settings.ASYNC_REQUEST_TIMEOUT,
+            query_params={"wait": settings.HUB_JOB_POLL_WAIT},
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Docling returned {response.status_code} polling task {task_id}")
+        if response.json().get("task_status") in FINAL_TASK_STATES:
+            return
+
+
+async def _convert(payload: str, cache_key: Optional[str]) -> Tuple[CachedResult, str]:
+    """Run the conversion through the hub's cache, admission control and backend routing.
+
+    The job is submitted to Docling's async endpoint and long-polled, so a
+    slow document is bounded by HUB_JOB_TIMEOUT rather than by a single
+    HTTP request. The admission ticket is held until the result is in.
+
+    Returns:
+        Tuple of (result, cache status) where cache status is HIT or MISS
+    """
+    if cache_key is not None:
+        cached, _ = await conversion_cache.get(cache_key)
+        if cached is not None:
+            return cached, "HIT"
+
+    ticket = await DoclingService.admit()
+    ok = False
+    try:
+        response = await DoclingService.submit_task(SOURCE_ASYNC_ENDPOINT, payload.encode(), "application/json")
+        if ticket is not None:
+            ticket.mark_response()
+        if response.status_code == 200:
+            task_id = response.json()["task_id"]
+            await _wait_for_task(task_id)
+            response = await DoclingService.fetch_task(
+                f"/v1alpha/result/{task_id}", task_id, timeout=settings.ASYNC_REQUEST_TIMEOUT
+            )
+        ok = response.status_code < 500
+        result = CachedResult(response.status_code, cacheable_headers(response.headers), response.content)
+        # httpx has already decoded the body, so don't replay its encoding
+        result.headers.pop("content-encoding", None)
+    finally:
+        if ticket is not None:
+            ticket.release(ok)
+
+    if (
+        cache_key is not None
+        and result.size <= settings.CONVERSION_CACHE_MAX_ENTRY_BYTES
+        and await is_cacheable(result)
+    ):
+        await conversion_cache.set(cache_key, result)
+    return result, "MISS"
+
+
+@celery_app.task(
+    bind=True,
+    max_retries=settings.HUB_JOB_MAX_RETRIES,
+    default_retry_delay=30,
+    soft_time_limit=settings.HUB_JOB_TIMEOUT,
+    time_limit=settings.HUB_JOB_TIMEOUT + 60,
+)
+def convert_source_task(self, job_id: str, payload: str, cache_key: Optional[str] = None):
+    """Run a queued ``/convert/source`` conversion and store its result in Redis.
+
+    Jobs arrive on the interactive or bulk queue chosen at submission. The
+    status is kept under ``docling:job:<job_id>`` in the same shape as
+    Docling's async task status, so the existing status and result endpoints
+    can serve hub jobs unchanged. ``cache_key`` is the request's conversion
+    cache key, or None when the caller bypassed the cache.
+    """
+    _update_status(
+        job_id,
+        "started",
+        attempts=self.request.retries + 1,
+        started_at=utc_now(),
+    )
+    try:
+        result, cache_status = worker_loop.run(_convert(payload, cache_key), timeout=soft_time_limit(self))
+        if result.status_code >= 500:
+            raise RuntimeError(f"Docling returned {result.status_code}")
+    except SoftTimeLimitExceeded:
+        logger.error(f"Conversion job {job_id} timed out")
+        return _fail(job_id, 504, "Conversion timed out")
+    except Exception as e:
+        # Retry on failure. Checked up front because retry() re-raises ``exc``
+        # (not MaxRetriesExceededError) once the retries are used up.
+        logger.error(f"Error running conversion job {job_id}: {str(e)}")
+        if self.request.retries >= self.max_retries:
+            return _fail(job_id, 502, f"Max retries exceeded: {str(e)}")
+        _update_status(job_id, "pending", error=str(e))
+        raise self.retry(exc=e)
+
+    return _finish(
+        job_id,
+        result.status_code,
+        result.headers.get("content-type", "application/json"),
+        result.body,
+        cache=cache_status,
+    )
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import Request, Response
+from pypdf import PdfReader, PdfWriter
+from starlette.datastructures import UploadFile
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.conversion_cache import CACHE_STATUS_HEADER, CachedResult, should_bypass_cache
+from app.services.docling import DoclingService
+from app.services.document_batch import multipart_body
+
+logger = get_logger("app.services.pdf_split")
+
+# Text outputs that can be stitched back together in page order, keyed by
+# ``to_formats`` value. JSON and HTML documents carry cross-page structure
+# (references, <head>) and are never split.
+MERGEABLE_FORMATS = {
+    "md": "md_content",
+    "text": "text_content",
+    "doctags": "doctags_content",
+}
+
+CHUNKS_HEADER = "X-Docling-Chunks"
+
+
+@dataclass
+class PageChunk:
+    """A contiguous page range of the uploaded PDF, written out as its own PDF."""
+    first_page: int
+    last_page: int
+    file: SpooledTemporaryFile
+
+    @property
+    def label(self) -> str:
+        return f"{self.first_page}-{self.last_page}"
+
+
+def _mergeable_contents(fields: Dict[str, List[str]]) -> Optional[List[str]]:
+    """
+    Return the document keys to merge, or None if the requested output can't be split.
+    """
+    if any(value.lower() == "true" for value in fields.get("return_as_file", [])):
+        return None
+    if "page_range" in fields:
+        return None
+    formats = fields.get("to_formats") or ["md"]
+    if any(fmt not in MERGEABLE_FORMATS for fmt in formats):
+        return None
+    return [MERGEABLE_FORMATS[fmt] for fmt in formats]
+
+
+def _is_pdf(upload: UploadFile) -> bool:
+    upload.file.seek(0)
+    magic = upload.file.read(5)
+    upload.file.seek(0)
+    return magic == b"%PDF-"
+
+
+def _split_pdf(upload: UploadFile, chunk_pages: int, threshold: int) -> List[PageChunk]:
+    """
+    Split the uploaded PDF into page ranges of ``chunk_pages`` pages.
+
+    Returns an empty list when the document is at or below ``threshold``
+    pages, encrypted or unreadable, in which case it is converted whole.
+    Runs in a worker thread since pypdf parsing is CPU bound.
+    """
+    try:
+        reader = PdfReader(upload.file)
+        if reader.is_encrypted:
+            return []
+        page_count = len(reader.pages)
+    except Exception as e:
+        logger.warning(f"Could not read {upload.filename} for splitting, converting it whole: {str(e)}")
+        return []
+    finally:
+        upload.file.seek(0)
+    if page_count <= threshold:
+        return []
+
+    chunks = []
+    for start in range(0, page_count, chunk_pages):
+        end = min(start + chunk_pages, page_count)
+        writer = PdfWriter()
+        for index in range(start, end):
+            writer.add_page(reader.pages[index])
+        file = SpooledTemporaryFile(max_size=settings.CONVERSION_CACHE_SPOOL_MAX_MEMORY)
+        writer.write(file)
+        file.seek(0)
+        chunks.append(PageChunk(first_page=start + 1, last_page=end, file=file))
+    upload.file.seek(0)
+    return chunks
+
+
+def _merge(results: List[CachedResult], contents: List[str], filename: Optional[str], elapsed: float) -> dict:
+    """
+    Merge per-chunk Docling results (in page order) into one document result.
+    """
+    payloads = [json.loads(result.body) for result in results]
+    document = {"filename": filename}
+    for key in contents:
+        document[key] = "\n\n".join(
+            payload.get("document", {}).get(key) or "" for payload in payloads
+        )
+
+    statuses = [payload.get("status") for payload in payloads]
+    if all(status == "success" for status in statuses):
+        status = "success"
+    elif any(status in ("success", "partial_success") for status in statuses):
+        status = "partial_success"
+    else:
+        status = "failure"
+
+    return {
+        "document": document,
+        "status": status,
+        "errors": [error for payload in payloads for error in payload.get("errors") or []],
+        "processing_time": round(elapsed, 3),
+    }
+
+
+async def _convert_chunk(
+    chunk: PageChunk,
+    filename: Optional[str],
+    fields: Dict[str, List[str]],
+    semaphore: asyncio.Semaphore,
+    timeout: float,
+    bypass_cache: bool,
+) -> Tuple[CachedResult, str]:
+    async with semaphore:
+        body = await multipart_body(fields, [(filename, chunk.file, "application/pdf")])
+        try:
+            return await DoclingService.convert("/v1alpha/convert/file", body, timeout, bypass_cache)
+        except httpx.HTTPError as e:
+            logger.error(f"Error converting pages {chunk.label} of {filename}: {str(e)}")
+            raise DoclingService.upstream_error(e)
+        finally:
+            await body.close()
+
+
+def _bypass_cache(request: Request) -> bool:
+    return not settings.CONVERSION_CACHE_ENABLED or should_bypass_cache(request)
+
+
+async def _convert_whole(
+    request: Request,
+    uploads: List[UploadFile],
+    fields: Dict[str, List[str]],
+    timeout: float,
+) -> Response:
+    """
+    Relay the uploads to Docling in one request, streamed like ``/convert/file``.
+    """
+    body = await multipart_body(
+        fields, [(upload.filename, upload.file, upload.content_type) for upload in uploads]
+    )
+    if _bypass_cache(request):
+        return await DoclingService.send_uncached(request, "/v1alpha/convert/file", body, timeout)
+    return await DoclingService.send_cached(request, "/v1alpha/convert/file", body, timeout)
+
+
+async def convert_file_split(request: Request, timeout: Optional[float] = None) -> Response:
+    """
+    Convert an uploaded PDF by splitting it into page ranges converted in parallel.
+
+    A single PDF larger than PDF_SPLIT_THRESHOLD_PAGES pages is split into
+    chunks of PDF_SPLIT_CHUNK_PAGES pages. Up to PDF_SPLIT_MAX_CONCURRENCY
+    chunks are converted at once, spread across the Docling backends, and
+    their text outputs are merged back in page order. Each chunk goes through
+    the conversion cache (unless the request bypasses it), so repeating a
+    split conversion is cheap.
+
+    Anything that can't be split (several files, non-PDF input, small PDFs,
+    JSON/HTML outputs, ``return_as_file``, an explicit ``page_range``) is
+    converted whole.
+
+    Args:
+        request: The multipart ``/convert/file`` request
+        timeout: Per-chunk Docling request timeout in seconds
+
+    Returns:
+        The merged (or whole-document) conversion response
+    """
+    if timeout is None:
+        timeout = settings.DEFAULT_TIMEOUT
+
+    form = await request.form()
+    chunks: List[PageChunk] = []
+    try:
+        uploads = [value for _, value in form.multi_items() if isinstance(value, UploadFile)]
+        fields: Dict[str, List[str]] = {}
+        for key, value in form.multi_items():
+            if isinstance(value, str):
+                fields.setdefault(key, []).append(value)
+
+        contents = _mergeable_contents(fields)
+        if contents is not None and len(uploads) == 1 and _is_pdf(uploads[0]):
+            chunks = await asyncio.to_thread(
+                _split_pdf,
+                uploads[0],
+                settings.PDF_SPLIT_CHUNK_PAGES,
+                settings.PDF_SPLIT_THRESHOLD_PAGES,
+            )
+        if not chunks:
+            return await _convert_whole(request, uploads, fields, timeout)
+
+        filename = uploads[0].filename
+        logger.info(f"Converting {filename} as {len(chunks)} page ranges")
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(settings.PDF_SPLIT_MAX_CONCURRENCY)
+        bypass = _bypass_cache(request)
+        tasks = [
+            asyncio.create_task(_convert_chunk(chunk, filename, fields, semaphore, timeout, bypass))
+            for chunk in chunks
+        ]
+        try:
+            converted = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        for chunk, (result, _) in zip(chunks, converted):
+            if result.status_code != 200:
+                logger.warning(f"Pages {chunk.label} of {filename} failed with status {result.status_code}")
+                return Response(
+                    content=result.body,
+                    status_code=result.status_code,
+                    headers={**result.headers, CHUNKS_HEADER: chunk.label},
+                )
+
+        merged = _merge([result for result, _ in converted], contents, filename, time.monotonic() - started)
+        if bypass:
+            cache_status = "BYPASS"
+        else:
+            cache_status = "HIT" if all(status == "HIT" for _, status in converted) else "MISS"
+        return Response(
+            content=json.dumps(merged),
+            media_type="application/json",
+            headers={CACHE_STATUS_HEADER: cache_status, CHUNKS_HEADER: str(len(chunks))},
+        )
+    finally:
+        for chunk in chunks:
+            chunk.file.close()
+        await form.close()
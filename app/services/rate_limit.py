@@ -0,0 +1,291 @@
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from celery.signals import task_postrun
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis_client import get_async_redis
+from app.services.devskiller import redis_client
+
+logger = get_logger("app.services.rate_limit")
+
+# Token bucket shared by all hub workers. Refills at ARGV[1] tokens per second
+# up to ARGV[2] and grants up to ARGV[3] tokens at once (fewer when the bucket
+# holds fewer). Returns {granted, tokens left}; the float is returned as a
+# string because Lua numbers are truncated to integers on the way out.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {granted, tostring(tokens)}
+"""
+
+# Reserves a concurrent-job slot: KEYS[1] is the owner's sorted set of running
+# task IDs (scored by expiry), KEYS[2] maps the task ID back to the owner so
+# the worker can release it. ARGV: limit, slot TTL, task ID, owner.
+# Returns the number of running jobs, negated when the quota is full.
+JOB_SLOT_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1])
+local ttl = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local running = redis.call('ZCARD', KEYS[1])
+if running >= tonumber(ARGV[1]) then
+    return -running
+end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[3])
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('SET', KEYS[2], ARGV[4], 'EX', ttl)
+return running + 1
+"""
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Token bucket parameters of one route group."""
+
+    per_minute: int
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of one check, rendered as ``X-RateLimit-*`` headers."""
+
+    allowed: bool
+    limit: RateLimit
+    remaining: float
+    retry_after: float = 0.0
+
+    def headers(self) -> Dict[str, str]:
+        # Seconds until the bucket is full again
+        reset = (self.limit.burst - self.remaining) / self.limit.rate
+        headers = {
+            "X-RateLimit-Limit": str(self.limit.per_minute),
+            "X-RateLimit-Remaining": str(max(0, math.floor(self.remaining))),
+            "X-RateLimit-Reset": str(max(0, math.ceil(reset))),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+@dataclass
+class _Lease:
+    """Tokens this process took from the shared bucket but has not spent yet."""
+
+    tokens: int = 0
+    # Tokens left in the shared bucket after the last grant
+    remaining: float = 0.0
+    blocked_until: float = 0.0
+
+
+@dataclass
+class _LocalBucket:
+    tokens: float
+    updated: float = field(default_factory=time.monotonic)
+
+
+class RateLimiter:
+    """
+    Per-API-key token buckets, one per route group.
+
+    The buckets live in Redis and are updated atomically by a Lua script, so
+    every hub worker shares the same budget. To keep most checks off Redis,
+    each process leases several tokens at once and spends them locally, and
+    remembers a denial until the bucket refills, so a throttled client
+    hammering the API costs no Redis round trips. The lease is capped at a
+    tenth of the burst, so groups with small budgets stay exact across
+    workers. Without Redis (or when it fails) the buckets are kept in-process.
+    """
+
+    def __init__(self, limits: Dict[str, RateLimit], local_batch: int, prefix: str):
+        self.limits = {group: limit for group, limit in limits.items() if limit.per_minute > 0 and limit.burst > 0}
+        self.local_batch = max(1, local_batch)
+        self.prefix = prefix
+        self._leases: Dict[Tuple[str, str], _Lease] = {}
+        self._local: Dict[Tuple[str, str], _LocalBucket] = {}
+
+    def lease_size(self, limit: RateLimit) -> int:
+        return min(self.local_batch, max(1, limit.burst // 10))
+
+    async def check(self, key_id: str, group: str) -> Optional[RateLimitResult]:
+        """
+        Take one token for ``key_id`` in ``group``.
+
+        Returns:
+            The check's outcome, or None when the group is not rate limited
+        """
+        limit = self.limits.get(group)
+        if limit is None:
+            return None
+
+        bucket = (group, key_id)
+        lease = self._leases.setdefault(bucket, _Lease())
+        now = time.monotonic()
+        if lease.tokens > 0:
+            lease.tokens -= 1
+            return RateLimitResult(True, limit, lease.remaining + lease.tokens)
+        if now < lease.blocked_until:
+            return RateLimitResult(False, limit, 0.0, lease.blocked_until - now)
+
+        granted, remaining = await self._take(bucket, limit, self.lease_size(limit))
+        lease.remaining = remaining
+        if granted:
+            lease.tokens = granted - 1
+            return RateLimitResult(True, limit, remaining + lease.tokens)
+
+        retry_after = (1 - remaining) / limit.rate
+        lease.blocked_until = now + retry_after
+        return RateLimitResult(False, limit, remaining, retry_after)
+
+    async def _take(self, bucket: Tuple[str, str], limit: RateLimit, requested: int) -> Tuple[int, float]:
+        redis = get_async_redis()
+        if redis is not None:
+            try:
+                granted, remaining = await redis.eval(
+                    TOKEN_BUCKET_SCRIPT,
+                    1,
+                    f"{self.prefix}{bucket[0]}:{bucket[1]}",
+                    limit.rate,
+                    limit.burst,
+                    requested,
+                )
+                return int(granted), float(remaining)
+            except Exception as e:
+                logger.warning(f"Rate limit check failed in Redis, using the local bucket: {str(e)}")
+        return self._take_local(bucket, limit, requested)
+
+    def _take_local(self, bucket: Tuple[str, str], limit: RateLimit, requested: int) -> Tuple[int, float]:
+        """Same algorithm as TOKEN_BUCKET_SCRIPT, for this process only."""
+        now = time.monotonic()
+        state = self._local.setdefault(bucket, _LocalBucket(tokens=limit.burst, updated=now))
+        state.tokens = min(limit.burst, state.tokens + (now - state.updated) * limit.rate)
+        state.updated = now
+        granted = min(requested, math.floor(state.tokens))
+        state.tokens -= granted
+        return granted, state.tokens
+
+
+class JobQuota:
+    """
+    Caps the Celery jobs each API key has queued or running at once.
+
+    A slot is reserved in Redis under the job's Celery task ID before the
+    job is sent, and released by the worker once the task finishes for good
+    (retries keep it). Slots expire after ``slot_ttl`` seconds, so a job lost
+    with its worker cannot hold one forever. Without Redis the quota is not
+    enforced.
+    """
+
+    def __init__(self, limit: int, slot_ttl: int, prefix: str):
+        self.limit = limit
+        self.slot_ttl = slot_ttl
+        self.prefix = prefix
+
+    def owner_key(self, key_id: str) -> str:
+        return f"{self.prefix}{key_id}"
+
+    def task_key(self, task_id: str) -> str:
+        return f"{self.prefix}task:{task_id}"
+
+    async def reserve(self, key_id: Optional[str], task_id: str) -> None:
+        """
+        Reserve a job slot for ``key_id``.
+
+        Raises:
+            HTTPException: 429 when the key already has ``limit`` jobs running
+        """
+        redis = get_async_redis()
+        if self.limit <= 0 or key_id is None or redis is None:
+            return
+        try:
+            running = await redis.eval(
+                JOB_SLOT_SCRIPT,
+                2,
+                self.owner_key(key_id),
+                self.task_key(task_id),
+                self.limit,
+                self.slot_ttl,
+                task_id,
+                key_id,
+            )
+        except Exception as e:
+            logger.warning(f"Job quota check failed, allowing the job: {str(e)}")
+            return
+        self._check(running)
+
+    def _check(self, running: int) -> None:
+        if running < 0:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Concurrent job limit reached ({self.limit} jobs per API key)",
+                headers={"Retry-After": "30"},
+            )
+
+    async def release(self, task_id: str) -> None:
+        """
+        Release a slot whose job could not be sent.
+        """
+        redis = get_async_redis()
+        if redis is None:
+            return
+        try:
+            key_id = await redis.getdel(self.task_key(task_id))
+            if key_id is not None:
+                await redis.zrem(self.owner_key(key_id.decode()), task_id)
+        except Exception as e:
+            logger.warning(f"Could not release job slot {task_id}: {str(e)}")
+
+    def release_sync(self, task_id: str) -> None:
+        """
+        Release the slot of a finished task (called in the Celery worker).
+        """
+        try:
+            key_id = redis_client.getdel(self.task_key(task_id))
+            if key_id is not None:
+                redis_client.zrem(self.owner_key(key_id.decode()), task_id)
+        except Exception as e:
+            logger.warning(f"Could not release job slot {task_id}: {str(e)}")
+
+
+rate_limiter = RateLimiter(
+    limits={
+        "document": RateLimit(settings.RATE_LIMIT_DOCUMENT_PER_MINUTE, settings.RATE_LIMIT_DOCUMENT_BURST),
+        "video": RateLimit(settings.RATE_LIMIT_VIDEO_PER_MINUTE, settings.RATE_LIMIT_VIDEO_BURST),
+        "devskiller": RateLimit(settings.RATE_LIMIT_DEVSKILLER_PER_MINUTE, settings.RATE_LIMIT_DEVSKILLER_BURST),
+    },
+    local_batch=settings.RATE_LIMIT_LOCAL_BATCH,
+    prefix=settings.RATE_LIMIT_REDIS_PREFIX,
+)
+
+job_quota = JobQuota(
+    limit=settings.JOB_QUOTA_PER_KEY,
+    slot_ttl=settings.JOB_QUOTA_SLOT_TTL,
+    prefix=settings.JOB_QUOTA_REDIS_PREFIX,
+)
+
+
+@task_postrun.connect
+def release_job_slot(task_id=None, state=None, **kwargs):
+    """Free the task's quota slot once it has finished for good."""
+    if task_id and state != "RETRY":
+        job_quota.release_sync(task_id)
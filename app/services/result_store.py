@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional, Tuple, Union
+
+import anyio
+import httpx
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from app.core.compression import CONTENT_ENCODINGS, choose_encoding, compress_file, varies_by_encoding
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.docling import DoclingService
+
+logger = get_logger("app.services.result_store")
+
+
+@dataclass
+class StoredResult:
+    """A task result written to the disk store."""
+    path: str
+    content_type: str
+    etag: str
+    size: int
+    meta: dict = field(default_factory=dict)
+
+    async def to_response(self, request: Request) -> Response:
+        """
+        Serve the stored file, honouring ``If-None-Match``, ``Range`` and ``If-Range``.
+
+        Clients that accept compression get a compressed copy, written next
+        to the file on first use and served from disk afterwards. Each
+        encoding has its own ETag, and ranges apply to the compressed bytes.
+        """
+        path = self.path
+        etag = f'"{self.etag}"'
+        headers = {"Cache-Control": "private"}
+        if varies_by_encoding(self.content_type):
+            headers["Vary"] = "Accept-Encoding"
+        encoding = choose_encoding(request.headers, {"content-type": self.content_type}, self.size)
+        if encoding is not None:
+            path = await asyncio.to_thread(_encoded_copy, self.path, encoding)
+            etag = f'"{self.etag}-{encoding}"'
+            headers["Content-Encoding"] = encoding
+        headers["ETag"] = etag
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if "*" in tags or etag in tags:
+                return Response(status_code=304, headers=headers)
+        # FileResponse streams the file with sendfile where available and
+        # answers single and multi-part Range requests
+        return FileResponse(path, media_type=self.content_type, headers=headers)
+
+
+def _encoded_copy(path: str, encoding: str) -> str:
+    """Return the path of the ``encoding`` copy of a stored file, creating it if needed."""
+    encoded_path = f"{path}.{encoding}"
+    if not os.path.exists(encoded_path):
+        temp_path = f"{encoded_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            compress_file(path, temp_path, encoding)
+            os.replace(temp_path, encoded_path)
+        finally:
+            ResultStore._remove(temp_path)
+    return encoded_path
+
+
+class ResultStore:
+    """
+    Disk store for finished task results.
+
+    Each result is written once (data file plus a JSON sidecar holding its
+    content type, ETag and expiry) and served straight from disk afterwards.
+    The directory is the source of truth, so several workers can share it.
+    Entries expire after RESULT_STORE_TTL seconds and the least recently
+    served ones are evicted once the store (compressed copies included)
+    exceeds RESULT_STORE_MAX_BYTES.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def _paths(self, task_id: str) -> Tuple[str, str]:
+        name = hashlib.sha256(task_id.encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.data"), os.path.join(self.directory, f"{name}.json")
+
+    @staticmethod
+    def _entry_files(data_path: str, meta_path: str) -> Tuple[str, ...]:
+        # The data file, its compressed copies and the sidecar
+        return (data_path, *(f"{data_path}.{encoding}" for encoding in CONTENT_ENCODINGS), meta_path)
+
+    @staticmethod
+    def _remove(*paths: str) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def get(self, task_id: str) -> Optional[StoredResult]:
+        """
+        Return the stored result for ``task_id``, or None if absent or expired.
+        """
+        return await asyncio.to_thread(self._read, task_id)
+
+    def _read(self, task_id: str) -> Optional[StoredResult]:
+        data_path, meta_path = self._paths(task_id)
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta["expires_at"] <= time.time() or not os.path.exists(data_path):
+            self._remove(*self._entry_files(data_path, meta_path))
+            return None
+        # The sidecar's mtime records the last access for LRU eviction
+        os.utime(meta_path)
+        return StoredResult(data_path, meta["content_type"], meta["etag"], meta["size"], meta.get("meta", {}))
+
+    async def put(
+        self,
+        task_id: str,
+        content_type: str,
+        chunks: AsyncIterator[bytes],
+        meta: Optional[dict] = None
+    ) -> StoredResult:
+        """
+        Write a result to the store, streaming it to disk chunk by chunk.
+
+        ``meta`` is kept in the sidecar and returned with the stored result.
+        """
+        extra = meta or {}
+        data_path, meta_path = self._paths(task_id)
+        await asyncio.to_thread(os.makedirs, self.directory, exist_ok=True)
+        temp_path = f"{data_path}.{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with await anyio.open_file(temp_path, "wb") as temp_file:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await temp_file.write(chunk)
+            meta = {
+                "task_id": task_id,
+                "content_type": content_type,
+                "etag": digest.hexdigest(),
+                "size": size,
+                "expires_at": time.time() + self.ttl,
+                "meta": extra,
+            }
+            await asyncio.to_thread(self._commit, temp_path, data_path, meta_path, meta)
+        except BaseException:
+            await asyncio.to_thread(self._remove, temp_path)
+            raise
+
+        await asyncio.to_thread(self._evict)
+        return StoredResult(data_path, content_type, meta["etag"], size, extra)
+
+    @staticmethod
+    def _commit(temp_path: str, data_path: str, meta_path: str, meta: dict) -> None:
+        # Data first, then the sidecar: readers only trust entries with both.
+        # Compressed copies of a previous result under this id are stale.
+        ResultStore._remove(*(f"{data_path}.{encoding}" for encoding in CONTENT_ENCODINGS))
+        os.replace(temp_path, data_path)
+        temp_meta = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_meta, "w") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(temp_meta, meta_path)
+
+    def _evict(self) -> None:
+        now = time.time()
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(".tmp"):
+                    # Leftovers of interrupted writes
+                    if entry.stat().st_mtime < now - self.ttl:
+                        self._remove(entry.path)
+                    continue
+                if not entry.name.endswith(".json"):
+                    continue
+                data_path = entry.path[:-len(".json")] + ".data"
+                try:
+                    with open(entry.path) as meta_file:
+                        meta = json.load(meta_file)
+                    last_access = entry.stat().st_mtime
+                except (OSError, ValueError):
+                    continue
+                if meta["expires_at"] <= now:
+                    self._remove(*self._entry_files(data_path, entry.path))
+                    continue
+                size = meta["size"]
+                for encoding in CONTENT_ENCODINGS:
+                    try:
+                        size += os.stat(f"{data_path}.{encoding}").st_size
+                    except FileNotFoundError:
+                        pass
+                entries.append((last_access, size, data_path, entry.path))
+                total += size
+
+        entries.sort()
+        for _, size, data_path, meta_path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(*self._entry_files(data_path, meta_path))
+            total -= size
+
+    async def _single_chunk(self, body: bytes) -> AsyncIterator[bytes]:
+        yield body
+
+    async def put_bytes(self, task_id: str, content_type: str, body: bytes) -> StoredResult:
+        """
+        Write an in-memory result (e.g. a hub job result from Redis) to the store.
+        """
+        return await self.put(task_id, content_type, self._single_chunk(body))
+
+    async def fetch_docling(self, task_id: str) -> Union[StoredResult, Response]:
+        """
+        Return the stored result of a Docling task, downloading it once if needed.
+
+        Concurrent requests for the same task share one download. Non-200
+        Docling responses (task not finished, unknown task) are returned as
+        is and never stored.
+        """
+        stored = await self.get(task_id)
+        if stored is not None:
+            return stored
+
+        pending = self._pending.get(task_id)
+        if pending is not None:
+            shared = await asyncio.shield(pending)
+            if shared is not None:
+                return shared
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[task_id] = future
+        stored = None
+        try:
+            async with DoclingService.open_task_stream(
+                f"/v1alpha/result/{task_id}",
+                task_id,
+                timeout=settings.RESULT_FETCH_TIMEOUT,
+            ) as response:
+                if response.status_code != 200:
+                    content = await response.aread()
+                    return Response(
+                        content=content,
+                        status_code=response.status_code,
+                        media_type=response.headers.get("content-type"),
+                    )
+                stored = await self.put(
+                    task_id,
+                    response.headers.get("content-type", "application/json"),
+                    response.aiter_bytes(settings.STREAM_CHUNK_SIZE),
+                )
+                return stored
+        except httpx.HTTPError as e:
+            logger.error(f"Error fetching the result of task {task_id} from Docling:", exc_info=True)
+            raise DoclingService.upstream_error(e)
+        finally:
+            self._pending.pop(task_id, None)
+            if not future.done():
+                future.set_result(stored)
+
+
+result_store = ResultStore(
+    directory=settings.RESULT_STORE_DIR,
+    max_bytes=settings.RESULT_STORE_MAX_BYTES,
+    ttl=settings.RESULT_STORE_TTL,
+)
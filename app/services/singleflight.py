@@ -0,0 +1,181 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from redis.exceptions import LockError
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis_client import get_async_redis
+from app.services.conversion_cache import CachedResult, conversion_cache
+
+logger = get_logger("app.services.singleflight")
+
+# Published on the completion channel when the leader finished without a
+# shareable result (error response, interrupted stream, oversized body).
+FAILED_MESSAGE = b"failed"
+DONE_MESSAGE = b"done"
+
+
+class Flight:
+    """
+    One participant's view of a coalesced conversion.
+
+    Leaders perform the upstream call and must call ``finish`` exactly once;
+    followers call ``wait`` to receive the leader's result.
+    """
+
+    def __init__(
+        self,
+        group: "SingleFlight",
+        key: str,
+        is_leader: bool,
+        future: "asyncio.Future[Optional[CachedResult]]",
+        lock=None,
+    ):
+        self.group = group
+        self.key = key
+        self.is_leader = is_leader
+        self._future = future
+        self._lock = lock
+
+    async def wait(self) -> Optional[CachedResult]:
+        """
+        Wait for the leader's result.
+
+        Returns:
+            The shared result, or None if the leader failed or timed out, in
+            which case the caller should perform its own upstream call.
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._future), timeout=settings.DEFAULT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out waiting for in-flight conversion {self.key[:12]}")
+            return None
+
+    async def finish(self, result: Optional[CachedResult]) -> None:
+        """
+        Publish the leader's result to local and cross-worker followers.
+        """
+        await self.group._finish(self, result)
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight conversions.
+
+    Within a process, followers await the leader's future. Across uvicorn
+    workers, the leader holds a Redis lock for the key; the first request for
+    the key in each other worker waits on a Redis pub/sub channel and then
+    reads the result from the Redis cache tier, sharing it with that worker's
+    local followers.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Future[Optional[CachedResult]]"] = {}
+
+    @staticmethod
+    def _lock_name(key: str) -> str:
+        return f"{settings.SINGLE_FLIGHT_REDIS_PREFIX}lock:{key}"
+
+    @staticmethod
+    def _channel(key: str) -> str:
+        return f"{settings.SINGLE_FLIGHT_REDIS_PREFIX}done:{key}"
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def begin(self, key: str) -> Flight:
+        """
+        Join the flight for ``key``, becoming its leader if nobody else is.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            return Flight(self, key, is_leader=False, future=future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        redis = get_async_redis()
+        if redis is None:
+            return Flight(self, key, is_leader=True, future=future)
+
+        lock = redis.lock(
+            self._lock_name(key),
+            timeout=settings.SINGLE_FLIGHT_LOCK_TTL,
+            blocking=False,
+        )
+        try:
+            if await lock.acquire():
+                return Flight(self, key, is_leader=True, future=future, lock=lock)
+        except Exception as e:
+            logger.warning(f"Single-flight lock unavailable, converting locally: {str(e)}")
+            return Flight(self, key, is_leader=True, future=future)
+
+        # Another worker is converting the same document; wait for it on
+        # behalf of every local request for this key.
+        logger.info(f"Joining in-flight conversion {key[:12]} from another worker")
+        result = await self._wait_remote(key)
+        if result is None:
+            # The remote leader failed or vanished: convert locally while
+            # local followers keep waiting on our future.
+            return Flight(self, key, is_leader=True, future=future)
+
+        self._inflight.pop(key, None)
+        future.set_result(result)
+        return Flight(self, key, is_leader=False, future=future)
+
+    async def _wait_remote(self, key: str) -> Optional[CachedResult]:
+        redis = get_async_redis()
+        deadline = time.monotonic() + settings.DEFAULT_TIMEOUT
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(self._channel(key))
+            # The leader may have finished before we subscribed
+            result, _ = await conversion_cache.get(key)
+            if result is not None:
+                return result
+            while time.monotonic() < deadline:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=settings.SINGLE_FLIGHT_POLL_INTERVAL,
+                )
+                if message is not None:
+                    if message["data"] == FAILED_MESSAGE:
+                        return None
+                    break
+                # No notification yet: make sure the leader still holds its
+                # lease, otherwise stop waiting for a result that won't come.
+                if not await redis.exists(self._lock_name(key)):
+                    break
+        except Exception as e:
+            logger.warning(f"Single-flight wait on Redis failed: {str(e)}")
+            return None
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+        result, _ = await conversion_cache.get(key)
+        return result
+
+    async def _finish(self, flight: Flight, result: Optional[CachedResult]) -> None:
+        future = self._inflight.pop(flight.key, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+        if flight._lock is None:
+            return
+        redis = get_async_redis()
+        try:
+            shared = result is not None and result.status_code == 200
+            await redis.publish(self._channel(flight.key), DONE_MESSAGE if shared else FAILED_MESSAGE)
+            await flight._lock.release()
+        except LockError:
+            logger.warning(f"Single-flight lease for {flight.key[:12]} expired before completion")
+        except Exception as e:
+            logger.warning(f"Single-flight release failed: {str(e)}")
+
+
+single_flight = SingleFlight()
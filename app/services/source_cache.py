@@ -0,0 +1,277 @@
+import asyncio
+import hashlib
+import json
+import os
+from email.message import Message
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import httpx
+from fastapi import Request, Response
+
+from app.core.config import settings
+from app.core.destinations import UnsafeDestination, check_destination_async
+from app.core.http_client import get_upstream_client
+from app.core.logging import get_logger
+from app.services.conversion_cache import cache_key, multipart_fingerprint
+from app.services.docling import DoclingService
+from app.services.document_batch import multipart_body
+from app.services.result_store import ResultStore, StoredResult
+
+logger = get_logger("app.services.source_cache")
+
+SOURCE_CACHE_HEADER = "X-Source-Cache"
+
+FILE_ENDPOINT = "/v1alpha/convert/file"
+SOURCE_ENDPOINT = "/v1alpha/convert/source"
+
+
+class SourceTooLarge(Exception):
+    """The source document exceeds SOURCE_CACHE_MAX_DOCUMENT_BYTES."""
+
+
+def _filename(url: str, response: httpx.Response) -> str:
+    """
+    Name the document like Docling does for a URL: Content-Disposition, else the URL path.
+    """
+    disposition = response.headers.get("content-disposition")
+    if disposition:
+        message = Message()
+        message["content-disposition"] = disposition
+        filename = message.get_filename()
+        if filename:
+            return os.path.basename(filename)
+    return os.path.basename(unquote(urlsplit(url).path)) or "document"
+
+
+class SourceCache:
+    """
+    Disk cache of documents downloaded from ``/convert/source`` URLs.
+
+    Each URL (with its request headers) is downloaded once and kept in a
+    ResultStore together with the origin's ``ETag`` and ``Last-Modified``.
+    Later requests revalidate it with a conditional GET: a ``304 Not
+    Modified`` reuses the stored bytes, anything else replaces them.
+    Concurrent requests for the same URL share one download.
+
+    The URL and every redirect target must be a public destination (see
+    ``check_destination``); other sources are left to Docling. Documents
+    are stored under a hash of the URL and headers, so header values such
+    as credentials never reach the disk.
+    """
+
+    def __init__(self, store: ResultStore):
+        self.store = store
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _source_id(url: str, headers: Dict[str, str]) -> str:
+        return hashlib.sha256(json.dumps([url, sorted(headers.items())]).encode()).hexdigest()
+
+    async def fetch(self, url: str, headers: Dict[str, str]) -> Optional[Tuple[StoredResult, str]]:
+        """
+        Return the current bytes of a source document from the cache.
+
+        Returns:
+            Tuple of (stored document, state) where state is REVALIDATED
+            (unchanged since the last download) or FETCHED, or None when
+            the document could not be downloaded
+        """
+        source_id = self._source_id(url, headers)
+        pending = self._pending.get(source_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[source_id] = future
+        result = None
+        try:
+            result = await self._revalidate(source_id, url, headers)
+            return result
+        finally:
+            self._pending.pop(source_id, None)
+            future.set_result(result)
+
+    async def _revalidate(self, source_id: str, url: str, headers: Dict[str, str]) -> Optional[Tuple[StoredResult, str]]:
+        stored = await self.store.get(source_id)
+        request_headers = dict(headers)
+        if stored is not None:
+            if stored.meta.get("etag"):
+                request_headers["If-None-Match"] = stored.meta["etag"]
+            if stored.meta.get("last_modified"):
+                request_headers["If-Modified-Since"] = stored.meta["last_modified"]
+
+        client = get_upstream_client()
+        request = client.build_request("GET", url, headers=request_headers, timeout=settings.SOURCE_FETCH_TIMEOUT)
+        try:
+            response = await self._send_checked(client, request)
+        except (httpx.HTTPError, UnsafeDestination) as e:
+            logger.warning(f"Could not download source {url}: {str(e)}")
+            return None
+
+        try:
+            if response.status_code == 304 and stored is not None:
+                logger.info(f"Source {url} not modified, using the cached copy")
+                return stored, "REVALIDATED"
+            if response.status_code != 200:
+                logger.warning(f"Source {url} returned {response.status_code}")
+                return None
+            content_length = response.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > settings.SOURCE_CACHE_MAX_DOCUMENT_BYTES:
+                logger.warning(f"Source {url} is too large to cache ({content_length} bytes)")
+                return None
+
+            meta = {
+                "url": url,
+                "filename": _filename(url, response),
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+            }
+            stored = await self.store.put(
+                source_id,
+                response.headers.get("content-type", "application/octet-stream").split(";", 1)[0],
+                self._limited(response.aiter_bytes(settings.STREAM_CHUNK_SIZE)),
+                meta=meta
+            )
+            logger.info(f"Downloaded source {url} ({stored.size} bytes)")
+            return stored, "FETCHED"
+        except (httpx.HTTPError, SourceTooLarge) as e:
+            logger.warning(f"Could not download source {url}: {str(e)}")
+            return None
+        finally:
+            await response.aclose()
+
+    @staticmethod
+    async def _send_checked(client: httpx.AsyncClient, request: httpx.Request) -> httpx.Response:
+        """
+        Send ``request``, following redirects only to checked public destinations.
+        """
+        for _ in range(settings.OUTBOUND_MAX_REDIRECTS + 1):
+            await check_destination_async(str(request.url))
+            response = await client.send(request, stream=True)
+            if response.next_request is None:
+                return response
+            await response.aclose()
+            # httpx drops Authorization when the redirect leaves the origin
+            request = response.next_request
+        raise UnsafeDestination(f"more than {settings.OUTBOUND_MAX_REDIRECTS} redirects")
+
+    @staticmethod
+    async def _limited(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > settings.SOURCE_CACHE_MAX_DOCUMENT_BYTES:
+                raise SourceTooLarge(f"larger than {settings.SOURCE_CACHE_MAX_DOCUMENT_BYTES} bytes")
+            yield chunk
+
+
+def _form_fields(options: dict) -> Optional[Dict[str, List[str]]]:
+    """
+    Encode ``/convert/source`` options as ``/convert/file`` form fields.
+
+    Returns None for options that have no form encoding (nested objects).
+    """
+    fields = {}
+    for name, value in options.items():
+        values = value if isinstance(value, list) else [value]
+        encoded = []
+        for item in values:
+            if item is None:
+                continue
+            if isinstance(item, bool):
+                encoded.append("true" if item else "false")
+            elif isinstance(item, (str, int, float)):
+                encoded.append(str(item))
+            else:
+                return None
+        if encoded:
+            fields[name] = encoded
+    return fields
+
+
+def _single_http_source(payload) -> Optional[Tuple[str, Dict[str, str], Dict[str, List[str]]]]:
+    """
+    Return (url, headers, form fields) for a request converting one URL, else None.
+    """
+    if not isinstance(payload, dict) or set(payload) - {"http_sources", "options"}:
+        return None
+    sources = payload.get("http_sources")
+    options = payload.get("options") or {}
+    if not isinstance(sources, list) or len(sources) != 1 or not isinstance(options, dict):
+        return None
+    source = sources[0]
+    if not isinstance(source, dict) or not isinstance(source.get("url"), str):
+        return None
+    if not source["url"].lower().startswith(("http://", "https://")):
+        return None
+    headers = source.get("headers") or {}
+    if not isinstance(headers, dict) or not all(isinstance(v, str) for v in headers.values()):
+        return None
+    fields = _form_fields(options)
+    if fields is None:
+        return None
+    return source["url"], headers, fields
+
+
+async def convert_source_cached(request: Request, timeout: float) -> Response:
+    """
+    Convert a source URL from the hub's source cache.
+
+    The document is downloaded (or revalidated) by the hub and sent to
+    Docling's file endpoint, so the conversion is cached by the document's
+    content hash: an unchanged document is served from the conversion cache
+    without downloading or converting it again. Requests with several
+    sources, file sources or nested options, and documents that cannot be
+    downloaded, are passed to Docling's source endpoint as before.
+
+    Args:
+        request: The original ``/convert/source`` request
+        timeout: Conversion timeout in seconds
+
+    Returns:
+        The conversion response, with an ``X-Source-Cache`` header of
+        REVALIDATED or FETCHED when the source cache was used
+    """
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        payload = None
+    source = _single_http_source(payload)
+    document = await source_cache.fetch(source[0], source[1]) if source is not None else None
+    if document is None:
+        return await DoclingService.cached_request(request, SOURCE_ENDPOINT, timeout)
+
+    _, _, fields = source
+    stored, state = document
+    filename = stored.meta["filename"]
+    key = cache_key(
+        FILE_ENDPOINT,
+        multipart_fingerprint(
+            [(name, value) for name, values in fields.items() for value in values],
+            [("files", filename, stored.etag)],
+        ),
+    )
+    response = await DoclingService.cache_hit(request, FILE_ENDPOINT, key)
+    if response is None:
+        try:
+            source_file = await asyncio.to_thread(open, stored.path, "rb")
+        except FileNotFoundError:
+            # Evicted in the meantime
+            return await DoclingService.cached_request(request, SOURCE_ENDPOINT, timeout)
+        try:
+            body = await multipart_body(fields, [(filename, source_file, stored.content_type)])
+        finally:
+            source_file.close()
+        response = await DoclingService.send_cached(request, FILE_ENDPOINT, body, timeout)
+    response.headers[SOURCE_CACHE_HEADER] = state
+    return response
+
+
+source_cache = SourceCache(
+    ResultStore(
+        directory=settings.SOURCE_CACHE_DIR,
+        max_bytes=settings.SOURCE_CACHE_MAX_BYTES,
+        ttl=settings.SOURCE_CACHE_TTL,
+    )
+)
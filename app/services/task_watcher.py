@@ -0,0 +1,327 @@
+import asyncio
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Dict, Optional
+
+import anyio
+from redis.exceptions import LockError
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis_client import get_async_redis
+from app.services.conversion_jobs import get_job_result, get_job_status, is_hub_job, job_channel
+from app.services.docling import DoclingService
+from app.services.result_store import StoredResult, result_store
+
+logger = get_logger("app.services.task_watcher")
+
+# Docling task states that mean the task is still running; anything else is final
+RUNNING_STATUSES = {"pending", "started"}
+
+
+@dataclass
+class TaskOutcome:
+    """The final Docling status of an async task, shared with every waiting client."""
+    status_code: int
+    body: dict
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status_code == 200 and self.body.get("task_status") == "success"
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw) -> "TaskOutcome":
+        return cls(**json.loads(raw))
+
+
+class TaskWatcher:
+    """
+    Watches Docling async tasks on behalf of any number of waiting clients.
+
+    Each process runs at most one watch per task, shared by all of its
+    subscribers. Across uvicorn workers a Redis lock elects a single poller;
+    it long-polls Docling's status endpoint and publishes the final status on
+    a pub/sub channel (and stores it briefly for late subscribers), so a task
+    costs one Docling long-poll at a time no matter how many clients wait.
+    Hub-managed jobs are never polled: their Celery task publishes on the
+    job's channel when it finishes. A watch is cancelled once its last local
+    subscriber goes away.
+    """
+
+    def __init__(self):
+        self._watches: Dict[str, asyncio.Task] = {}
+        self._subscribers: Dict[str, int] = {}
+
+    @staticmethod
+    def _lock_name(task_id: str) -> str:
+        return f"{settings.TASK_WATCH_REDIS_PREFIX}lock:{task_id}"
+
+    @staticmethod
+    def _channel(task_id: str) -> str:
+        return f"{settings.TASK_WATCH_REDIS_PREFIX}done:{task_id}"
+
+    @staticmethod
+    def _status_key(task_id: str) -> str:
+        return f"{settings.TASK_WATCH_REDIS_PREFIX}status:{task_id}"
+
+    def watching(self) -> int:
+        return len(self._watches)
+
+    async def wait(self, task_id: str) -> TaskOutcome:
+        """
+        Wait until ``task_id`` reaches a final state.
+        """
+        watch = self._watches.get(task_id)
+        if watch is None:
+            watch = asyncio.create_task(self._watch(task_id))
+            self._watches[task_id] = watch
+            watch.add_done_callback(lambda done: self._forget(task_id, done))
+        self._subscribers[task_id] = self._subscribers.get(task_id, 0) + 1
+        try:
+            return await asyncio.shield(watch)
+        finally:
+            remaining = self._subscribers.get(task_id, 1) - 1
+            if remaining > 0:
+                self._subscribers[task_id] = remaining
+            else:
+                self._subscribers.pop(task_id, None)
+                if not watch.done():
+                    watch.cancel()
+
+    def _forget(self, task_id: str, watch: asyncio.Task) -> None:
+        if self._watches.get(task_id) is watch:
+            del self._watches[task_id]
+
+    async def _watch(self, task_id: str) -> TaskOutcome:
+        if is_hub_job(task_id):
+            return await self._wait_job(task_id)
+
+        redis = get_async_redis()
+        if redis is None:
+            return await self._poll_until_done(task_id)
+
+        while True:
+            lock = redis.lock(self._lock_name(task_id), timeout=settings.TASK_WATCH_LOCK_TTL, blocking=False)
+            try:
+                outcome = await self._stored_outcome(task_id)
+                if outcome is not None:
+                    return outcome
+                acquired = await lock.acquire()
+            except Exception as e:
+                logger.warning(f"Task watch lock unavailable, polling locally: {str(e)}")
+                return await self._poll_until_done(task_id)
+
+            if acquired:
+                try:
+                    outcome = await self._poll_until_done(task_id, lock)
+                    await self._publish(task_id, outcome)
+                    return outcome
+                finally:
+                    try:
+                        await lock.release()
+                    except Exception:
+                        pass
+
+            outcome = await self._wait_remote(task_id)
+            if outcome is not None:
+                return outcome
+            # The other worker's poller went away: take over on the next pass
+
+    async def _poll_until_done(self, task_id: str, lock=None) -> TaskOutcome:
+        """
+        Long-poll Docling until the task leaves the running states.
+        """
+        wait = settings.TASK_WATCH_POLL_WAIT
+        errors = 0
+        while True:
+            try:
+                response = await DoclingService.fetch_task(
+                    f"/v1alpha/status/poll/{task_id}",
+                    task_id,
+                    timeout=wait + 30.0,
+                    query_params={"wait": wait},
+                )
+                if response.status_code >= 500:
+                    raise RuntimeError(f"Docling returned {response.status_code}")
+                body = response.json()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                errors += 1
+                logger.warning(f"Status poll for task {task_id} failed ({errors}/{settings.TASK_WATCH_MAX_ERRORS}): {str(e)}")
+                if errors >= settings.TASK_WATCH_MAX_ERRORS:
+                    return TaskOutcome(502, {"task_id": task_id, "detail": "Error communicating with backend service"})
+                await asyncio.sleep(min(2 ** errors, wait))
+                continue
+
+            errors = 0
+            if response.status_code != 200 or body.get("task_status") not in RUNNING_STATUSES:
+                return TaskOutcome(response.status_code, body)
+
+            if lock is not None:
+                try:
+                    await lock.extend(settings.TASK_WATCH_LOCK_TTL, replace_ttl=True)
+                except LockError:
+                    logger.warning(f"Lost the watch lock for task {task_id}; another worker may poll it too")
+                    lock = None
+                except Exception as e:
+                    logger.warning(f"Failed to extend the watch lock for task {task_id}: {str(e)}")
+
+    async def _stored_outcome(self, task_id: str) -> Optional[TaskOutcome]:
+        stored = await get_async_redis().get(self._status_key(task_id))
+        return TaskOutcome.from_json(stored) if stored is not None else None
+
+    async def _publish(self, task_id: str, outcome: TaskOutcome) -> None:
+        redis = get_async_redis()
+        payload = outcome.to_json()
+        try:
+            await redis.set(self._status_key(task_id), payload, ex=settings.TASK_WATCH_STATUS_TTL)
+            await redis.publish(self._channel(task_id), payload)
+        except Exception as e:
+            logger.warning(f"Failed to publish the final status of task {task_id}: {str(e)}")
+
+    async def _wait_remote(self, task_id: str) -> Optional[TaskOutcome]:
+        """
+        Wait for the worker holding the watch lock to publish the outcome.
+
+        Returns None if that worker stops holding the lock without publishing.
+        """
+        redis = get_async_redis()
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(self._channel(task_id))
+            # The poller may have finished before we subscribed
+            outcome = await self._stored_outcome(task_id)
+            if outcome is not None:
+                return outcome
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=settings.TASK_WATCH_POLL_WAIT,
+                )
+                if message is not None:
+                    return TaskOutcome.from_json(message["data"])
+                if not await redis.exists(self._lock_name(task_id)):
+                    return await self._stored_outcome(task_id)
+        except Exception as e:
+            logger.warning(f"Waiting on Redis for task {task_id} failed: {str(e)}")
+            # Back off so a Redis outage doesn't turn into a tight retry loop
+            await asyncio.sleep(settings.TASK_WATCH_POLL_WAIT)
+            return None
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+    async def _wait_job(self, task_id: str) -> TaskOutcome:
+        """
+        Wait for a hub job; its Celery task publishes on the job channel when done.
+        """
+        redis = get_async_redis()
+        if redis is None:
+            return TaskOutcome(404, {"detail": "Task not found."})
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(job_channel(task_id))
+            while True:
+                # Re-read the stored status after every message or timeout so a
+                # notification published before we subscribed is never missed
+                status = await get_job_status(task_id)
+                if status is None:
+                    return TaskOutcome(404, {"detail": "Task not found."})
+                if status.get("task_status") not in RUNNING_STATUSES:
+                    return TaskOutcome(200, status)
+                await pubsub.get_message(ignore_subscribe_messages=True, timeout=settings.TASK_WATCH_POLL_WAIT)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+async def _fetch_result(task_id: str) -> dict:
+    if is_hub_job(task_id):
+        result = await get_job_result(task_id)
+        if result is None:
+            raise RuntimeError("Job result expired")
+        status_code, _, body = result
+        return {"status_code": status_code, "body": json.loads(body)}
+    if settings.RESULT_STORE_ENABLED:
+        # Share the stored copy with the /result endpoint instead of downloading twice
+        result = await result_store.fetch_docling(task_id)
+        if isinstance(result, StoredResult):
+            return {"status_code": 200, "body": json.loads(await anyio.Path(result.path).read_bytes())}
+        return {"status_code": result.status_code, "body": json.loads(result.body)}
+    response = await DoclingService.fetch_task(
+        f"/v1alpha/result/{task_id}",
+        task_id,
+        timeout=settings.RESULT_FETCH_TIMEOUT,
+    )
+    return {"status_code": response.status_code, "body": response.json()}
+
+
+def _event(name: str, data: dict) -> bytes:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def stream_task_events(task_id: str, include_result: bool = False) -> AsyncIterator[bytes]:
+    """
+    Yield server-sent events for an async task until it finishes.
+
+    Comment lines are sent every TASK_WATCH_KEEPALIVE seconds to keep proxies
+    from closing the idle connection. The stream ends with one of:
+
+    - ``complete``: the final Docling status, followed by a ``result`` event
+      when ``include_result`` is set and the task succeeded
+    - ``error``: Docling rejected the task id or could not be reached
+    - ``timeout``: the task did not finish within TASK_WATCH_MAX_SECONDS
+
+    Args:
+        task_id: The Docling task to watch
+        include_result: Also fetch and send the conversion result
+
+    Yields:
+        Encoded server-sent event frames
+    """
+    deadline = time.monotonic() + settings.TASK_WATCH_MAX_SECONDS
+    waiter = asyncio.ensure_future(task_watcher.wait(task_id))
+    try:
+        yield b": watching\n\n"
+        while not waiter.done():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield _event("timeout", {"task_id": task_id})
+                return
+            await asyncio.wait({waiter}, timeout=min(settings.TASK_WATCH_KEEPALIVE, remaining))
+            if not waiter.done():
+                yield b": keepalive\n\n"
+
+        try:
+            outcome = waiter.result()
+        except Exception as e:
+            logger.error(f"Watching task {task_id} failed: {str(e)}")
+            yield _event("error", {"task_id": task_id, "status_code": 500, "detail": "Error watching task"})
+            return
+
+        if outcome.status_code != 200:
+            yield _event("error", {"task_id": task_id, "status_code": outcome.status_code, "detail": outcome.body})
+            return
+        yield _event("complete", outcome.body)
+
+        if include_result and outcome.succeeded:
+            try:
+                yield _event("result", await _fetch_result(task_id))
+            except Exception as e:
+                logger.error(f"Fetching the result of task {task_id} failed: {str(e)}")
+                yield _event("error", {"task_id": task_id, "status_code": 502, "detail": "Error fetching task result"})
+    finally:
+        waiter.cancel()
+
+
+task_watcher = TaskWatcher()
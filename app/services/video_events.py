@@ -0,0 +1,77 @@
+import json
+import time
+from typing import AsyncIterator
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.redis_client import get_async_redis
+from app.services.devskiller_tasks import is_final, video_channel, video_key
+
+logger = get_logger("app.services.video_events")
+
+
+def _event(name: str, data: dict) -> bytes:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def stream_video_events(candidate_id: str, invitation_id: str) -> AsyncIterator[bytes]:
+    """
+    Yield server-sent events for an invitation's video lookup until it finishes.
+
+    The worker publishes the final status on the invitation's channel, so
+    the event is sent as soon as the task is done. Comment lines are sent
+    every TASK_WATCH_KEEPALIVE seconds to keep proxies from closing the idle
+    connection. The stream ends with one of:
+
+    - ``complete``: the stored status, with the download ``url``
+    - ``error``: the lookup failed, or no lookup is known for the invitation
+    - ``timeout``: no final status within TASK_WATCH_MAX_SECONDS
+
+    Args:
+        candidate_id: The invitation's candidate
+        invitation_id: The invitation to watch
+
+    Yields:
+        Encoded server-sent event frames
+    """
+    ids = {"candidate_id": candidate_id, "invitation_id": invitation_id}
+    redis = get_async_redis()
+    if redis is None:
+        yield _event("error", {**ids, "status_code": 503, "detail": "Redis is not configured"})
+        return
+
+    deadline = time.monotonic() + settings.TASK_WATCH_MAX_SECONDS
+    pubsub = redis.pubsub()
+    try:
+        await pubsub.subscribe(video_channel(candidate_id, invitation_id))
+        yield b": watching\n\n"
+        while True:
+            # Re-read the stored status after every message or timeout so a
+            # status published before we subscribed is never missed
+            stored = await redis.get(video_key(candidate_id, invitation_id))
+            if stored is None:
+                yield _event("error", {**ids, "status_code": 404, "detail": "Task not found"})
+                return
+            status = json.loads(stored)
+            if is_final(status):
+                yield _event(status["status"], {**ids, **status})
+                return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield _event("timeout", ids)
+                return
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=min(settings.TASK_WATCH_KEEPALIVE, remaining),
+            )
+            if message is None:
+                yield b": keepalive\n\n"
+    except Exception as e:
+        logger.error(f"Watching video {candidate_id}/{invitation_id} failed: {str(e)}")
+        yield _event("error", {**ids, "status_code": 500, "detail": "Error watching task"})
+    finally:
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
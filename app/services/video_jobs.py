@@ -0,0 +1,75 @@
+import json
+from typing import Optional
+
+import redis.asyncio as aioredis
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+from app.services.devskiller_tasks import (
+    RELEASE_LEASE_SCRIPT,
+    deliver_video_webhook_task,
+    is_final,
+    video_callbacks_key,
+    video_key,
+    video_lease_key,
+)
+
+# Request-path counterparts of the helpers in devskiller_tasks, on the shared
+# asyncio Redis client so API routes never block the event loop.
+
+
+def _redis() -> aioredis.Redis:
+    redis = get_async_redis()
+    if redis is None:
+        raise HTTPException(status_code=503, detail="Video lookups are unavailable")
+    return redis
+
+
+async def get_video_status(candidate_id: str, invitation_id: str) -> Optional[dict]:
+    """
+    Return the stored status of an invitation's lookup, or None if there is none.
+    """
+    stored = await _redis().get(video_key(candidate_id, invitation_id))
+    return json.loads(stored) if stored else None
+
+
+async def set_video_processing(candidate_id: str, invitation_id: str) -> None:
+    await _redis().set(video_key(candidate_id, invitation_id), json.dumps({"status": "processing"}), ex=3600)
+
+
+async def claim_video(candidate_id: str, invitation_id: str, task_id: str) -> bool:
+    """
+    Take the invitation's lease for ``task_id``; False if another task holds it.
+    """
+    return bool(await _redis().set(
+        video_lease_key(candidate_id, invitation_id),
+        task_id,
+        nx=True,
+        ex=settings.VIDEO_LEASE_TTL,
+    ))
+
+
+async def release_video_lease(candidate_id: str, invitation_id: str, task_id: str) -> None:
+    await _redis().eval(RELEASE_LEASE_SCRIPT, 1, video_lease_key(candidate_id, invitation_id), task_id)
+
+
+async def add_video_callback(candidate_id: str, invitation_id: str, callback_url: str) -> None:
+    """
+    Send the invitation's next final status to ``callback_url``.
+
+    If the running task finished before the URL was registered, the
+    webhook is sent from here instead, so it is delivered exactly once.
+    """
+    redis = _redis()
+    callbacks_key = video_callbacks_key(candidate_id, invitation_id)
+    async with redis.pipeline() as pipe:
+        pipe.sadd(callbacks_key, callback_url)
+        pipe.expire(callbacks_key, settings.VIDEO_LEASE_TTL)
+        pipe.get(video_key(candidate_id, invitation_id))
+        _, _, stored = await pipe.execute()
+    status = json.loads(stored) if stored else None
+    if is_final(status) and await redis.srem(callbacks_key, callback_url):
+        payload = {"candidate_id": candidate_id, "invitation_id": invitation_id, **status}
+        await run_in_threadpool(deliver_video_webhook_task.delay, callback_url, payload)
@@ -0,0 +1,109 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_shutdown, worker_shutdown
+
+from app.core.http_client import close_upstream_client
+from app.core.logging import get_logger
+from app.core.redis_client import close_async_redis
+
+logger = get_logger("app.services.worker_loop")
+
+T = TypeVar("T")
+
+
+def soft_time_limit(task) -> Optional[float]:
+    """
+    The task's soft time limit, which ``WorkerLoop.run`` and ``browser_pool.run`` enforce under the threads pool.
+    """
+    _, soft = task.request.timelimit or (None, None)
+    return soft or task.soft_time_limit or task.app.conf.task_soft_time_limit
+
+
+class WorkerLoop:
+    """
+    A long-lived event loop per Celery worker process for the hub's async services.
+
+    Hub jobs reuse the API's request-path code (conversion cache, admission
+    control, backend routing), which is async and keeps its clients and
+    state bound to one event loop. The loop runs in a background thread;
+    tasks submit their coroutine with ``run`` and block on the result, so
+    several tasks of a threads-pool worker share the same upstream
+    connections, Redis pool and admission limit.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and self._loop.is_running()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self.running:
+                return
+            self._loop = asyncio.new_event_loop()
+            started = threading.Event()
+            self._loop.call_soon(started.set)
+            self._thread = threading.Thread(target=self._loop.run_forever, name="worker-loop", daemon=True)
+            self._thread.start()
+            started.wait()
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        Run ``coro`` on the worker's event loop and wait for its result.
+
+        After ``timeout`` seconds the coroutine is cancelled and
+        ``SoftTimeLimitExceeded`` raised, since the threads pool does not
+        enforce Celery time limits itself.
+        """
+        if not self.running:
+            self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise SoftTimeLimitExceeded(f"Job exceeded {timeout}s")
+        except BaseException:
+            # A soft time limit raised while waiting; stop the coroutine so it
+            # releases its admission slot and backend lease
+            future.cancel()
+            raise
+
+    def shutdown(self) -> None:
+        """
+        Close the loop's upstream client and Redis pool, then stop the loop.
+        """
+        if not self.running:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_clients(), self._loop).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"Worker loop did not shut down cleanly: {str(e)}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
+    @staticmethod
+    async def _close_clients() -> None:
+        await close_upstream_client()
+        await close_async_redis()
+
+
+worker_loop = WorkerLoop()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def stop_worker_loop(**kwargs):
+    # worker_shutdown covers the threads pool, which has no child processes
+    worker_loop.shutdown()
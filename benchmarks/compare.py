@@ -0,0 +1,69 @@
+"""
+Compare two benchmark reports written by benchmarks.run.
+
+Prints the change in throughput and tail latency for every scenario and
+concurrency level present in both reports, and exits with status 1 when any
+of them regressed by more than the threshold.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Tuple
+
+
+def load(path: str) -> Dict[Tuple[str, int], dict]:
+    with open(path) as report_file:
+        report = json.load(report_file)
+    return {(result["scenario"], result["concurrency"]): result for result in report["results"]}
+
+
+def change(before: float, after: float) -> float:
+    return (after - before) / before if before else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    baseline = load(args.baseline)
+    candidate = load(args.candidate)
+    regressions = []
+
+    print(f"{'scenario':14} {'conc':>4} {'req/s':>18} {'p95 ms':>20} {'p99 ms':>20} {'errors':>9}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key], candidate[key]
+        rps = change(before["rps"], after["rps"])
+        p95 = change(before["latency_ms"]["p95"], after["latency_ms"]["p95"])
+        p99 = change(before["latency_ms"]["p99"], after["latency_ms"]["p99"])
+        print(
+            f"{key[0]:14} {key[1]:>4} "
+            f"{after['rps']:>9.1f} ({rps:+6.1%}) "
+            f"{after['latency_ms']['p95']:>10.1f} ({p95:+6.1%}) "
+            f"{after['latency_ms']['p99']:>10.1f} ({p99:+6.1%}) "
+            f"{before['errors']:>4}->{after['errors']:<4}"
+        )
+        if rps < -args.threshold:
+            regressions.append(f"{key[0]} c={key[1]}: throughput {rps:+.1%}")
+        if p95 > args.threshold:
+            regressions.append(f"{key[0]} c={key[1]}: p95 latency {p95:+.1%}")
+        if p99 > args.threshold:
+            regressions.append(f"{key[0]} c={key[1]}: p99 latency {p99:+.1%}")
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{key[0]} c={key[1]}: errors {before['errors']} -> {after['errors']}")
+
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions above the threshold.")
+
+
+if __name__ == "__main__":
+    main()
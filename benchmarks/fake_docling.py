@@ -0,0 +1,121 @@
+"""
+Local stand-in for docling-serve used by the benchmark suite.
+
+Implements the Docling endpoints the hub proxies, plus ``/files/{name}`` for
+source conversions, with configurable latency, result size and error rate.
+Conversions and results return JSON shaped like Docling's; no document is
+actually parsed.
+
+Usage:
+    python -m benchmarks.fake_docling --port 5001 --latency-ms 50 --result-bytes 65536
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency_ms: float, jitter_ms: float, result_bytes: int, error_rate: float, seed: int) -> FastAPI:
+    """
+    Build the fake Docling application.
+
+    Args:
+        latency_ms: Mean time each conversion, poll or result fetch takes
+        jitter_ms: Uniform jitter added to or removed from the latency
+        result_bytes: Size of the markdown content in conversion results
+        error_rate: Fraction of conversions, polls and results answered with a 500
+        seed: Random seed, so runs with the same settings see the same errors
+    """
+    app = FastAPI()
+    rng = random.Random(seed)
+    content = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (result_bytes // 56 + 1))[:result_bytes]
+    document = ("%PDF-1.4\n" + "benchmark source document\n" * 2000).encode()
+
+    async def work() -> bool:
+        """Sleep for the configured latency; return False if this call should fail."""
+        delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+        return rng.random() >= error_rate
+
+    def failure() -> JSONResponse:
+        return JSONResponse({"detail": "Injected failure"}, status_code=500)
+
+    def conversion(filename: str, digest: str) -> dict:
+        return {
+            "document": {"filename": filename, "md_content": content, "text_content": None},
+            "status": "success",
+            "errors": [],
+            "processing_time": latency_ms / 1000,
+            "timings": {"sha256": digest},
+        }
+
+    @app.post("/v1alpha/convert/file")
+    async def convert_file(request: Request):
+        # Read the upload as Docling would, without parsing the multipart body
+        digest = hashlib.sha256()
+        async for chunk in request.stream():
+            digest.update(chunk)
+        if not await work():
+            return failure()
+        return conversion("upload", digest.hexdigest())
+
+    @app.post("/v1alpha/convert/source")
+    async def convert_source(request: Request):
+        body = await request.body()
+        if not await work():
+            return failure()
+        return conversion("source", hashlib.sha256(body).hexdigest())
+
+    @app.post("/v1alpha/convert/source/async")
+    async def convert_source_async(request: Request):
+        await request.body()
+        return {"task_id": f"task-{rng.getrandbits(64):016x}", "task_status": "pending", "task_position": 1}
+
+    @app.get("/v1alpha/status/poll/{task_id}")
+    async def poll(task_id: str):
+        if not await work():
+            return failure()
+        return {"task_id": task_id, "task_status": "success", "task_position": None}
+
+    @app.get("/v1alpha/result/{task_id}")
+    async def result(task_id: str):
+        if not await work():
+            return failure()
+        return conversion(task_id, task_id)
+
+    @app.get("/files/{name}")
+    async def source_file(name: str, request: Request):
+        etag = f'"{name}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(document, media_type="application/pdf", headers={"ETag": etag})
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Docling server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--result-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.jitter_ms, args.result_bytes, args.error_rate, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+In-process benchmark of the hub's per-request middleware overhead.
+
+Calls the ASGI application directly (no sockets, no Docling) for cheap routes,
+so the measured time is the middleware stack plus a trivial handler:
+
+    public         GET /api/v1/health (auth skipped)
+    authenticated  GET /api/v1/agents with a valid bearer token
+    rejected       GET /api/v1/agents with an invalid token (401)
+
+The report has the same shape as benchmarks.run, so benchmarks.compare can
+diff two revisions.
+
+Usage:
+    python -m benchmarks.middleware --requests 20000 --output middleware.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List
+
+API_KEY = "benchmark"
+
+ROUTES = {
+    "public": ("/api/v1/health", None),
+    "authenticated": ("/api/v1/agents", f"Bearer {API_KEY}"),
+    "rejected": ("/api/v1/agents", "Bearer wrong-key"),
+}
+
+
+def load_app():
+    os.environ["API_KEY"] = API_KEY
+    # Importing the app configures Celery; nothing connects until a task is sent
+    os.environ.setdefault("REDIS_CONN_STRING", "redis://127.0.0.1:6379/0")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.app import app
+    # Rejected requests log a warning each; keep stderr I/O out of the timings
+    logging.disable(logging.WARNING)
+    return app
+
+
+async def call(app, path: str, authorization) -> int:
+    headers = [(b"host", b"hub")]
+    if authorization:
+        headers.append((b"authorization", authorization.encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("hub", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure(app, name: str, requests: int, warmup: int) -> dict:
+    path, authorization = ROUTES[name]
+    for _ in range(warmup):
+        await call(app, path, authorization)
+
+    latencies: List[float] = []
+    status_codes = {}
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        status = await call(app, path, authorization)
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(fraction: float) -> float:
+        return round(latencies[max(0, int(round(fraction * len(latencies))) - 1)], 4)
+
+    expected = 401 if name == "rejected" else 200
+    return {
+        "scenario": f"middleware:{name}",
+        "concurrency": 1,
+        "requests": requests,
+        "errors": sum(count for code, count in status_codes.items() if code != str(expected)),
+        "status_codes": status_codes,
+        "duration_s": round(elapsed, 3),
+        "rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 4),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": round(latencies[-1], 4),
+        },
+        "memory": {},
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    app = load_app()
+    results = []
+    for name in ROUTES:
+        result = await measure(app, name, args.requests, args.warmup)
+        results.append(result)
+        print(
+            f"{result['scenario']:26} {result['rps']:>10.1f} req/s  "
+            f"mean={result['latency_ms']['mean'] * 1000:.1f}us p99={result['latency_ms']['p99'] * 1000:.1f}us",
+            file=sys.stderr,
+        )
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {"requests": args.requests, "warmup": args.warmup},
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the hub's per-request middleware overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--warmup", type=int, default=1000)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
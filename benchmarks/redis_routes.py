@@ -0,0 +1,178 @@
+"""
+In-process benchmark of the Redis-backed API routes under concurrent load.
+
+Calls the ASGI application directly on routes that only read Redis, keeping
+many requests in flight at once, while a probe task sleeps 1 ms in a loop
+and records how late it wakes up. A route that blocks the event loop on a
+Redis round trip shows up as loop lag and as latency that grows with
+concurrency:
+
+    video_status   GET /api/v1/video/status/{candidate_id}/{invitation_id}
+    cookie_status  GET /api/v1/devskiller/status
+
+Needs Redis: a throwaway ``redis-server`` from PATH is started unless
+``--redis-url`` points at a local instance. The report has the same shape as
+benchmarks.run (plus ``loop_lag_ms``), so benchmarks.compare can diff two
+revisions.
+
+Usage:
+    python -m benchmarks.redis_routes --concurrency 1,16,64 --requests 5000 --output redis.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List
+
+from benchmarks.middleware import API_KEY, call, load_app
+from benchmarks.run import percentile, start_redis, stop_process, wait_redis
+
+ROUTES = {
+    "video_status": "/api/v1/video/status/benchmark-candidate/benchmark-invitation",
+    "cookie_status": "/api/v1/devskiller/status",
+}
+
+
+def seed(redis_url: str) -> None:
+    import redis
+
+    client = redis.Redis.from_url(redis_url)
+    client.set(
+        "video:benchmark-candidate:benchmark-invitation",
+        json.dumps({"status": "complete", "url": "https://cdn.example.com/video.mp4"}),
+        ex=3600,
+    )
+    client.set("devskiller_cookies_status", "complete", ex=3600)
+    client.set("devskiller_cookies_last_updated", datetime.now(timezone.utc).isoformat(), ex=3600)
+    client.close()
+
+
+async def probe_loop_lag(lags: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(max(0.0, (time.perf_counter() - started - 0.001) * 1000))
+
+
+async def run_level(app, name: str, concurrency: int, requests: int) -> dict:
+    path = ROUTES[name]
+    authorization = f"Bearer {API_KEY}"
+    latencies: List[float] = []
+    status_codes = {}
+    remaining = requests
+
+    async def client() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            request_started = time.perf_counter()
+            status = await call(app, path, authorization)
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    latencies.sort()
+    lags.sort()
+    return {
+        "scenario": f"redis:{name}",
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(count for code, count in status_codes.items() if code != "200"),
+        "status_codes": status_codes,
+        "duration_s": round(elapsed, 3),
+        "rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": round(latencies[-1], 3),
+        },
+        "loop_lag_ms": {
+            "p50": percentile(lags, 0.50),
+            "p99": percentile(lags, 0.99),
+            "max": round(lags[-1], 3) if lags else 0.0,
+        },
+        "memory": {},
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    levels = [int(level) for level in args.concurrency.split(",")]
+    work_dir = tempfile.mkdtemp(prefix="hub-bench-redis-")
+    redis_process = None
+    redis_url = args.redis_url
+    if redis_url is None:
+        redis_process, redis_url = start_redis(work_dir)
+    try:
+        await wait_redis(redis_url, redis_process)
+        seed(redis_url)
+        os.environ["REDIS_CONN_STRING"] = redis_url
+        # Measure the routes, not the per-key rate limiter
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+        app = load_app()
+
+        results = []
+        for name in ROUTES:
+            await run_level(app, name, 1, args.warmup)
+            for concurrency in levels:
+                result = await run_level(app, name, concurrency, args.requests)
+                results.append(result)
+                print(
+                    f"{result['scenario']:20} c={concurrency:<4} {result['rps']:>9.1f} req/s  "
+                    f"p99={result['latency_ms']['p99']:.2f}ms loop lag p99={result['loop_lag_ms']['p99']:.2f}ms",
+                    file=sys.stderr,
+                )
+    finally:
+        if redis_process is not None:
+            stop_process(redis_process)
+
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "concurrency": levels,
+                "requests": args.requests,
+                "warmup": args.warmup,
+                "redis": "external" if args.redis_url else "redis-server",
+            },
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure Redis-backed API routes under concurrent load")
+    parser.add_argument("--concurrency", default="1,16,64", help="Comma-separated in-flight request levels")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per level")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--redis-url", default=None, help="Local Redis (default: start redis-server)")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+Throughput and latency benchmark for the hub's /api/v1/document routes.
+
+Starts the fake Docling server (benchmarks.fake_docling) and the hub
+(uvicorn app.app:app) as local subprocesses, then drives each scenario with a
+closed-loop load at increasing concurrency and writes the measurements as
+JSON. Everything runs on 127.0.0.1; no network access is needed. The hub
+needs Redis (its Celery broker): a throwaway ``redis-server`` from PATH is
+started unless ``--redis-url`` points at a local instance.
+
+Scenarios:
+    upload         POST /convert/file with a unique file per request (cache miss)
+    upload_cached  POST /convert/file with the same file every time (cache hit)
+    source         POST /convert/source for a unique URL served by the fake
+    poll           GET /status/poll/{task_id}
+    result         GET /result/{task_id} over a rotating set of task ids
+
+Usage:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --scenarios upload,poll --concurrency 1,16,64 --latency-ms 20
+    python -m benchmarks.compare baseline.json bench.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Dict, List, Optional, Tuple
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "benchmark"
+SCENARIOS = ("upload", "upload_cached", "source", "poll", "result")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process, from /proc (None where unavailable)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_process(args: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log_file = open(log_path, "wb")
+    return subprocess.Popen(args, cwd=REPO_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{process.args} exited with code {process.returncode}")
+            try:
+                if (await client.get(url, timeout=1.0)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+def start_redis(work_dir: str) -> Tuple[subprocess.Popen, str]:
+    """Start a throwaway, non-persistent redis-server on a free port."""
+    server = shutil.which("redis-server")
+    if server is None:
+        raise SystemExit("The hub needs Redis: install redis-server or pass --redis-url redis://127.0.0.1:6379/15")
+    port = free_port()
+    process = start_process(
+        [server, "--port", str(port), "--bind", "127.0.0.1", "--save", "", "--appendonly", "no"],
+        dict(os.environ),
+        os.path.join(work_dir, "redis.log"),
+    )
+    return process, f"redis://127.0.0.1:{port}/0"
+
+
+async def wait_redis(url: str, process: Optional[subprocess.Popen], timeout: float = 10.0) -> None:
+    import redis.asyncio as aioredis
+
+    client = aioredis.Redis.from_url(url)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"redis-server exited with code {process.returncode}")
+            try:
+                await client.ping()
+                return
+            except Exception:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f"Redis at {url} is not reachable")
+                await asyncio.sleep(0.1)
+    finally:
+        await client.aclose()
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+class Scenario:
+    """Builds the requests of one scenario, numbered across all concurrency levels."""
+
+    def __init__(self, name: str, fake_url: str, upload_bytes: int, result_tasks: int):
+        self.name = name
+        self.fake_url = fake_url
+        self.upload = os.urandom(upload_bytes)
+        self.result_tasks = result_tasks
+        self.run_id = uuid.uuid4().hex[:8]
+        self._sequence = itertools.count()
+
+    def request(self, client: httpx.AsyncClient) -> Awaitable[httpx.Response]:
+        index = next(self._sequence)
+        if self.name == "upload":
+            # A unique prefix makes every upload a cache miss
+            data = f"{self.run_id}-{index}".encode() + self.upload
+            return client.post(
+                "/api/v1/document/convert/file",
+                files={"files": ("document.pdf", data, "application/pdf")},
+                data={"to_formats": "md"},
+            )
+        if self.name == "upload_cached":
+            return client.post(
+                "/api/v1/document/convert/file",
+                files={"files": ("document.pdf", self.upload, "application/pdf")},
+                data={"to_formats": "md"},
+            )
+        if self.name == "source":
+            payload = {
+                "http_sources": [{"url": f"{self.fake_url}/files/{self.run_id}-{index}.pdf"}],
+                "options": {"to_formats": ["md"]},
+            }
+            return client.post("/api/v1/document/convert/source", json=payload)
+        if self.name == "poll":
+            return client.get(f"/api/v1/document/status/poll/task-{self.run_id}-{index}")
+        if self.name == "result":
+            return client.get(f"/api/v1/document/result/task-{self.run_id}-{index % self.result_tasks}")
+        raise ValueError(f"Unknown scenario: {self.name}")
+
+
+async def run_level(
+    hub_url: str,
+    hub_pid: int,
+    scenario: Scenario,
+    concurrency: int,
+    requests: int,
+    timeout: float,
+) -> dict:
+    """
+    Send ``requests`` requests with ``concurrency`` workers and summarize them.
+    """
+    latencies: List[float] = []
+    status_codes: Dict[str, int] = {}
+    errors = 0
+    sent = 0
+    rss_start = rss_bytes(hub_pid)
+    rss_peak = rss_start
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=hub_url,
+        headers={"Authorization": f"Bearer {API_KEY}"},
+        limits=limits,
+        timeout=timeout,
+    ) as client:
+
+        async def worker() -> None:
+            nonlocal sent, errors
+            while sent < requests:
+                sent += 1
+                started = time.perf_counter()
+                try:
+                    response = await scenario.request(client)
+                    await response.aread()
+                    code = str(response.status_code)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError as e:
+                    code = type(e).__name__
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+                status_codes[code] = status_codes.get(code, 0) + 1
+
+        async def sample_memory(done: asyncio.Event) -> None:
+            nonlocal rss_peak
+            while not done.is_set():
+                rss = rss_bytes(hub_pid)
+                if rss is not None and (rss_peak is None or rss > rss_peak):
+                    rss_peak = rss
+                try:
+                    await asyncio.wait_for(done.wait(), timeout=0.05)
+                except asyncio.TimeoutError:
+                    pass
+
+        done = asyncio.Event()
+        sampler = asyncio.create_task(sample_memory(done))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await sampler
+
+    latencies.sort()
+    rss_end = rss_bytes(hub_pid)
+    memory = {"rss_start_bytes": rss_start, "rss_peak_bytes": rss_peak, "rss_end_bytes": rss_end}
+    if rss_start is not None and rss_peak is not None:
+        # Extra resident memory per in-flight request at the peak
+        memory["rss_per_inflight_request_bytes"] = max(0, rss_peak - rss_start) // concurrency
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": status_codes,
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+        "memory": memory,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    work_dir = tempfile.mkdtemp(prefix="hub-bench-")
+    fake_port = free_port()
+    hub_port = free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    hub_url = f"http://127.0.0.1:{hub_port}"
+
+    redis = None
+    redis_url = args.redis_url
+    if redis_url is None:
+        redis, redis_url = start_redis(work_dir)
+    await wait_redis(redis_url, redis)
+
+    base_env = {key: value for key, value in os.environ.items() if not key.startswith(("HTTP_PROXY", "HTTPS_PROXY"))}
+    base_env["NO_PROXY"] = "127.0.0.1,localhost"
+    fake = start_process(
+        [
+            sys.executable, "-m", "benchmarks.fake_docling",
+            "--port", str(fake_port),
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--result-bytes", str(args.result_bytes),
+            "--error-rate", str(args.error_rate),
+        ],
+        base_env,
+        os.path.join(work_dir, "fake_docling.log"),
+    )
+    hub_env = {
+        **base_env,
+        "API_KEY": API_KEY,
+        "DOCLING_API_URL": fake_url,
+        "DOCLING_API_URLS": "",
+        "REDIS_CONN_STRING": redis_url,
+        "HUB_JOBS_ENABLED": "false",
+        "PDF_SPLIT_DEFAULT": "false",
+        "RESULT_STORE_DIR": os.path.join(work_dir, "results"),
+        "SOURCE_CACHE_DIR": os.path.join(work_dir, "sources"),
+        # Keep the per-key rate limiter in the path without throttling the load
+        "RATE_LIMIT_DOCUMENT_PER_MINUTE": "100000000",
+        "RATE_LIMIT_DOCUMENT_BURST": "10000000",
+    }
+    hub = start_process(
+        [
+            sys.executable, "-m", "uvicorn", "app.app:app",
+            "--host", "127.0.0.1",
+            "--port", str(hub_port),
+            "--log-level", "warning",
+            "--no-access-log",
+        ],
+        hub_env,
+        os.path.join(work_dir, "hub.log"),
+    )
+
+    results = []
+    try:
+        await wait_ready(f"{fake_url}/health", fake)
+        await wait_ready(f"{hub_url}/api/v1/health", hub)
+        for name in scenarios:
+            scenario = Scenario(name, fake_url, args.upload_bytes, args.result_tasks)
+            # Warm up connections, caches and the result store
+            await run_level(hub_url, hub.pid, scenario, min(levels), args.warmup, args.timeout)
+            for concurrency in levels:
+                result = await run_level(hub_url, hub.pid, scenario, concurrency, args.requests, args.timeout)
+                results.append(result)
+                print(
+                    f"{name:14} c={concurrency:<4} {result['rps']:>9.1f} req/s  "
+                    f"p50={result['latency_ms']['p50']:.1f}ms p95={result['latency_ms']['p95']:.1f}ms "
+                    f"p99={result['latency_ms']['p99']:.1f}ms errors={result['errors']}",
+                    file=sys.stderr,
+                )
+    finally:
+        stop_process(hub)
+        stop_process(fake)
+        if redis is not None:
+            stop_process(redis)
+
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "redis": "external" if args.redis_url else "redis-server",
+            "logs": work_dir,
+            "config": {
+                "requests": args.requests,
+                "warmup": args.warmup,
+                "concurrency": levels,
+                "latency_ms": args.latency_ms,
+                "jitter_ms": args.jitter_ms,
+                "result_bytes": args.result_bytes,
+                "upload_bytes": args.upload_bytes,
+                "error_rate": args.error_rate,
+                "result_tasks": args.result_tasks,
+            },
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the hub's document routes against a fake Docling")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios to run")
+    parser.add_argument("--concurrency", default="1,8,32,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests before each scenario")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client timeout per request in seconds")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake Docling latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Uniform jitter on the fake latency")
+    parser.add_argument("--result-bytes", type=int, default=64 * 1024, help="Markdown size of fake results")
+    parser.add_argument("--upload-bytes", type=int, default=256 * 1024, help="Size of uploaded files")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake Docling calls that fail")
+    parser.add_argument("--result-tasks", type=int, default=50, help="Distinct task ids in the result scenario")
+    parser.add_argument("--redis-url", default=None, help="Local Redis for the hub (default: start redis-server)")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,7 +20,7 @@ logging.config.dictConfig(DEFAULT_LOGGING_CONFIG)
 logger = logging.getLogger("app.main")
 
 # Check for critical environment variables
-if not os.getenv("API_KEY"):
+if not (os.getenv("API_KEY") or os.getenv("API_KEYS") or os.getenv("API_KEY_HASHES")):
     logger.critical("API_KEY environment variable is not set.")
     logger.critical("The application will not function correctly without it.")
     logger.critical("Make sure the .env file exists and contains the required variables.")
@@ -14,9 +14,18 @@ fi
 echo "📡 Redis URL: ${REDIS_CONN_STRING//:*@/:***@}"
 
 # Run Celery worker with enhanced options
+# The default worker serves Devskiller/video tasks. Hub conversion jobs
+# (HUB_JOBS_ENABLED=true) run on dedicated workers, one per lane, so bulk
+# jobs never occupy a slot interactive jobs need:
+# CELERY_QUEUES=docling_interactive and CELERY_QUEUES=docling_bulk, best with
+# CELERY_POOL=threads since jobs mostly wait on Docling.
+# For Devskiller workers, CELERY_POOL=threads with CELERY_CONCURRENCY=8 runs
+# several browser jobs at once in each process, sharing one event loop and
+# one Chromium (see BROWSER_POOL_MAX_CONCURRENCY).
 celery -A app.core.celery_app worker \
     --loglevel=INFO \
-    --concurrency=2 \
+    -Q "${CELERY_QUEUES:-celery}" \
+    --concurrency="${CELERY_CONCURRENCY:-2}" \
     --max-tasks-per-child=1000 \
     --time-limit=300 \
     --soft-time-limit=240 \
@@ -24,5 +33,5 @@ celery -A app.core.celery_app worker \
     --without-mingle \
     --without-heartbeat \
     -E \
-    --pool=prefork \
+    --pool="${CELERY_POOL:-prefork}" \
     -Ofair 
\ No newline at end of file